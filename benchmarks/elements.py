@@ -0,0 +1,257 @@
+"""
+Elements
+--------
+
+Element transfer maps benchmarks (trace, compile, latency and throughput)
+
+Usage
+-----
+$ python benchmarks/elements.py --output results.json
+$ python benchmarks/elements.py --output current.json --baseline results.json --tolerance 0.25
+$ python benchmarks/elements.py --cases drift quadrupole --orders 0 1 --iterations 1 10 --batches 1 1024 --dtypes float64
+
+Baseline is the output of a previous run on the same machine
+Exit status is 1 if steady state latency of any configuration exceeds its baseline by more than the tolerance
+
+"""
+from typing import Any
+from typing import Callable
+
+from argparse import ArgumentParser
+from itertools import product
+from json import dump
+from json import load
+from pathlib import Path
+from platform import python_version
+from statistics import median
+from time import perf_counter
+
+import jax
+from jax import Array
+
+from elementary.util import beta
+from elementary.util import rigidity
+from elementary.util import MP
+from elementary.drift import drift_factory
+from elementary.quadrupole import quadrupole_factory
+from elementary.sextupole import sextupole_factory
+from elementary.octupole import octupole_factory
+from elementary.multipole import multipole_factory
+from elementary.dipole import dipole_factory
+from elementary.cavity import cavity_factory
+from elementary.alignment import alignment_factory
+
+jax.config.update('jax_enable_x64', True)
+
+GAMMA:float = 10.0
+BETA:float = beta(GAMMA)
+
+
+def cases() -> dict[str, tuple[bool, Callable[..., Callable[..., Array]], tuple[float, ...]]]:
+    """
+    Benchmark cases
+
+    Returns
+    -------
+    dict[str, tuple[bool, Callable[..., Callable[..., Array]], tuple[float, ...]]]
+        name: (integrated flag, element generator with (order, iterations) signature, parameters)
+
+    Note
+    ----
+    For length adaptive cases (step), maximum step length is element length divided by iterations
+
+    """
+    settings = dict(beta=BETA, gamma=GAMMA)
+    xyz_entrance, xyz_exit = alignment_factory(**settings)
+    return {
+        'drift': (False, lambda order, iterations: drift_factory(**settings), (1.0, )),
+        'quadrupole': (True, lambda order, iterations: quadrupole_factory(order=order, iterations=iterations, **settings), (0.5, 1.0, 0.1)),
+        'quadrupole-exact': (False, lambda order, iterations: quadrupole_factory(exact=True, **settings), (0.5, 1.0, 0.1)),
+        'quadrupole-split': (True, lambda order, iterations: quadrupole_factory(order=order, iterations=iterations, split=True, **settings), (0.5, 1.0, 0.1)),
+        'quadrupole-step': (True, lambda order, iterations: quadrupole_factory(order=order, step=0.5/iterations, **settings), (0.5, 1.0, 0.1)),
+        'quadrupole-single': (True, lambda order, iterations: quadrupole_factory(order=order, iterations=iterations, precision='single', **settings), (0.5, 1.0, 0.1)),
+        'quadrupole-mixed': (True, lambda order, iterations: quadrupole_factory(order=order, iterations=iterations, precision='mixed', **settings), (0.5, 1.0, 0.1)),
+        'sextupole': (True, lambda order, iterations: sextupole_factory(order=order, iterations=iterations, **settings), (0.25, 10.0, 1.0)),
+        'octupole': (True, lambda order, iterations: octupole_factory(order=order, iterations=iterations, **settings), (0.25, 100.0, 10.0)),
+        'multipole': (True, lambda order, iterations: multipole_factory(order=order, iterations=iterations, **settings), (0.5, 1.0, 0.1, 10.0, 1.0, 100.0, 10.0)),
+        'multipole-split': (True, lambda order, iterations: multipole_factory(order=order, iterations=iterations, split=True, **settings), (0.5, 1.0, 0.1, 10.0, 1.0, 100.0, 10.0)),
+        'dipole-exact': (False, lambda order, iterations: dipole_factory(exact=True, **settings), (2.0, 0.1)),
+        'dipole': (True, lambda order, iterations: dipole_factory(exact=False, order=order, iterations=iterations, **settings), (2.0, 0.1)),
+        'dipole-step': (True, lambda order, iterations: dipole_factory(exact=False, order=order, step=2.0/iterations, **settings), (2.0, 0.1)),
+        'dipole-mixed': (True, lambda order, iterations: dipole_factory(exact=False, order=order, iterations=iterations, precision='mixed', **settings), (2.0, 0.1)),
+        'cavity': (True, lambda order, iterations: cavity_factory(rigidity(BETA, GAMMA, MP), kind='main', order=order, iterations=iterations, **settings), (0.5, 1.0, 500.0, 0.0)),
+        'cavity-kick': (False, lambda order, iterations: cavity_factory(rigidity(BETA, GAMMA, MP), kind='kick', **settings), (1.0, 0.0)),
+        'alignment-entrance': (False, lambda order, iterations: xyz_entrance, (0.001, -0.001, 0.001, 0.001, -0.001, 0.001)),
+        'alignment-exit': (False, lambda order, iterations: xyz_exit, (0.001, -0.001, 0.001, 0.001, -0.001, 0.001, 1.0, 0.0)),
+    }
+
+
+def measure(element:Callable[..., Array],
+            parameters:tuple[float, ...],
+            batch:int,
+            dtype:str,
+            repeat:int) -> dict[str, float]:
+    """
+    Measure single configuration
+
+    Parameters
+    ----------
+    element: Callable[..., Array]
+        element transfer map
+    parameters: tuple[float, ...]
+        element parameters
+    batch: int
+        number of particles
+    dtype: str
+        floating point type
+    repeat: int
+        number of timed evaluations
+
+    Returns
+    -------
+    dict[str, float]
+        trace, lower and compile times, median latency (in seconds) and throughput (particles per second)
+
+    """
+    qsps = jax.numpy.tile(jax.numpy.array([0.001, -0.001, 0.0, 0.0001, -0.0001, 0.0001], dtype=dtype), (batch, 1))
+    qsps = qsps.squeeze(0) if batch == 1 else qsps
+    parameters = tuple(jax.numpy.asarray(parameter, dtype=dtype) for parameter in parameters)
+    function = jax.jit(element)
+    time = perf_counter()
+    traced = function.trace(qsps, *parameters)
+    trace = perf_counter() - time
+    time = perf_counter()
+    lowered = traced.lower()
+    lower = perf_counter() - time
+    time = perf_counter()
+    compiled = lowered.compile()
+    compile = perf_counter() - time
+    compiled(qsps, *parameters).block_until_ready()
+    times = []
+    for _ in range(repeat):
+        time = perf_counter()
+        compiled(qsps, *parameters).block_until_ready()
+        times.append(perf_counter() - time)
+    latency = median(times)
+    return dict(trace=trace, lower=lower, compile=compile, latency=latency, throughput=batch/latency)
+
+
+def run(names:list[str],
+        orders:list[int],
+        iterations:list[int],
+        batches:list[int],
+        dtypes:list[str],
+        repeat:int) -> list[dict[str, Any]]:
+    """
+    Run benchmarks
+
+    Parameters
+    ----------
+    names: list[str]
+        case names
+    orders: list[int]
+        yoshida composition orders (integrated elements)
+    iterations: list[int]
+        numbers of integration steps (integrated elements)
+    batches: list[int]
+        numbers of particles
+    dtypes: list[str]
+        floating point types
+    repeat: int
+        number of timed evaluations
+
+    Returns
+    -------
+    list[dict[str, Any]]
+
+    """
+    table = cases()
+    results = []
+    for name in names:
+        integrated, generator, parameters = table[name]
+        grid = product(orders, iterations) if integrated else [(0, 1)]
+        for (order, count), batch, dtype in product(grid, batches, dtypes):
+            result = dict(case=name, order=order, iterations=count, batch=batch, dtype=dtype)
+            result.update(measure(generator(order, count), parameters, batch, dtype, repeat))
+            print(' '.join(f'{key}={value:.6g}' if isinstance(value, float) else f'{key}={value}' for key, value in result.items()), flush=True)
+            results.append(result)
+    return results
+
+
+def key(result:dict[str, Any]) -> tuple[Any, ...]:
+    """
+    Configuration key
+
+    """
+    return tuple(result[name] for name in ('case', 'order', 'iterations', 'batch', 'dtype'))
+
+
+def compare(results:list[dict[str, Any]],
+            baseline:list[dict[str, Any]],
+            tolerance:float) -> list[dict[str, Any]]:
+    """
+    Compare results against baseline
+
+    Parameters
+    ----------
+    results: list[dict[str, Any]]
+        current results
+    baseline: list[dict[str, Any]]
+        baseline results
+    tolerance: float
+        relative latency tolerance
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        regressions (configuration, baseline and current latency, ratio)
+
+    """
+    reference = {key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        if key(result) not in reference:
+            continue
+        ratio = result['latency']/reference[key(result)]['latency']
+        if ratio > 1.0 + tolerance:
+            regressions.append(dict(zip(('case', 'order', 'iterations', 'batch', 'dtype'), key(result)),
+                                    baseline=reference[key(result)]['latency'],
+                                    latency=result['latency'],
+                                    ratio=ratio))
+    return regressions
+
+
+def main() -> int:
+    """
+    Command line entry point
+
+    """
+    parser = ArgumentParser(description='Element transfer maps benchmarks')
+    parser.add_argument('--cases', nargs='+', default=list(cases()), choices=list(cases()))
+    parser.add_argument('--orders', nargs='+', type=int, default=[0, 1])
+    parser.add_argument('--iterations', nargs='+', type=int, default=[1, 10])
+    parser.add_argument('--batches', nargs='+', type=int, default=[1, 1024])
+    parser.add_argument('--dtypes', nargs='+', default=['float64', 'float32'], choices=['float64', 'float32'])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', type=Path, default=None)
+    parser.add_argument('--baseline', type=Path, default=None)
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    arguments = parser.parse_args()
+    results = run(arguments.cases, arguments.orders, arguments.iterations, arguments.batches, arguments.dtypes, arguments.repeat)
+    device, *_ = jax.devices()
+    data = dict(meta=dict(jax=jax.__version__, python=python_version(), backend=jax.default_backend(), device=str(device)), results=results)
+    if arguments.output:
+        with arguments.output.open('w') as stream:
+            dump(data, stream, indent=2)
+    if arguments.baseline:
+        with arguments.baseline.open() as stream:
+            baseline = load(stream)['results']
+        regressions = compare(results, baseline, arguments.tolerance)
+        for regression in regressions:
+            print('regression ' + ' '.join(f'{key}={value:.6g}' if isinstance(value, float) else f'{key}={value}' for key, value in regression.items()))
+        return int(bool(regressions))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
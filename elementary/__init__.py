@@ -4,6 +4,8 @@ Version and aliases
 """
 __version__ = '0.1.1'
 
+from os import environ
+
 __all__ = [
     'nest',
     'nest_list',
@@ -29,3 +31,8 @@ from sympint.yoshida import sequence
 
 from sympint.integrators import midpoint
 from sympint.integrators import tao
+
+from elementary.cache import persistent
+
+if environ.get('ELEMENTARY_CACHE'):
+    persistent(environ['ELEMENTARY_CACHE'])
@@ -0,0 +1,127 @@
+"""
+Adjoint
+-------
+
+Memory bounded reverse mode differentiation through multi-turn tracking
+
+"""
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+import jax
+from jax import Array
+from jax.ad_checkpoint import checkpoint_name
+
+POLICY:tuple[str, ...] = ('none', 'turn', 'element', 'binomial', 'inverse')
+
+
+def tag(element:Callable[..., Array]) -> Callable[..., Array]:
+    """
+    Tag element output as saved state for element checkpointing policy
+
+    Parameters
+    ----------
+    element: Callable[..., Array]
+        element with (qsps, *args) signature
+
+    Returns
+    -------
+    Callable[..., Array]
+
+    """
+    def wrapper(qsps:Array, *args:Any) -> Array:
+        return checkpoint_name(element(qsps, *args), 'element')
+    return wrapper
+
+
+def nested(ring:Callable[..., Array],
+           turns:int,
+           block:int) -> Callable[..., Array]:
+    """
+    Recursively checkpointed tracking (binomial schedule)
+
+    """
+    if turns <= block:
+        step = jax.checkpoint(ring)
+        return lambda qsps, *args: jax.lax.fori_loop(0, turns, lambda _, qsps: step(qsps, *args), qsps)
+    size, remainder = divmod(turns, block)
+    inner = jax.checkpoint(nested(ring, size, block))
+    tail = nested(ring, remainder, block) if remainder else None
+    def task(qsps:Array, *args:Any) -> Array:
+        qsps, _ = jax.lax.scan(lambda qsps, _: (inner(qsps, *args), None), qsps, length=block)
+        return tail(qsps, *args) if tail else qsps
+    return task
+
+
+def differentiable(ring:Callable[..., Array],
+                   turns:int, *,
+                   policy:str='turn',
+                   block:int=16,
+                   inverse:Optional[Callable[..., Array]]=None) -> Callable[..., Array]:
+    """
+    Generate differentiable multi-turn tracking
+
+    Parameters
+    ----------
+    ring: Callable[..., Array]
+        one-turn map with (qsps, *args) signature
+    turns: int
+        number of turns
+    policy: str, default='turn'
+        checkpointing policy ('none', 'turn', 'element', 'binomial' or 'inverse')
+    block: int, default=16
+        number of turns (or sub-blocks) per level for binomial policy
+    inverse: Optional[Callable[..., Array]]
+        inverse one-turn map with (qsps, *args) signature (required for inverse policy)
+
+    Returns
+    -------
+    Callable[..., Array]
+        tracking with (qsps, *args) signature
+
+    Note
+    ----
+    none: all intermediate states are stored (memory ~ turns x elements x iterations)
+    turn: only turn states are stored, each turn is recomputed on the backward pass (memory ~ turns)
+    element: only states tagged with tag (element exit states) are stored (memory ~ turns x elements)
+    binomial: nested checkpointed blocks (memory ~ block x log(turns), recomputation ~ log(turns))
+    inverse: states are recomputed backward with the inverse (symplectic) map (memory is constant)
+    For inverse policy, only reverse mode is supported and parameters are assumed to be floating point arrays
+    Inverse map can be constructed from elements with negative length in reversed order
+
+    """
+    if policy not in POLICY:
+        raise ValueError(f'Expected policy in {POLICY}, got {policy}')
+    if policy == 'inverse' and inverse is None:
+        raise ValueError('Expected inverse map for inverse policy')
+    if policy == 'binomial':
+        return nested(ring, turns, block)
+    step = {'none': ring,
+            'turn': jax.checkpoint(ring),
+            'element': jax.checkpoint(ring, policy=jax.checkpoint_policies.save_only_these_names('element')),
+            'inverse': ring}[policy]
+    def forward(qsps:Array, *args:Any) -> Array:
+        qsps, _ = jax.lax.scan(lambda qsps, _: (step(qsps, *args), None), qsps, length=turns)
+        return qsps
+    if policy != 'inverse':
+        return forward
+    @jax.custom_vjp
+    def task(qsps:Array, *args:Any) -> Array:
+        return forward(qsps, *args)
+    def task_forward(qsps:Array, *args:Any) -> tuple[Array, tuple[Array, tuple[Any, ...]]]:
+        result = forward(qsps, *args)
+        return result, (result, args)
+    def task_backward(residuals:tuple[Array, tuple[Any, ...]], cotangent:Array) -> tuple[Any, ...]:
+        result, args = residuals
+        def body(_:Array, carry:tuple[Array, Array, tuple[Any, ...]]) -> tuple[Array, Array, tuple[Any, ...]]:
+            qsps, cotangent, total = carry
+            qsps = inverse(qsps, *args)
+            _, vjp = jax.vjp(ring, qsps, *args)
+            cotangent, *increment = vjp(cotangent)
+            return qsps, cotangent, jax.tree.map(jax.numpy.add, total, tuple(increment))
+        total = jax.tree.map(jax.numpy.zeros_like, args)
+        _, cotangent, total = jax.lax.fori_loop(0, turns, body, (result, cotangent, total))
+        return cotangent, *total
+    task.defvjp(task_forward, task_backward)
+    return task
@@ -7,12 +7,25 @@ Alignment transformations factory
 """
 from typing import Optional
 from typing import Callable
+
+from functools import partial
+
 import jax
 from jax import Array
 
+from elementary.cache import memoize
+from elementary.precision import differential
+from elementary.precision import longitudinal
+from elementary.precision import path
+from elementary.precision import precise
+from elementary.util import analytic
+
+
+@memoize
 def alignment_factory(beta:Optional[float]=None,
                       gamma:Optional[float]=None,
-                      flag:bool=False) -> tuple[Callable[..., Array], Callable[..., Array]]:
+                      flag:bool=False,
+                      precision:str='double') -> tuple[Callable[..., Array], Callable[..., Array]]:
     """
     Generate entrance and exit alignment error transformations
 
@@ -24,15 +37,74 @@ def alignment_factory(beta:Optional[float]=None,
         gamma
     flag: bool, default=False
         non-zero layout angle flag
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
     tuple[Callable[..., Array], Callable[..., Array]]
 
+    Note
+    ----
+    All transformations act on single (6,) or batched (..., 6) states
+
     """
     beta = beta if beta else 1.0
     constant = 1/(beta**2*gamma**2) if gamma else 0.0
 
+    def sequence_entrance(qsps:Array,
+                          dx:Array,
+                          dy:Array,
+                          dz:Array,
+                          wx:Array,
+                          wy:Array,
+                          wz:Array) -> Array:
+        """
+        Sequential entrance transformation
+
+        """
+        qsps = tx(qsps, +dx)
+        qsps = ty(qsps, +dy)
+        qsps = tz(qsps, +dz, beta, constant)
+        qsps = rx(qsps, +wx, beta, constant)
+        qsps = ry(qsps, +wy, beta, constant)
+        qsps = rz(qsps, +wz)
+        return qsps
+
+    def sequence_exit(qsps:Array,
+                      dx:Array,
+                      dy:Array,
+                      dz:Array,
+                      wx:Array,
+                      wy:Array,
+                      wz:Array,
+                      length:Array,
+                      angle:Array=0.0) -> Array:
+        """
+        Sequential exit transformation
+
+        """
+        if flag:
+            qsps = ry(qsps, +angle/2, beta, constant)
+            qsps = tz(qsps, -2.0*length/angle*jax.numpy.sin(angle/2.0), beta, constant)
+            qsps = ry(qsps, +angle/2, beta, constant)
+        else:
+            qsps = tz(qsps, -length, beta=beta, constant=constant)
+        qsps = rz(qsps, -wz)
+        qsps = ry(qsps, -wy, beta, constant)
+        qsps = rx(qsps, -wx, beta, constant)
+        qsps = tz(qsps, -dz, beta, constant)
+        qsps = ty(qsps, -dy)
+        qsps = tx(qsps, -dx)
+        if flag:
+            qsps = ry(qsps, -angle/2, beta, constant)
+            qsps = tz(qsps, +2.0*length/angle*jax.numpy.sin(angle/2.0), beta, constant)
+            qsps = ry(qsps, -angle/2, beta, constant)
+        else:
+            qsps = tz(qsps, +length, beta, constant)
+        return qsps
+
+    @jax.custom_jvp
     def xyz_entrance(qsps:Array,
                     dx:Array,
                     dy:Array,
@@ -64,15 +136,15 @@ def alignment_factory(beta:Optional[float]=None,
         -------
         Array
 
+        Note
+        ----
+        Fused single pass transformation is skipped if all errors are zero
+        Derivatives are computed with sequential analytic transformations
+
         """
-        qsps = tx(qsps, +dx)
-        qsps = ty(qsps, +dy)
-        qsps = tz(qsps, +dz, beta, constant)
-        qsps = rx(qsps, +wx, beta, constant)
-        qsps = ry(qsps, +wy, beta, constant)
-        qsps = rz(qsps, +wz)
-        return qsps
+        return skip(lambda qsps, *errors: fused_entrance(qsps, *errors, beta, constant), qsps, (dx, dy, dz, wx, wy, wz))
 
+    @jax.custom_jvp
     def xyz_exit(qsps:Array,
                 dx:Array,
                 dy:Array,
@@ -110,31 +182,200 @@ def alignment_factory(beta:Optional[float]=None,
         -------
         Array
 
+        Note
+        ----
+        Fused single pass transformation is skipped if all errors are zero
+        Derivatives are computed with sequential analytic transformations
+
         """
-        if flag:
-            qsps = ry(qsps, +angle/2, beta, constant)
-            qsps = tz(qsps, -2.0*length/angle*jax.numpy.sin(angle/2.0), beta, constant)
-            qsps = ry(qsps, +angle/2, beta, constant)
-        else:
-            qsps = tz(qsps, -length, beta=beta, constant=constant)
-        qsps = rz(qsps, -wz)
-        qsps = ry(qsps, -wy, beta, constant)
-        qsps = rx(qsps, -wx, beta, constant)
-        qsps = tz(qsps, -dz, beta, constant)
-        qsps = ty(qsps, -dy)
-        qsps = tx(qsps, -dx)
-        if flag:
-            qsps = ry(qsps, -angle/2, beta, constant)
-            qsps = tz(qsps, +2.0*length/angle*jax.numpy.sin(angle/2.0), beta, constant)
-            qsps = ry(qsps, -angle/2, beta, constant)
-        else:
-            qsps = tz(qsps, +length, beta, constant)
-        return qsps
+        return skip(lambda qsps, *errors: fused_exit(qsps, *errors, length, angle, flag, beta, constant), qsps, (dx, dy, dz, wx, wy, wz))
+
+    xyz_entrance.defjvp(lambda primals, tangents: jax.jvp(sequence_entrance, primals, tangents))
+    xyz_exit.defjvp(lambda primals, tangents: jax.jvp(sequence_exit, primals, tangents))
+
+    return precise(xyz_entrance, precision), precise(xyz_exit, precision)
 
-    return xyz_entrance, xyz_exit
 
 
-def tx(qsps:Array, dx:Array, *args:Array) -> Array:
+def skip(function:Callable[..., Array], qsps:Array, errors:tuple[Array, ...], *args:Array) -> Array:
+    """
+    Apply transformation only if some errors are not zero
+
+    """
+    zero = jax.numpy.all(jax.numpy.stack(jax.numpy.broadcast_arrays(*errors)) == 0)
+    return jax.lax.cond(zero, lambda qsps, *_: qsps, function, qsps, *errors, *args)
+
+
+def shift(state:tuple[Array, ...], dz:Array, beta:float, constant:float) -> tuple[Array, ...]:
+    """
+    TZ translation (components with longitudinal momentum)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s, sqrt = state
+    Q_x = q_x + p_x*dz/sqrt
+    Q_y = q_y + p_y*dz/sqrt
+    Q_s = q_s + dz*path(p_x, p_y, p_s, sqrt, beta, constant)
+    return Q_x, Q_y, Q_s, p_x, p_y, p_s, sqrt
+
+
+def pitch(state:tuple[Array, ...], cos:Array, sin:Array, beta:float) -> tuple[Array, ...]:
+    """
+    RX rotation (components with longitudinal momentum, cos and sin of negative angle)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s, sqrt = state
+    tan = sin/cos
+    Q_x = q_x + p_x*q_y*tan/(sqrt - p_y*tan)
+    Q_y = q_y/cos/(1 - p_y*tan/sqrt)
+    Q_s = q_s - (1/beta + p_s)*q_y*tan/(sqrt - p_y*tan)
+    P_y = p_y*cos + sqrt*sin
+    return Q_x, Q_y, Q_s, p_x, P_y, p_s, sqrt*cos - p_y*sin
+
+
+def yaw(state:tuple[Array, ...], cos:Array, sin:Array, beta:float) -> tuple[Array, ...]:
+    """
+    RY rotation (components with longitudinal momentum, cos and sin of negative angle)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s, sqrt = state
+    tan = sin/cos
+    Q_x = q_x/cos/(1 - p_x/sqrt*tan)
+    Q_y = q_y + p_y*q_x*tan/(sqrt - p_x*tan)
+    Q_s = q_s - (1/beta + p_s)*q_x*tan/(sqrt - p_x*tan)
+    P_x = p_x*cos + sqrt*sin
+    return Q_x, Q_y, Q_s, P_x, p_y, p_s, sqrt*cos - p_x*sin
+
+
+def roll(state:tuple[Array, ...], cos:Array, sin:Array) -> tuple[Array, ...]:
+    """
+    RZ rotation (components with longitudinal momentum)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s, sqrt = state
+    Q_x = q_x*cos + q_y*sin
+    Q_y = q_y*cos - q_x*sin
+    P_x = p_x*cos + p_y*sin
+    P_y = p_y*cos - p_x*sin
+    return Q_x, Q_y, q_s, P_x, P_y, p_s, sqrt
+
+
+def fused_entrance(qsps:Array,
+                   dx:Array,
+                   dy:Array,
+                   dz:Array,
+                   wx:Array,
+                   wy:Array,
+                   wz:Array,
+                   beta:float=1.0,
+                   constant:float=0.0) -> Array:
+    """
+    Fused entrance transformation (TX, TY, TZ, RX, RY, RZ)
+
+    Parameters
+    ----------
+    qsps: Array
+        initial state
+    dx, dy, dz: Array
+        translation errors
+    wx, wy, wz: Array
+        rotation errors
+    beta: float, default=1.0
+        beta
+    constant: float, default=0.0
+        1/(beta*gamma)**2
+
+    Returns
+    -------
+    Array
+
+    Note
+    ----
+    Longitudinal momentum is computed once and rotated together with transverse momenta
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    sqrt, _ = longitudinal(p_x, p_y, p_s, beta, constant)
+    state = (q_x - dx, q_y - dy, q_s, p_x, p_y, p_s, sqrt)
+    state = shift(state, dz, beta, constant)
+    state = pitch(state, jax.numpy.cos(wx), -jax.numpy.sin(wx), beta)
+    state = yaw(state, jax.numpy.cos(wy), -jax.numpy.sin(wy), beta)
+    state = roll(state, jax.numpy.cos(wz), jax.numpy.sin(wz))
+    *state, _ = state
+    return jax.numpy.stack(state, axis=-1)
+
+
+def fused_exit(qsps:Array,
+               dx:Array,
+               dy:Array,
+               dz:Array,
+               wx:Array,
+               wy:Array,
+               wz:Array,
+               length:Array,
+               angle:Array=0.0,
+               flag:bool=False,
+               beta:float=1.0,
+               constant:float=0.0) -> Array:
+    """
+    Fused exit transformation (layout, RZ, RY, RX, TZ, TY, TX, layout)
+
+    Parameters
+    ----------
+    qsps: Array
+        initial state
+    dx, dy, dz: Array
+        translation errors
+    wx, wy, wz: Array
+        rotation errors
+    length: Array
+        layout block length
+    angle: Array, default=0.0
+        layout block angle
+    flag: bool, default=False
+        non-zero layout angle flag
+    beta: float, default=1.0
+        beta
+    constant: float, default=0.0
+        1/(beta*gamma)**2
+
+    Returns
+    -------
+    Array
+
+    Note
+    ----
+    Longitudinal momentum is computed once and rotated together with transverse momenta
+    Layout trigonometric factors are computed once and shared between both layout transformations
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    sqrt, _ = longitudinal(p_x, p_y, p_s, beta, constant)
+    state = (q_x, q_y, q_s, p_x, p_y, p_s, sqrt)
+    if flag:
+        cos = jax.numpy.cos(angle/2)
+        sin = jax.numpy.sin(angle/2)
+        chord = 2.0*length/angle*sin
+        state = yaw(state, cos, -sin, beta)
+        state = shift(state, -chord, beta, constant)
+        state = yaw(state, cos, -sin, beta)
+    else:
+        state = shift(state, -length, beta, constant)
+    state = roll(state, jax.numpy.cos(wz), -jax.numpy.sin(wz))
+    state = yaw(state, jax.numpy.cos(wy), jax.numpy.sin(wy), beta)
+    state = pitch(state, jax.numpy.cos(wx), jax.numpy.sin(wx), beta)
+    state = shift(state, -dz, beta, constant)
+    q_x, q_y, *state = state
+    state = (q_x + dx, q_y + dy, *state)
+    if flag:
+        state = yaw(state, cos, sin, beta)
+        state = shift(state, +chord, beta, constant)
+        state = yaw(state, cos, sin, beta)
+    else:
+        state = shift(state, +length, beta, constant)
+    *state, _ = state
+    return jax.numpy.stack(state, axis=-1)
+
+def tx(qsps:Array, dx:Array, *args:Array, precision:str='double') -> Array:
     """
     TX translation (sign matches MADX)
 
@@ -144,23 +385,20 @@ def tx(qsps:Array, dx:Array, *args:Array) -> Array:
         initial state
     dx: Array
         q_x translation error
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
     Array
 
     """
-    q_x, q_y, q_s, p_x, p_y, p_s = qsps
-    Q_x = q_x - dx
-    Q_y = q_y
-    Q_s = q_s
-    P_x = p_x
-    P_y = p_y
-    P_s = p_s
-    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s])
+    if precision != 'double':
+        return precise(lambda qsps, dx: tx(qsps, dx), precision)(qsps, dx)
+    return tx_kernel(qsps, dx)
 
 
-def ty(qsps:Array, dy:Array, *args:Array) -> Array:
+def ty(qsps:Array, dy:Array, *args:Array, precision:str='double') -> Array:
     """
     TY translation (sign matches MADX)
 
@@ -170,23 +408,20 @@ def ty(qsps:Array, dy:Array, *args:Array) -> Array:
         initial state
     dy: Array
         q_y translation error
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
     Array
 
     """
-    q_x, q_y, q_s, p_x, p_y, p_s = qsps
-    Q_x = q_x
-    Q_y = q_y - dy
-    Q_s = q_s
-    P_x = p_x
-    P_y = p_y
-    P_s = p_s
-    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s])
+    if precision != 'double':
+        return precise(lambda qsps, dy: ty(qsps, dy), precision)(qsps, dy)
+    return ty_kernel(qsps, dy)
 
 
-def tz(qsps:Array, dz:Array, beta:float=1.0, constant:float=0.0) -> Array:
+def tz(qsps:Array, dz:Array, beta:float=1.0, constant:float=0.0, precision:str='double') -> Array:
     """
     TZ translation (sign matches MADX)
 
@@ -200,24 +435,20 @@ def tz(qsps:Array, dz:Array, beta:float=1.0, constant:float=0.0) -> Array:
         beta
     constant: float, default=0.0
         1/(beta*gamma)**2
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
     Array
 
     """
-    q_x, q_y, q_s, p_x, p_y, p_s = qsps
-    sqrt = jax.numpy.sqrt((1/beta + p_s)**2 - p_x**2 - p_y**2 - constant)
-    Q_x = q_x + p_x*dz/sqrt
-    Q_y = q_y + p_y*dz/sqrt
-    Q_s = q_s + dz/beta - dz*(1/beta + p_s)/sqrt
-    P_x = p_x
-    P_y = p_y
-    P_s = p_s
-    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s])
+    if precision != 'double':
+        return precise(lambda qsps, dz: tz(qsps, dz, beta, constant), precision)(qsps, dz)
+    return tz_kernel(qsps, dz, beta, constant)
 
 
-def rx(qsps:Array, wx:Array, beta:float=1.0, constant:float=0.0) -> Array:
+def rx(qsps:Array, wx:Array, beta:float=1.0, constant:float=0.0, precision:str='double') -> Array:
     """
     RX rotation (sign matches MADX)
 
@@ -231,27 +462,20 @@ def rx(qsps:Array, wx:Array, beta:float=1.0, constant:float=0.0) -> Array:
         beta
     constant: float, default=0.0
         1/(beta*gamma)**2
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
     Array
 
     """
-    q_x, q_y, q_s, p_x, p_y, p_s = qsps
-    sqrt = jax.numpy.sqrt((1/beta + p_s)**2 - p_x**2 - p_y**2 - constant)
-    cos = jax.numpy.cos(-wx)
-    sin = jax.numpy.sin(-wx)
-    tan = sin/cos
-    Q_x = q_x + p_x*q_y*tan/(sqrt - p_y*tan)
-    Q_y = q_y/cos/(1 - p_y*tan/sqrt)
-    Q_s = q_s - (1/beta + p_s)*q_y*tan/(sqrt - p_y*tan)
-    P_x = p_x
-    P_y = p_y*cos + sqrt*sin
-    P_s = p_s
-    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s])
+    if precision != 'double':
+        return precise(lambda qsps, wx: rx(qsps, wx, beta, constant), precision)(qsps, wx)
+    return rx_kernel(qsps, wx, beta, constant)
 
 
-def ry(qsps:Array, wy:Array, beta:float=1.0, constant:float=0.0) -> Array:
+def ry(qsps:Array, wy:Array, beta:float=1.0, constant:float=0.0, precision:str='double') -> Array:
     """
     RY rotation (sign matches MADX)
 
@@ -265,27 +489,20 @@ def ry(qsps:Array, wy:Array, beta:float=1.0, constant:float=0.0) -> Array:
         beta
     constant: float, default=0.0
         1/(beta*gamma)**2
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
     Array
 
     """
-    q_x, q_y, q_s, p_x, p_y, p_s = qsps
-    sqrt = jax.numpy.sqrt((1/beta + p_s)**2 - p_x**2 - p_y**2 - constant)
-    cos = jax.numpy.cos(-wy)
-    sin = jax.numpy.sin(-wy)
-    tan = sin/cos
-    Q_x = q_x/cos/(1 - p_x/sqrt*tan)
-    Q_y = q_y + p_y*q_x*tan/(sqrt - p_x*tan)
-    Q_s = q_s - (1/beta + p_s)*q_x*tan/(sqrt - p_x*tan)
-    P_x = p_x*cos + sqrt*sin
-    P_y = p_y
-    P_s = p_s
-    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s])
+    if precision != 'double':
+        return precise(lambda qsps, wy: ry(qsps, wy, beta, constant), precision)(qsps, wy)
+    return ry_kernel(qsps, wy, beta, constant)
 
 
-def rz(qsps:Array, wz:Array) -> Array:
+def rz(qsps:Array, wz:Array, precision:str='double') -> Array:
     """
     RZ rotation (sign matches MADX)
 
@@ -295,13 +512,242 @@ def rz(qsps:Array, wz:Array) -> Array:
         initial state
     wz: Array
         q_z rotation angle
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
     Array
 
     """
-    q_x, q_y, q_s, p_x, p_y, p_s = qsps
+    if precision != 'double':
+        return precise(lambda qsps, wz: rz(qsps, wz), precision)(qsps, wz)
+    return rz_kernel(qsps, wz)
+
+
+@jax.custom_jvp
+def tx_kernel(qsps:Array, dx:Array) -> Array:
+    """
+    TX translation (analytic derivatives)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    Q_x = q_x - dx
+    Q_y = q_y
+    Q_s = q_s
+    P_x = p_x
+    P_y = p_y
+    P_s = p_s
+    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s], axis=-1)
+
+
+@tx_kernel.defjvp
+def tx_kernel_jvp(primals:tuple[Array, Array], tangents:tuple[Array, Array]) -> tuple[Array, Array]:
+    """
+    TX translation tangent map
+
+    """
+    qsps, dx = primals
+    dqsps, ddx = tangents
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    dq_x, dq_y, dq_s, dp_x, dp_y, dp_s = jax.numpy.unstack(dqsps, axis=-1)
+    result = jax.numpy.stack([q_x - dx, q_y, q_s, p_x, p_y, p_s], axis=-1)
+    tangent = jax.numpy.stack([dq_x - ddx, dq_y, dq_s, dp_x, dp_y, dp_s], axis=-1)
+    return result, tangent
+
+
+@jax.custom_jvp
+def ty_kernel(qsps:Array, dy:Array) -> Array:
+    """
+    TY translation (analytic derivatives)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    Q_x = q_x
+    Q_y = q_y - dy
+    Q_s = q_s
+    P_x = p_x
+    P_y = p_y
+    P_s = p_s
+    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s], axis=-1)
+
+
+@ty_kernel.defjvp
+def ty_kernel_jvp(primals:tuple[Array, Array], tangents:tuple[Array, Array]) -> tuple[Array, Array]:
+    """
+    TY translation tangent map
+
+    """
+    qsps, dy = primals
+    dqsps, ddy = tangents
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    dq_x, dq_y, dq_s, dp_x, dp_y, dp_s = jax.numpy.unstack(dqsps, axis=-1)
+    result = jax.numpy.stack([q_x, q_y - dy, q_s, p_x, p_y, p_s], axis=-1)
+    tangent = jax.numpy.stack([dq_x, dq_y - ddy, dq_s, dp_x, dp_y, dp_s], axis=-1)
+    return result, tangent
+
+
+@partial(jax.custom_jvp, nondiff_argnums=(2, 3))
+def tz_kernel(qsps:Array, dz:Array, beta:float=1.0, constant:float=0.0) -> Array:
+    """
+    TZ translation (analytic derivatives)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    sqrt, ds = longitudinal(p_x, p_y, p_s, beta, constant)
+    Q_x = q_x + p_x*dz/sqrt
+    Q_y = q_y + p_y*dz/sqrt
+    Q_s = q_s + dz*ds
+    P_x = p_x
+    P_y = p_y
+    P_s = p_s
+    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s], axis=-1)
+
+
+@tz_kernel.defjvp
+@analytic
+def tz_kernel_jvp(beta:float, constant:float, primals:tuple[Array, Array], tangents:tuple[Array, Array]) -> tuple[Array, Array]:
+    """
+    TZ translation tangent map
+
+    """
+    qsps, dz = primals
+    dqsps, ddz = tangents
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    dq_x, dq_y, dq_s, dp_x, dp_y, dp_s = jax.numpy.unstack(dqsps, axis=-1)
+    (sqrt, ds), (dsqrt, dds) = differential(p_x, p_y, p_s, dp_x, dp_y, dp_s, beta, constant)
+    Q_x = q_x + p_x*dz/sqrt
+    Q_y = q_y + p_y*dz/sqrt
+    Q_s = q_s + dz*ds
+    dQ_x = dq_x + (dp_x*dz + p_x*ddz)/sqrt - p_x*dz*dsqrt/sqrt**2
+    dQ_y = dq_y + (dp_y*dz + p_y*ddz)/sqrt - p_y*dz*dsqrt/sqrt**2
+    dQ_s = dq_s + ddz*ds + dz*dds
+    result = jax.numpy.stack([Q_x, Q_y, Q_s, p_x, p_y, p_s], axis=-1)
+    tangent = jax.numpy.stack([dQ_x, dQ_y, dQ_s, dp_x, dp_y, dp_s], axis=-1)
+    return result, tangent
+
+
+@partial(jax.custom_jvp, nondiff_argnums=(2, 3))
+def rx_kernel(qsps:Array, wx:Array, beta:float=1.0, constant:float=0.0) -> Array:
+    """
+    RX rotation (analytic derivatives)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    sqrt, _ = longitudinal(p_x, p_y, p_s, beta, constant)
+    cos = jax.numpy.cos(-wx)
+    sin = jax.numpy.sin(-wx)
+    tan = sin/cos
+    Q_x = q_x + p_x*q_y*tan/(sqrt - p_y*tan)
+    Q_y = q_y/cos/(1 - p_y*tan/sqrt)
+    Q_s = q_s - (1/beta + p_s)*q_y*tan/(sqrt - p_y*tan)
+    P_x = p_x
+    P_y = p_y*cos + sqrt*sin
+    P_s = p_s
+    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s], axis=-1)
+
+
+@rx_kernel.defjvp
+@analytic
+def rx_kernel_jvp(beta:float, constant:float, primals:tuple[Array, Array], tangents:tuple[Array, Array]) -> tuple[Array, Array]:
+    """
+    RX rotation tangent map
+
+    """
+    qsps, wx = primals
+    dqsps, dwx = tangents
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    dq_x, dq_y, dq_s, dp_x, dp_y, dp_s = jax.numpy.unstack(dqsps, axis=-1)
+    (sqrt, _), (dsqrt, _) = differential(p_x, p_y, p_s, dp_x, dp_y, dp_s, beta, constant)
+    cos = jax.numpy.cos(-wx)
+    sin = jax.numpy.sin(-wx)
+    tan = sin/cos
+    dcos = +sin*dwx
+    dsin = -cos*dwx
+    dtan = -dwx/cos**2
+    d = sqrt - p_y*tan
+    dd = dsqrt - dp_y*tan - p_y*dtan
+    a = q_y*tan/d
+    da = (dq_y*tan + q_y*dtan - a*dd)/d
+    b = 1/cos/(1 - p_y*tan/sqrt)
+    db = b*(dsqrt/sqrt - dcos/cos - dd/d)
+    Q_x = q_x + p_x*a
+    Q_y = q_y*b
+    Q_s = q_s - (1/beta + p_s)*a
+    P_y = p_y*cos + sqrt*sin
+    dQ_x = dq_x + dp_x*a + p_x*da
+    dQ_y = dq_y*b + q_y*db
+    dQ_s = dq_s - dp_s*a - (1/beta + p_s)*da
+    dP_y = dp_y*cos + p_y*dcos + dsqrt*sin + sqrt*dsin
+    result = jax.numpy.stack([Q_x, Q_y, Q_s, p_x, P_y, p_s], axis=-1)
+    tangent = jax.numpy.stack([dQ_x, dQ_y, dQ_s, dp_x, dP_y, dp_s], axis=-1)
+    return result, tangent
+
+
+@partial(jax.custom_jvp, nondiff_argnums=(2, 3))
+def ry_kernel(qsps:Array, wy:Array, beta:float=1.0, constant:float=0.0) -> Array:
+    """
+    RY rotation (analytic derivatives)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    sqrt, _ = longitudinal(p_x, p_y, p_s, beta, constant)
+    cos = jax.numpy.cos(-wy)
+    sin = jax.numpy.sin(-wy)
+    tan = sin/cos
+    Q_x = q_x/cos/(1 - p_x/sqrt*tan)
+    Q_y = q_y + p_y*q_x*tan/(sqrt - p_x*tan)
+    Q_s = q_s - (1/beta + p_s)*q_x*tan/(sqrt - p_x*tan)
+    P_x = p_x*cos + sqrt*sin
+    P_y = p_y
+    P_s = p_s
+    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s], axis=-1)
+
+
+@ry_kernel.defjvp
+@analytic
+def ry_kernel_jvp(beta:float, constant:float, primals:tuple[Array, Array], tangents:tuple[Array, Array]) -> tuple[Array, Array]:
+    """
+    RY rotation tangent map
+
+    """
+    qsps, wy = primals
+    dqsps, dwy = tangents
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    dq_x, dq_y, dq_s, dp_x, dp_y, dp_s = jax.numpy.unstack(dqsps, axis=-1)
+    (sqrt, _), (dsqrt, _) = differential(p_x, p_y, p_s, dp_x, dp_y, dp_s, beta, constant)
+    cos = jax.numpy.cos(-wy)
+    sin = jax.numpy.sin(-wy)
+    tan = sin/cos
+    dcos = +sin*dwy
+    dsin = -cos*dwy
+    dtan = -dwy/cos**2
+    d = sqrt - p_x*tan
+    dd = dsqrt - dp_x*tan - p_x*dtan
+    a = q_x*tan/d
+    da = (dq_x*tan + q_x*dtan - a*dd)/d
+    b = 1/cos/(1 - p_x/sqrt*tan)
+    db = b*(dsqrt/sqrt - dcos/cos - dd/d)
+    Q_x = q_x*b
+    Q_y = q_y + p_y*a
+    Q_s = q_s - (1/beta + p_s)*a
+    P_x = p_x*cos + sqrt*sin
+    dQ_x = dq_x*b + q_x*db
+    dQ_y = dq_y + dp_y*a + p_y*da
+    dQ_s = dq_s - dp_s*a - (1/beta + p_s)*da
+    dP_x = dp_x*cos + p_x*dcos + dsqrt*sin + sqrt*dsin
+    result = jax.numpy.stack([Q_x, Q_y, Q_s, P_x, p_y, p_s], axis=-1)
+    tangent = jax.numpy.stack([dQ_x, dQ_y, dQ_s, dP_x, dp_y, dp_s], axis=-1)
+    return result, tangent
+
+
+@jax.custom_jvp
+def rz_kernel(qsps:Array, wz:Array) -> Array:
+    """
+    RZ rotation (analytic derivatives)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
     cos = jax.numpy.cos(wz)
     sin = jax.numpy.sin(wz)
     Q_x = q_x*cos + q_y*sin
@@ -310,4 +756,29 @@ def rz(qsps:Array, wz:Array) -> Array:
     P_x = p_x*cos + p_y*sin
     P_y = p_y*cos - p_x*sin
     P_s = p_s
-    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s])
+    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s], axis=-1)
+
+
+@rz_kernel.defjvp
+def rz_kernel_jvp(primals:tuple[Array, Array], tangents:tuple[Array, Array]) -> tuple[Array, Array]:
+    """
+    RZ rotation tangent map
+
+    """
+    qsps, wz = primals
+    dqsps, dwz = tangents
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    dq_x, dq_y, dq_s, dp_x, dp_y, dp_s = jax.numpy.unstack(dqsps, axis=-1)
+    cos = jax.numpy.cos(wz)
+    sin = jax.numpy.sin(wz)
+    Q_x = q_x*cos + q_y*sin
+    Q_y = q_y*cos - q_x*sin
+    P_x = p_x*cos + p_y*sin
+    P_y = p_y*cos - p_x*sin
+    dQ_x = dq_x*cos + dq_y*sin + Q_y*dwz
+    dQ_y = dq_y*cos - dq_x*sin - Q_x*dwz
+    dP_x = dp_x*cos + dp_y*sin + P_y*dwz
+    dP_y = dp_y*cos - dp_x*sin - P_x*dwz
+    result = jax.numpy.stack([Q_x, Q_y, q_s, P_x, P_y, p_s], axis=-1)
+    tangent = jax.numpy.stack([dQ_x, dQ_y, dq_s, dP_x, dP_y, dp_s], axis=-1)
+    return result, tangent
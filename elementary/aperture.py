@@ -0,0 +1,192 @@
+"""
+Aperture
+--------
+
+Apertures, particle losses and surviving particles compaction
+
+"""
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+import numpy
+
+import jax
+from jax import Array
+
+from elementary.line import group
+from elementary.line import switch
+
+
+def rectangular(x:float, y:float) -> Callable[[Array], Array]:
+    """
+    Rectangular aperture
+
+    Parameters
+    ----------
+    x: float
+        horizontal half size
+    y: float
+        vertical half size
+
+    Returns
+    -------
+    Callable[[Array], Array]
+
+    """
+    def aperture(qsps:Array) -> Array:
+        q_x, q_y, *_ = jax.numpy.unstack(qsps, axis=-1)
+        return (jax.numpy.abs(q_x) <= x) & (jax.numpy.abs(q_y) <= y)
+    return aperture
+
+
+def elliptic(x:float, y:float) -> Callable[[Array], Array]:
+    """
+    Elliptic aperture
+
+    Parameters
+    ----------
+    x: float
+        horizontal semi axis
+    y: float
+        vertical semi axis
+
+    Returns
+    -------
+    Callable[[Array], Array]
+
+    """
+    def aperture(qsps:Array) -> Array:
+        q_x, q_y, *_ = jax.numpy.unstack(qsps, axis=-1)
+        return (q_x/x)**2 + (q_y/y)**2 <= 1.0
+    return aperture
+
+
+def loss_factory(elements:list[tuple[Any, ...]],
+                 apertures:list[Optional[Callable[[Array], Array]]]) -> tuple[Callable[..., tuple[Array, Array]], tuple[Array, ...]]:
+    """
+    Generate line transfer map with apertures
+
+    Parameters
+    ----------
+    elements: list[tuple[Any, ...]]
+        ordered (element, *parameters) specifications
+    apertures: list[Optional[Callable[[Array], Array]]]
+        aperture at each element exit (None for no aperture)
+
+    Returns
+    -------
+    tuple[Callable[..., tuple[Array, Array]], tuple[Array, ...]]
+        line transfer map with (qsps, parameters) signature and initial (grouped) parameters
+
+    Note
+    ----
+    The resulting map returns final state and loss element index (-1 for surviving particle)
+    Particle is lost if it is outside of the aperture or if its state is not finite
+    Lost particle state is frozen at the last valid state (no nan propagation)
+    Apertures are grouped by identity, i.e. the same aperture callable defines one kind
+
+    """
+    if len(apertures) != len(elements):
+        raise ValueError(f'Expected {len(elements)} apertures, got {len(apertures)}')
+    kinds, kind, index, parameters = group(elements)
+    step = switch(kinds)
+    checks = [lambda qsps: jax.numpy.bool_(True)]
+    check = []
+    for aperture in apertures:
+        if aperture is None:
+            check.append(0)
+            continue
+        if not any(aperture is other for other in checks):
+            checks.append(aperture)
+        check.append(next(i for i, other in enumerate(checks) if aperture is other))
+    check = jax.numpy.asarray(check, dtype=jax.numpy.int32)
+    count = jax.numpy.arange(len(elements), dtype=jax.numpy.int32)
+    def line(qsps:Array, parameters:tuple[Array, ...]) -> tuple[Array, Array]:
+        def body(carry:tuple[Array, Array], xs:tuple[Array, ...]) -> tuple[tuple[Array, Array], None]:
+            qsps, lost = carry
+            kind, index, check, count = xs
+            state = step(qsps, kind, index, parameters)
+            valid = jax.numpy.all(jax.numpy.isfinite(state)) & jax.lax.switch(check, checks, state)
+            lost = jax.numpy.where((lost < 0) & ~valid, count, lost)
+            qsps = jax.numpy.where(lost < 0, state, qsps)
+            return (qsps, lost), None
+        (qsps, lost), _ = jax.lax.scan(body, (qsps, jax.numpy.int32(-1)), (kind, index, check, count))
+        return qsps, lost
+    return line, parameters
+
+
+def bucket(size:int, minimum:int=64) -> int:
+    """
+    Bucketed batch size (power of two)
+
+    """
+    return max(minimum, 1 << max(0, size - 1).bit_length())
+
+
+def survive(ring:Callable[..., tuple[Array, Array]],
+            qsps:Array,
+            turns:int,
+            *args:Array,
+            block:int=64,
+            minimum:int=64) -> tuple[Array, Array, Array]:
+    """
+    Track with losses and periodic compaction of surviving particles
+
+    Parameters
+    ----------
+    ring: Callable[..., tuple[Array, Array]]
+        single particle one-turn map with (qsps, *args) signature returning state and loss element index
+    qsps: Array
+        initial states with (n, 6) shape
+    turns: int
+        number of turns
+    *args: Array
+        one-turn map parameters
+    block: int, default=64
+        number of turns between compactions
+    minimum: int, default=64
+        minimum bucket size
+
+    Returns
+    -------
+    tuple[Array, Array, Array]
+        final (or last valid) states, loss turn and loss element (-1 for surviving particles)
+
+    Note
+    ----
+    After each block of turns, surviving particles are gathered and padded to a power of two bucket size
+    Thus, the cost is proportional to the number of surviving particles and recompilation is limited to bucket sizes
+
+    """
+    def run(qsps:Array, start:Array, count:Array, *args:Array) -> tuple[Array, Array, Array]:
+        def particle(qsps:Array) -> tuple[Array, Array, Array]:
+            def body(turn:Array, carry:tuple[Array, Array, Array]) -> tuple[Array, Array, Array]:
+                qsps, lost, element = carry
+                state, index = ring(qsps, *args)
+                active = (lost < 0) & (turn < count)
+                loss = active & (index >= 0)
+                lost = jax.numpy.where(loss, start + turn, lost)
+                element = jax.numpy.where(loss, index, element)
+                qsps = jax.numpy.where(active, state, qsps)
+                return qsps, lost, element
+            return jax.lax.fori_loop(0, block, body, (qsps, jax.numpy.int32(-1), jax.numpy.int32(-1)))
+        return jax.vmap(particle)(qsps)
+    run = jax.jit(run)
+    states = numpy.array(qsps)
+    turn = numpy.full(len(states), -1, dtype=numpy.int32)
+    element = numpy.full(len(states), -1, dtype=numpy.int32)
+    alive = numpy.arange(len(states))
+    start = 0
+    while start < turns and len(alive):
+        size = bucket(len(alive), minimum)
+        index = numpy.concatenate([alive, numpy.full(size - len(alive), alive[0])])
+        count = min(block, turns - start)
+        result, lost, where = map(numpy.asarray, run(jax.numpy.asarray(states[index]), start, count, *args))
+        result, lost, where = result[:len(alive)], lost[:len(alive)], where[:len(alive)]
+        states[alive] = result
+        turn[alive] = lost
+        element[alive] = where
+        alive = alive[lost < 0]
+        start += count
+    return jax.numpy.asarray(states), jax.numpy.asarray(turn), jax.numpy.asarray(element)
@@ -0,0 +1,186 @@
+"""
+Artifact
+--------
+
+Serialized ahead-of-time exported lines and tracking tasks
+
+"""
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+from hashlib import sha256
+from json import dumps
+from json import loads
+from pathlib import Path
+
+import numpy
+
+import jax
+from jax import Array
+
+from elementary import __version__
+
+
+def digest(args:tuple[Any, ...]) -> str:
+    """
+    Parameters digest (hash of values, shapes and types)
+
+    """
+    value = sha256()
+    for arg in jax.tree.leaves(args):
+        arg = numpy.asarray(arg)
+        value.update(f'{arg.dtype}{arg.shape}'.encode('utf-8'))
+        value.update(numpy.ascontiguousarray(arg).tobytes())
+    return value.hexdigest()
+
+
+def save(function:Callable[..., Array],
+         path:str|Path,
+         qsps:Array,
+         *args:Any,
+         metadata:Optional[dict[str, Any]]=None) -> None:
+    """
+    Export (trace, lower and serialize) single particle function with symbolic batch dimension
+
+    Parameters
+    ----------
+    function: Callable[..., Array]
+        single particle function (element, line, ring, tracking, ...) with (qsps, *args) signature
+    path: str|Path
+        output file
+    qsps: Array
+        representative state with (6, ) shape (defines type)
+    *args: Any
+        parameters (array leaves, embedded into artifact)
+    metadata: Optional[dict[str, Any]]
+        user metadata (JSON serializable)
+
+    Returns
+    -------
+    None
+
+    Note
+    ----
+    The exported function has (qsps, *args) signature with qsps of (b, 6) shape for any batch size b
+    Parameters are not baked in, embedded parameters are used by default on load
+
+    """
+    leaves, tree = jax.tree.flatten(args)
+    (size, ) = jax.export.symbolic_shape('b')
+    task = jax.jit(jax.vmap(lambda qsps, *leaves: function(qsps, *jax.tree.unflatten(tree, leaves)),
+                            in_axes=(0, *[None]*len(leaves))))
+    exported = jax.export.export(task)(jax.ShapeDtypeStruct((size, 6), jax.numpy.result_type(qsps)),
+                                       *(jax.ShapeDtypeStruct(jax.numpy.shape(leaf), jax.numpy.result_type(leaf)) for leaf in leaves))
+    header = dict(elementary=__version__,
+                  jax=jax.__version__,
+                  digest=digest(args),
+                  shapes=[list(jax.numpy.shape(leaf)) for leaf in leaves],
+                  dtypes=[str(jax.numpy.result_type(leaf)) for leaf in leaves],
+                  metadata=metadata if metadata else {})
+    with Path(path).open('wb') as stream:
+        numpy.savez(stream,
+                    header=numpy.array(dumps(header, sort_keys=True)),
+                    module=numpy.frombuffer(exported.serialize(), dtype=numpy.uint8),
+                    **{f'leaf{i}': numpy.asarray(leaf) for i, leaf in enumerate(leaves)})
+
+
+def header(path:str|Path) -> dict[str, Any]:
+    """
+    Read artifact header
+
+    """
+    with numpy.load(path) as data:
+        return loads(str(data['header']))
+
+
+def stale(path:str|Path, *args:Any) -> bool:
+    """
+    Check whether artifact is stale
+
+    Parameters
+    ----------
+    path: str|Path
+        artifact file
+    *args: Any
+        current parameters (compared if given)
+
+    Returns
+    -------
+    bool
+        True if elementary or jax versions differ or parameters differ from embedded ones
+
+    """
+    value = header(path)
+    if value['elementary'] != __version__ or value['jax'] != jax.__version__:
+        return True
+    return bool(args) and value['digest'] != digest(args)
+
+
+def validate(avals:tuple[Any, ...], qsps:Array, *leaves:Any) -> None:
+    """
+    Compare arguments with exported abstract values (symbolic dimensions match any size)
+
+    Parameters
+    ----------
+    avals: tuple[Any, ...]
+        exported input abstract values
+    qsps: Array
+        state
+    *leaves: Any
+        parameter leaves
+
+    Returns
+    -------
+    None
+
+    """
+    if len(leaves) + 1 != len(avals):
+        raise ValueError(f'Expected {len(avals) - 1} parameter leaves, got {len(leaves)}')
+    for i, (aval, arg) in enumerate(zip(avals, (qsps, *leaves))):
+        name = 'qsps' if i == 0 else f'argument {i - 1}'
+        shape, dtype = jax.numpy.shape(arg), jax.numpy.result_type(arg)
+        if len(shape) != len(aval.shape) or any(isinstance(dim, int) and dim != size for dim, size in zip(aval.shape, shape)):
+            raise ValueError(f'Expected {name} with {aval.shape} shape, got {shape}')
+        if dtype != aval.dtype:
+            raise ValueError(f'Expected {name} with {aval.dtype} dtype, got {dtype}')
+
+
+def load(path:str|Path,
+         check:bool=True) -> Callable[..., Array]:
+    """
+    Load exported function
+
+    Parameters
+    ----------
+    path: str|Path
+        artifact file
+    check: bool, default=True
+        flag to raise ValueError for artifacts exported with different elementary or jax versions
+
+    Returns
+    -------
+    Callable[..., Array]
+        function with (qsps, *args) signature, qsps with (b, 6) shape
+        embedded parameters are used if args are not given
+        parameters should have the same structure as on export
+        ValueError is raised for arguments with shapes or dtypes different from export
+
+    Note
+    ----
+    Element factories are not traced, the serialized module is compiled directly
+
+    """
+    with numpy.load(path) as data:
+        value = loads(str(data['header']))
+        module = bytearray(data['module'].tobytes())
+        leaves = [jax.numpy.asarray(data[f'leaf{i}']) for i in range(len(value['shapes']))]
+    if check and (value['elementary'] != __version__ or value['jax'] != jax.__version__):
+        raise ValueError(f'Expected artifact for elementary {__version__} and jax {jax.__version__}, '
+                         f'got {value["elementary"]} and {value["jax"]}')
+    exported = jax.export.deserialize(module)
+    def function(qsps:Array, *args:Any) -> Array:
+        arguments = jax.tree.leaves(args) if args else leaves
+        validate(exported.in_avals, qsps, *arguments)
+        return exported.call(qsps, *arguments)
+    return function
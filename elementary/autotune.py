@@ -0,0 +1,179 @@
+"""
+Autotune
+--------
+
+Integration parameters (driver, order, iterations, settings) autotuner
+
+"""
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+from itertools import product
+from json import dump
+from json import dumps
+from json import load
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+import jax
+from jax import Array
+
+from elementary.cache import freeze
+
+PATH:Path = Path.home() / '.cache' / 'elementary' / 'autotune.json'
+
+
+def regime(parameters:tuple[Any, ...], digits:int=1) -> tuple[str, ...]:
+    """
+    Parameter regime (rounded parameters)
+
+    Parameters
+    ----------
+    parameters: tuple[Any, ...]
+        element parameters
+    digits: int, default=1
+        number of significant digits after the leading digit
+
+    Returns
+    -------
+    tuple[str, ...]
+
+    """
+    return tuple(f'{float(parameter):.{digits}e}' for parameter in parameters)
+
+
+def name(value:Any) -> str:
+    """
+    Stable name of factory, driver or settings
+
+    """
+    if value is None:
+        return 'None'
+    if callable(value):
+        return f'{value.__module__}.{value.__qualname__}'
+    return dumps(value, sort_keys=True, default=str)
+
+
+def latency(element:Callable[..., Array], qsps:Array, parameters:tuple[Any, ...], repeat:int) -> float:
+    """
+    Median latency of compiled element
+
+    """
+    function = jax.jit(element)
+    function(qsps, *parameters).block_until_ready()
+    times = []
+    for _ in range(repeat):
+        time = perf_counter()
+        function(qsps, *parameters).block_until_ready()
+        times.append(perf_counter() - time)
+    return median(times)
+
+
+def autotune(factory:Callable[..., Callable[..., Array]],
+             parameters:tuple[Any, ...],
+             tolerance:float, *,
+             qsps:Optional[Array]=None,
+             options:Optional[dict]=None,
+             drivers:tuple[Optional[Callable[..., Array]], ...]=(None, ),
+             settings:tuple[Optional[dict], ...]=(None, ),
+             orders:tuple[int, ...]=(0, 1, 2),
+             iterations:tuple[int, ...]=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+             reference:Optional[Array]=None,
+             repeat:int=10,
+             path:Optional[str|Path]=None,
+             cache:bool=True) -> dict[str, Any]:
+    """
+    Find the cheapest integration configuration within given tolerance
+
+    Parameters
+    ----------
+    factory: Callable[..., Callable[..., Array]]
+        element factory (driver, settings, order and iterations keywords)
+    parameters: tuple[Any, ...]
+        representative element parameters
+    tolerance: float
+        maximum absolute deviation from reference
+    qsps: Optional[Array]
+        representative initial states with (n, 6) shape
+    options: Optional[dict]
+        fixed factory keyword arguments (beta, gamma, ...)
+    drivers: tuple[Optional[Callable[..., Array]], ...], default=(None, )
+        candidate integrators (None for default tao)
+    settings: tuple[Optional[dict], ...], default=(None, )
+        candidate integrator settings (e.g. tao binding values)
+    orders: tuple[int, ...], default=(0, 1, 2)
+        candidate yoshida composition orders
+    iterations: tuple[int, ...]
+        candidate numbers of integration steps (increasing)
+    reference: Optional[Array]
+        reference final states (default highest order with four times maximum iterations)
+    repeat: int, default=10
+        number of timed evaluations
+    path: Optional[str|Path]
+        cache file (default ~/.cache/elementary/autotune.json)
+    cache: bool, default=True
+        flag to use on-disk cache
+
+    Returns
+    -------
+    dict[str, Any]
+        driver, settings, order, iterations, error and latency of the selected configuration
+
+    Note
+    ----
+    For each (driver, settings, order), the smallest number of iterations within tolerance is found
+    Such candidates are timed and the fastest one is selected
+    Results are cached per factory, options, parameter regime, tolerance and candidate grid
+    ValueError is raised if no candidate meets the tolerance
+
+    """
+    options = options if options else {}
+    if qsps is None:
+        qsps = jax.numpy.array([[+1.0E-3, -1.0E-3, 0.0, +1.0E-4, -1.0E-4, 0.0],
+                                [-5.0E-3, +5.0E-3, 0.0, -5.0E-4, +5.0E-4, +1.0E-4],
+                                [+1.0E-2, +1.0E-2, 0.0, +1.0E-3, +1.0E-3, -1.0E-4]])
+    path = Path(path) if path else PATH
+    key = dumps(dict(factory=name(factory),
+                     options=name(freeze(options)),
+                     regime=regime(parameters),
+                     tolerance=tolerance,
+                     drivers=[name(driver) for driver in drivers],
+                     settings=[name(setting) for setting in settings],
+                     orders=list(orders),
+                     iterations=list(iterations)), sort_keys=True)
+    table = {}
+    if cache and path.exists():
+        with path.open('r', encoding='utf-8') as stream:
+            table = load(stream)
+    if key in table:
+        result = dict(table[key])
+        result['driver'] = next(driver for driver in drivers if name(driver) == result['driver'])
+        result['settings'] = next(setting for setting in settings if name(setting) == result['settings'])
+        return result
+    if reference is None:
+        element = factory(**options, driver=drivers[0], settings=settings[0], order=max(orders), iterations=4*max(iterations))
+        reference = element(qsps, *parameters)
+    candidates = []
+    for driver, setting, order in product(drivers, settings, orders):
+        for count in iterations:
+            element = factory(**options, driver=driver, settings=setting, order=order, iterations=count)
+            error = float(jax.numpy.max(jax.numpy.abs(element(qsps, *parameters) - reference)))
+            if error <= tolerance:
+                candidates.append(dict(driver=driver,
+                                       settings=setting,
+                                       order=order,
+                                       iterations=count,
+                                       error=error,
+                                       latency=latency(element, qsps, parameters, repeat)))
+                break
+    if not candidates:
+        raise ValueError(f'No candidate configuration meets tolerance {tolerance}')
+    result = min(candidates, key=lambda candidate: candidate['latency'])
+    if cache:
+        table[key] = {**result, 'driver': name(result['driver']), 'settings': name(result['settings'])}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('w', encoding='utf-8') as stream:
+            dump(table, stream, indent=2)
+    return result
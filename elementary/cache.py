@@ -0,0 +1,152 @@
+"""
+Cache
+-----
+
+Element factory registry and persistent compilation cache
+
+"""
+from typing import Any
+from typing import Callable
+from typing import Hashable
+from typing import Optional
+
+from collections import OrderedDict
+from functools import wraps
+from inspect import signature
+from pathlib import Path
+
+import jax
+
+SIZE:int = 256
+REGISTRY:OrderedDict[Hashable, Any] = OrderedDict()
+
+
+def freeze(value:Any) -> Hashable:
+    """
+    Convert factory argument to hashable key
+
+    Parameters
+    ----------
+    value: Any
+        factory argument
+
+    Returns
+    -------
+    Hashable
+
+    Note
+    ----
+    Dictionaries, lists and tuples are converted recursively, callables are compared by identity
+    TypeError is raised for unhashable values
+
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    hash(value)
+    return value
+
+
+def memoize(factory:Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Memoize element factory
+
+    Parameters
+    ----------
+    factory: Callable[..., Any]
+        element factory
+
+    Returns
+    -------
+    Callable[..., Any]
+
+    Note
+    ----
+    Factory invocations with identical arguments return the same (previously generated) object
+    Arguments are bound to factory signature with defaults applied (positional, keyword and default spellings match)
+    Thus, jax can reuse traced and compiled functions across factory invocations
+    Least recently used entries are evicted once the registry size exceeds SIZE
+    Invocations with unhashable arguments (e.g. arrays) are not cached
+
+    """
+    parameters = signature(factory)
+    @wraps(factory)
+    def wrapper(*args:Any, **kwargs:Any) -> Any:
+        try:
+            bound = parameters.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (factory.__module__, factory.__qualname__, freeze(bound.arguments))
+        except TypeError:
+            return factory(*args, **kwargs)
+        if key in REGISTRY:
+            REGISTRY.move_to_end(key)
+            return REGISTRY[key]
+        value = factory(*args, **kwargs)
+        REGISTRY[key] = value
+        while len(REGISTRY) > SIZE:
+            REGISTRY.popitem(last=False)
+        return value
+    return wrapper
+
+
+def resize(size:int) -> None:
+    """
+    Set registry size (evict least recently used entries)
+
+    Parameters
+    ----------
+    size: int
+        maximum number of registry entries
+
+    Returns
+    -------
+    None
+
+    """
+    global SIZE
+    SIZE = size
+    while len(REGISTRY) > SIZE:
+        REGISTRY.popitem(last=False)
+
+
+def clear() -> None:
+    """
+    Clear registry
+
+    Returns
+    -------
+    None
+
+    """
+    REGISTRY.clear()
+
+
+def persistent(path:Optional[str|Path]=None,
+               time:float=0.0) -> Path:
+    """
+    Enable persistent (on-disk) compilation cache
+
+    Parameters
+    ----------
+    path: Optional[str|Path]
+        cache directory (default ~/.cache/elementary)
+    time: float, default=0.0
+        minimum compilation time (in seconds) for an entry to be cached
+
+    Returns
+    -------
+    Path
+
+    Note
+    ----
+    Compiled executables are reused across processes (warm restarts skip compilation)
+    Alternatively, set ELEMENTARY_CACHE environment variable before import
+
+    """
+    path = Path(path) if path else Path.home() / '.cache' / 'elementary'
+    path.mkdir(parents=True, exist_ok=True)
+    jax.config.update('jax_compilation_cache_dir', str(path))
+    jax.config.update('jax_persistent_cache_min_compile_time_secs', time)
+    jax.config.update('jax_persistent_cache_min_entry_size_bytes', 0)
+    return path
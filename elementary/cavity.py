@@ -14,9 +14,12 @@ from jax import Array
 
 from elementary.util import CL
 from elementary.util import bessel
+from elementary.cache import memoize
 from elementary.element import element_factory
+from elementary.precision import precise
 
 
+@memoize
 def cavity_factory(rigidity:float,
                    kind:Literal['kick', 'main'] = 'kick',
                    beta:Optional[float]=None,
@@ -26,7 +29,9 @@ def cavity_factory(rigidity:float,
                    order:int=0,
                    iterations:int=1,
                    final:bool=True,
-                   epsilon:float=1.0E-15) -> Callable[..., Array]:
+                   epsilon:float=1.0E-15,
+                   step:Optional[float]=None,
+                   precision:str='double') -> Callable[..., Array]:
     """
     Cavity element transfer map
 
@@ -52,6 +57,10 @@ def cavity_factory(rigidity:float,
         flag to return only the final state
     epsilon: float, default=1.0E-15
         epsilon
+    step: Optional[float]
+        maximum integration step length (overrides iterations)
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
@@ -60,14 +69,15 @@ def cavity_factory(rigidity:float,
     """
     if kind == 'kick':
         def cavity(qsps, voltage, lag):
-            q_x, q_y, q_s, p_x, p_y, p_s = qsps
+            q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
             Q_x = q_x
             Q_y = q_y
             Q_s = q_s
             P_x = p_x
             P_y = p_y
             P_s = p_s + (1E6*voltage)/(rigidity*CL)*jax.numpy.sin(lag)
-            return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s])
+            return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s], axis=-1)
+        cavity = precise(cavity, precision)
     if kind == 'main':
         def vector(qs:Array,
                    s:Array,
@@ -97,6 +107,8 @@ def cavity_factory(rigidity:float,
                                   settings=settings,
                                   order=order,
                                   iterations=iterations,
+                                  step=step,
+                                  precision=precision,
                                   autonomous=False,
                                   final=final)
         def cavity(qsps, length, voltage, frequency, lag):
@@ -8,11 +8,22 @@ Dipole element factory
 from typing import Optional
 from typing import Callable
 
+from fractions import Fraction
+from functools import lru_cache
+from functools import partial
+from math import factorial
+
+import numpy
+
 import jax
 from jax import Array
 
+from elementary.cache import memoize
 from elementary.element import element_factory
+from elementary.precision import precise
+from elementary.util import analytic
 
+@memoize
 def dipole_factory(exact:bool=True,
                    multipole:bool=False,
                    beta:Optional[float]=None,
@@ -21,7 +32,11 @@ def dipole_factory(exact:bool=True,
                    settings:Optional[dict]=None,
                    order:int=0,
                    iterations:int=1,
-                   final:bool=True) -> Callable[..., Array]:
+                   final:bool=True,
+                   step:Optional[float]=None,
+                   limit:int=3,
+                   degree:int=10,
+                   precision:str='double') -> Callable[..., Array]:
     """
     Dipole element transfer map
 
@@ -45,6 +60,14 @@ def dipole_factory(exact:bool=True,
         number of integration
     final: bool, default=True
         flag to return only the final state
+    step: Optional[float]
+        maximum integration step length (overrides iterations)
+    limit: int, default=3
+        highest multipole order (1 for quadrupole, 2 for sextupole, 3 for octupole, ...)
+    degree: int, default=10
+        multipole potential truncation degree
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
@@ -55,28 +78,15 @@ def dipole_factory(exact:bool=True,
         beta = beta if beta else 1.0
         constant = 1/(beta**2*gamma**2) if gamma else 0.0
         def dipole(qsps:Array, length:Array, angle:Array) -> Array:
-            return mapping(qsps, length, angle, beta, constant)
+            return mapping(qsps, length, angle, beta, constant, precision)
         return dipole
     def vector(qs:Array, s:Array, r:Array) -> tuple[Array, Array, Array]:
         return vector_dipole(qs, s, r)
     if multipole:
-        def vector(qs:Array,
-                   s:Array,
-                   r:Array,
-                   kq_n:Array,
-                   kq_s:Array,
-                   ks_n:Array,
-                   ks_s:Array,
-                   ko_n:Array,
-                   ko_s:Array) -> tuple[Array, Array, Array]:
+        def vector(qs:Array, s:Array, r:Array, table:Array) -> tuple[Array, Array, Array]:
             a_x, a_y, a_s = vector_dipole(qs, s, r)
-            A_x, A_y, A_s = vector_quadrupole(qs, s, r, kq_n, kq_s)
-            a_x, a_y, a_s = a_x + A_x, a_y + A_y, a_s + A_s
-            A_x, A_y, A_s = vector_sextupole(qs, s, r, ks_n, ks_s)
-            a_x, a_y, a_s = a_x + A_x, a_y + A_y, a_s + A_s
-            A_x, A_y, A_s = vector_octupole(qs, s, r, ko_n, ko_s)
-            a_x, a_y, a_s = a_x + A_x, a_y + A_y, a_s + A_s
-            return a_x, a_y, a_s
+            *_, A_s = vector_multipole(qs, s, r, table)
+            return a_x, a_y, a_s + A_s
     element = element_factory(vector,
                               scalar=None,
                               curvature=curvature,
@@ -86,11 +96,16 @@ def dipole_factory(exact:bool=True,
                               settings=settings,
                               order=order,
                               iterations=iterations,
+                              step=step,
+                              precision=precision,
                               autonomous=True,
                               final=final)
     def dipole(qsps, length, angle, *args):
         r = jax.numpy.abs(length)/angle
         start = jax.numpy.zeros_like(length)
+        if multipole:
+            kn, ks = args[0::2], args[1::2]
+            return element(qsps, length, start, r, coefficients(r, kn, ks, limit=limit, degree=degree))
         return element(qsps, length, start, r, *args)
     return dipole
 
@@ -114,115 +129,125 @@ def vector_dipole(qs:Array, s:Array, r:Array) -> tuple[Array, Array, Array]:
     return a_x, a_y, a_s
 
 
-def vector_quadrupole(qs:Array, s:Array, r:Array, kn:Array, ks:Array) -> tuple[Array, Array, Array]:
+@lru_cache
+def series(n:int, degree:int=10) -> tuple[numpy.ndarray, numpy.ndarray]:
     """
-    Cylindrical quadrupole potential
+    Cylindrical multipole potential series
+
+    Parameters
+    ----------
+    n: int
+        multipole order (1 for quadrupole, 2 for sextupole, 3 for octupole, ...)
+    degree: int, default=10
+        truncation degree
+
+    Returns
+    -------
+    tuple[numpy.ndarray, numpy.ndarray]
+        normal and skew coefficients with (degree + 1, degree + 1) shape
+
+    Note
+    ----
+    Potential is k/(1 + q_x/r)*sum(c[j, i]*q_x**i*q_y**j/r**(i + j - n - 1))
+    Series is generated with exact rational arithmetic from (r + q_x)*laplace(psi) = d(psi)/d(q_x)
+    Midplane fields are k*q_x**n/n! (normal) and k*(1 + q_x/r)*q_x**n/n! (skew)
+
+    """
+    def derivative(f:dict[int, Fraction]) -> dict[int, Fraction]:
+        return {i - 1: c*i for i, c in f.items() if i > 0}
+    def divide(f:dict[int, Fraction], limit:int) -> dict[int, Fraction]:
+        g = {}
+        for i, c in f.items():
+            for m in range(limit - i + 1):
+                g[i + m] = g.get(i + m, 0) + c*(-1)**m
+        return g
+    def generate(f:dict[int, Fraction], j:int) -> numpy.ndarray:
+        table = numpy.zeros((degree + 1, degree + 1))
+        while j <= degree:
+            for i, c in f.items():
+                if i + j <= degree:
+                    table[j, i] = c
+            limit = degree - j - 2
+            a = divide({i: c for i, c in derivative(f).items() if i <= limit}, limit)
+            b = derivative(derivative(f))
+            f = {i: (a.get(i, 0) - b.get(i, 0))/((j + 1)*(j + 2)) for i in range(limit + 1)}
+            j += 2
+        return table
+    scale = Fraction(1, factorial(n))
+    normal = generate({n + 1: -scale/(n + 1), n + 2: -scale/(n + 2)}, 0)
+    skew = generate({n: scale, n + 1: scale}, 1)
+    return normal, skew
+
+
+def coefficients(r:Array, kn:tuple[Array, ...], ks:tuple[Array, ...], *, limit:int=3, degree:int=10) -> Array:
+    """
+    Combined multipole potential coefficients
+
+    Parameters
+    ----------
+    r: Array
+        bending radius
+    kn: tuple[Array, ...]
+        normal strengths (quadrupole, sextupole, ...)
+    ks: tuple[Array, ...]
+        skew strengths (quadrupole, sextupole, ...)
+    limit: int, default=3
+        highest multipole order
+    degree: int, default=10
+        truncation degree
+
+    Returns
+    -------
+    Array
+        coefficients with (degree + 1, degree + 1) shape
+
+    Note
+    ----
+    Strengths and radius powers are folded into a single table (computed once per element)
+
+    """
+    if len(kn) != limit or len(ks) != limit:
+        raise ValueError(f'Expected {limit} normal and {limit} skew strengths, got {len(kn)} and {len(ks)}')
+    u = 1/r
+    j, i = numpy.indices((degree + 1, degree + 1))
+    table = 0.0
+    for n, (n_kn, n_ks) in enumerate(zip(kn, ks), start=1):
+        normal, skew = series(n, degree)
+        table = table + r**(n + 1)*(n_kn*normal + n_ks*skew)
+    return table*u**(i + j)
+
+
+def vector_multipole(qs:Array, s:Array, r:Array, table:Array) -> tuple[Array, Array, Array]:
+    """
+    Cylindrical multipole potential
 
     """
     q_x, q_y, _ = qs
     a_x, a_y, a_s = jax.numpy.zeros_like(qs)
-    a_s = a_s + kn/(1 + q_x/r)*(
-        -q_x**2/2.0 + q_y**2/2.0 +
-        q_x**6*q_y**4/(24.*r**8) -
-        q_x**4*q_y**6/(16.*r**8) +
-        15*q_x**2*q_y**8/(896.*r**8) -
-        q_y**10/(2304.*r**8) -
-        q_x**5*q_y**4/(24.*r**7) +
-        q_x**3*q_y**6/(24.*r**7) -
-        5*q_x*q_y**8/(896.*r**7) +
-        q_x**4*q_y**4/(24.*r**6) -
-        q_x**2*q_y**6/(40.*r**6) +
-        q_y**8/(896.*r**6) -
-        q_x**3*q_y**4/(24.*r**5) +
-        q_x*q_y**6/(80.*r**5) +
-        q_x**2*q_y**4/(24.*r**4) -
-        q_y**6/(240.*r**4) -
-        q_x*q_y**4/(24.*r**3) +
-        q_y**4/(24.*r**2) -
-        q_x**3/(3.*r) +
-        q_x*q_y**2/(2.*r)
-    )
-    a_s = a_s + ks/(1 + q_x/r)*(
-        q_x*q_y +
-        q_x**7*q_y**3/(6.*r**8) -
-        21*q_x**5*q_y**5/(40.*r**8) +
-        5*q_x**3*q_y**7/(16.*r**8) -
-        35*q_x*q_y**9/(1152.*r**8) -
-        q_x**6*q_y**3/(6.*r**7) +
-        3*q_x**4*q_y**5/(8.*r**7) -
-        15*q_x**2*q_y**7/(112.*r**7) +
-        5*q_y**9/(1152.*r**7) +
-        q_x**5*q_y**3/(6.*r**6) -
-        q_x**3*q_y**5/(4.*r**6) +
-        5*q_x*q_y**7/(112.*r**6) -
-        q_x**4*q_y**3/(6.*r**5) +
-        3*q_x**2*q_y**5/(20.*r**5) -
-        q_y**7/(112.*r**5) +
-        q_x**3*q_y**3/(6.*r**4) -
-        3*q_x*q_y**5/(40.*r**4) -
-        q_x**2*q_y**3/(6.*r**3) +
-        q_y**5/(40.*r**3) +
-        q_x*q_y**3/(6.*r**2) +
-        q_x**2*q_y/r -
-        q_y**3/(6.*r)
-    )
+    *rows, last = table.T
+    for row in reversed(rows):
+        last = last*q_x + row
+    *rows, a_s = last
+    for row in reversed(rows):
+        a_s = a_s*q_y + row
+    a_s = a_s/(1 + q_x/r)
     return a_x, a_y, a_s
 
 
+def vector_quadrupole(qs:Array, s:Array, r:Array, kn:Array, ks:Array) -> tuple[Array, Array, Array]:
+    """
+    Cylindrical quadrupole potential
+
+    """
+    return vector_multipole(qs, s, r, coefficients(r, (kn, ), (ks, ), limit=1))
+
+
 def vector_sextupole(qs:Array, s:Array, r:Array, kn:Array, ks:Array) -> tuple[Array, Array, Array]:
     """
     Cylindrical sextupole potential
 
     """
-    q_x, q_y, _ = qs
-    a_x, a_y, a_s = jax.numpy.zeros_like(qs)
-    a_s = a_s + kn/2.0/(1 + q_x/r)*(
-        -q_x**3/3. +
-        q_x*q_y**2 -
-        (q_x**6*q_y**4)/(12.*r**7) +
-        (q_x**4*q_y**6)/(8.*r**7) -
-        (15*q_x**2*q_y**8)/(448.*r**7) +
-        q_y**10/(1152.*r**7) +
-        (q_x**5*q_y**4)/(12.*r**6) -
-        (q_x**3*q_y**6)/(12.*r**6) +
-        (5*q_x*q_y**8)/(448.*r**6) -
-        (q_x**4*q_y**4)/(12.*r**5) +
-        (q_x**2*q_y**6)/(20.*r**5) -
-        q_y**8/(448.*r**5) +
-        (q_x**3*q_y**4)/(12.*r**4) -
-        (q_x*q_y**6)/(40.*r**4) -
-        (q_x**2*q_y**4)/(12.*r**3) +
-        q_y**6/(120.*r**3) +
-        (q_x*q_y**4)/(12.*r**2) -
-        q_x**4/(4.*r) +
-        (q_x**2*q_y**2)/r -
-        q_y**4/(12.*r)
-    )
-    a_s = a_s + ks/2.0/(1 + q_x/r)*(
-        q_x**2*q_y -
-        q_y**3/3. -
-        (q_x**7*q_y**3)/(6.*r**7) +
-        (11*q_x**5*q_y**5)/(20.*r**7) -
-        (37*q_x**3*q_y**7)/(112.*r**7) +
-        (65*q_x*q_y**9)/(2016.*r**7) +
-        (q_x**6*q_y**3)/(6.*r**6) -
-        (2*q_x**4*q_y**5)/(5.*r**6) +
-        (81*q_x**2*q_y**7)/(560.*r**6) -
-        (19*q_y**9)/(4032.*r**6) -
-        (q_x**5*q_y**3)/(6.*r**5) +
-        (11*q_x**3*q_y**5)/(40.*r**5) -
-        (q_x*q_y**7)/(20.*r**5) +
-        (q_x**4*q_y**3)/(6.*r**4) -
-        (7*q_x**2*q_y**5)/(40.*r**4) +
-        (3*q_y**7)/(280.*r**4) -
-        (q_x**3*q_y**3)/(6.*r**3) +
-        (q_x*q_y**5)/(10.*r**3) +
-        (q_x**2*q_y**3)/(6.*r**2) -
-        q_y**5/(20.*r**2) +
-        (q_x**3*q_y)/r -
-        (2*q_x*q_y**3)/(3.*r)
-    )
-    return a_x, a_y, a_s
+    return vector_multipole(qs, s, r, coefficients(r, (0.0, kn), (0.0, ks), limit=2))
 
 
 def vector_octupole(qs:Array, s:Array, r:Array, kn:Array, ks:Array) -> tuple[Array, Array, Array]:
@@ -230,73 +255,91 @@ def vector_octupole(qs:Array, s:Array, r:Array, kn:Array, ks:Array) -> tuple[Arr
     Cylindrical octupole potential
 
     """
-    q_x, q_y, _ = qs
-    a_x, a_y, a_s = jax.numpy.zeros_like(qs)
-    a_s = a_s + kn/6.0/(1 + q_x/r)*(
-        -q_x**4/4.0 +
-        (3*q_x**2*q_y**2)/2. -
-        q_y**4/4. +
-        (q_x**6*q_y**4)/(8.*r**6) -
-        (q_x**4*q_y**6)/(5.*r**6) +
-        (243*q_x**2*q_y**8)/(4480.*r**6) -
-        (19*q_y**10)/(13440.*r**6) -
-        (q_x**5*q_y**4)/(8.*r**5) +
-        (11*q_x**3*q_y**6)/(80.*r**5) -
-        (3*q_x*q_y**8)/(160.*r**5) +
-        (q_x**4*q_y**4)/(8.*r**4) -
-        (7*q_x**2*q_y**6)/(80.*r**4) +
-        (9*q_y**8)/(2240.*r**4) -
-        (q_x**3*q_y**4)/(8.*r**3) +
-        (q_x*q_y**6)/(20.*r**3) +
-        (q_x**2*q_y**4)/(8.*r**2) -
-        q_y**6/(40.*r**2) -
-        q_x**5/(5.*r) +
-        (3*q_x**3*q_y**2)/(2.*r) -
-        (q_x*q_y**4)/(2.*r)
-    )
-    a_s = a_s + ks/6.0/(1 + q_x/r)*(
-        q_x**3*q_y -
-        q_x*q_y**3 +
-        (q_x**7*q_y**3)/(6.*r**6) -
-        (3*q_x**5*q_y**5)/(5.*r**6) +
-        (41*q_x**3*q_y**7)/(112.*r**6) -
-        (145*q_x*q_y**9)/(4032.*r**6) -
-        (q_x**6*q_y**3)/(6.*r**5) +
-        (9*q_x**4*q_y**5)/(20.*r**5) -
-        (93*q_x**2*q_y**7)/(560.*r**5) +
-        (11*q_y**9)/(2016.*r**5) +
-        (q_x**5*q_y**3)/(6.*r**4) -
-        (13*q_x**3*q_y**5)/(40.*r**4) +
-        (17*q_x*q_y**7)/(280.*r**4) -
-        (q_x**4*q_y**3)/(6.*r**3) +
-        (9*q_x**2*q_y**5)/(40.*r**3) -
-        q_y**7/(70.*r**3) +
-        (q_x**3*q_y**3)/(6.*r**2) -
-        (3*q_x*q_y**5)/(20.*r**2) +
-        (q_x**4*q_y)/r -
-        (3*q_x**2*q_y**3)/(2.*r) +
-        q_y**5/(10.*r)
-    )
-    return a_x, a_y, a_s
+    return vector_multipole(qs, s, r, coefficients(r, (0.0, 0.0, kn), (0.0, 0.0, ks), limit=3))
+
 
-def mapping(qsps:Array, length:Array, angle:Array, beta:float=1.0, constant:float=0.0) -> Array:
+def mapping(qsps:Array, length:Array, angle:Array, beta:float=1.0, constant:float=0.0, precision:str='double') -> Array:
     """
     Exact sector bend body transformation
 
     """
-    q_x, q_y, q_s, p_x, p_y, p_s = qsps
+    if precision != 'double':
+        return precise(lambda qsps, length, angle: mapping(qsps, length, angle, beta, constant), precision)(qsps, length, angle)
+    return kernel(qsps, length, angle, beta, constant)
+
+
+@partial(jax.custom_jvp, nondiff_argnums=(3, 4))
+def kernel(qsps:Array, length:Array, angle:Array, beta:float=1.0, constant:float=0.0) -> Array:
+    """
+    Exact sector bend body transformation (analytic derivatives)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
     r = length/angle
     cos = jax.numpy.cos(angle)
     sin = jax.numpy.sin(angle)
-    p_s = 1/beta + p_s
-    pa = jax.numpy.sqrt(p_s**2 - p_x**2 - p_y**2 - constant)
-    pb = jax.numpy.sqrt(p_s**2 - p_y**2 - constant)
-    pc = (pa - (q_x + r)/r)*sin
-    pd = p_x*cos + pc
-    Q_x = (-r + (q_x + r - pa*r)*cos + r*(p_x*sin + jax.numpy.sqrt(pb**2 - pd**2)))
-    Q_y = (q_y + p_y*(length + r*(jax.numpy.asin(p_x/pb) - jax.numpy.asin(pd/pb))))
-    Q_s = q_s + length/beta - p_s*length - r*p_s*(jax.numpy.asin(p_x/pb) - jax.numpy.asin(pd/pb))
+    offset = 1/beta**2 - constant - 1.0
+    P_s = 1/beta + p_s
+    sb = offset + p_s*(2/beta + p_s) - p_y**2
+    sa = sb - p_x**2
+    pa = jax.numpy.sqrt(1 + sa)
+    pb = jax.numpy.sqrt(1 + sb)
+    da = sa/(1 + pa)
+    pd = p_x*cos + (da - q_x/r)*sin
+    dd = (sb - pd**2)/(1 + jax.numpy.sqrt(1 + sb - pd**2))
+    phase = jax.numpy.asin(p_x/pb) - jax.numpy.asin(pd/pb)
+    Q_x = (q_x - da*r)*cos + r*p_x*sin + r*dd
+    Q_y = q_y + p_y*(length + r*phase)
+    Q_s = q_s - p_s*length - r*P_s*phase
     P_x = pd
     P_y = p_y
-    P_s = p_s - 1/beta
-    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s])
+    P_s = p_s
+    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s], axis=-1)
+
+
+@kernel.defjvp
+@analytic
+def kernel_jvp(beta:float, constant:float, primals:tuple[Array, Array, Array], tangents:tuple[Array, Array, Array]) -> tuple[Array, Array]:
+    """
+    Exact sector bend body transformation tangent map
+
+    """
+    qsps, length, angle = primals
+    dqsps, dlength, dangle = tangents
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    dq_x, dq_y, dq_s, dp_x, dp_y, dp_s = jax.numpy.unstack(dqsps, axis=-1)
+    r = length/angle
+    dr = (dlength - r*dangle)/angle
+    cos = jax.numpy.cos(angle)
+    sin = jax.numpy.sin(angle)
+    dcos = -sin*dangle
+    dsin = +cos*dangle
+    offset = 1/beta**2 - constant - 1.0
+    P_s = 1/beta + p_s
+    sb = offset + p_s*(2/beta + p_s) - p_y**2
+    dsb = 2*(P_s*dp_s - p_y*dp_y)
+    sa = sb - p_x**2
+    dsa = dsb - 2*p_x*dp_x
+    pa = jax.numpy.sqrt(1 + sa)
+    pb = jax.numpy.sqrt(1 + sb)
+    dpa = dsa/(2*pa)
+    dpb = dsb/(2*pb)
+    da = sa/(1 + pa)
+    u = da - q_x/r
+    du = dpa - (dq_x - q_x*dr/r)/r
+    pd = p_x*cos + u*sin
+    dpd = dp_x*cos + p_x*dcos + du*sin + u*dsin
+    pc = jax.numpy.sqrt(1 + sb - pd**2)
+    dd = (sb - pd**2)/(1 + pc)
+    ddd = (dsb - 2*pd*dpd)/(2*pc)
+    phase = jax.numpy.asin(p_x/pb) - jax.numpy.asin(pd/pb)
+    dphase = (dp_x - p_x*dpb/pb)/pa - (dpd - pd*dpb/pb)/pc
+    Q_x = (q_x - da*r)*cos + r*p_x*sin + r*dd
+    Q_y = q_y + p_y*(length + r*phase)
+    Q_s = q_s - p_s*length - r*P_s*phase
+    dQ_x = (dq_x - dpa*r - da*dr)*cos + (q_x - da*r)*dcos + (dr*p_x + r*dp_x)*sin + r*p_x*dsin + dr*dd + r*ddd
+    dQ_y = dq_y + dp_y*(length + r*phase) + p_y*(dlength + dr*phase + r*dphase)
+    dQ_s = dq_s - dp_s*length - p_s*dlength - (dr*P_s + r*dp_s)*phase - r*P_s*dphase
+    result = jax.numpy.stack([Q_x, Q_y, Q_s, pd, p_y, p_s], axis=-1)
+    tangent = jax.numpy.stack([dQ_x, dQ_y, dQ_s, dpd, dp_y, dp_s], axis=-1)
+    return result, tangent
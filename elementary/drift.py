@@ -8,12 +8,20 @@ Drift element factory
 from typing import Optional
 from typing import Callable
 
+from functools import partial
+
 import jax
 from jax import Array
 
+from elementary.cache import memoize
 from elementary.element import element_factory
+from elementary.precision import differential
+from elementary.precision import longitudinal
+from elementary.precision import precise
+from elementary.util import analytic
 
 
+@memoize
 def drift_factory(exact:bool=True,
                   beta:Optional[float]=None,
                   gamma:Optional[float]=None,
@@ -21,7 +29,9 @@ def drift_factory(exact:bool=True,
                   settings:Optional[dict]=None,
                   order:int=0,
                   iterations:int=1,
-                  final:bool=True) -> Callable[..., Array]:
+                  final:bool=True,
+                  step:Optional[float]=None,
+                  precision:str='double') -> Callable[..., Array]:
     """
     Drift element transfer map
 
@@ -43,6 +53,10 @@ def drift_factory(exact:bool=True,
         number of integration
     final: bool, default=True
         flag to return only the final state
+    step: Optional[float]
+        maximum integration step length (overrides iterations)
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
@@ -53,7 +67,7 @@ def drift_factory(exact:bool=True,
         beta = beta if beta else 1.0
         constant = 1/(beta**2*gamma**2) if gamma else 0.0
         def drift(qsps:Array, length:Array) -> Array:
-            return mapping(qsps, length, beta, constant)
+            return mapping(qsps, length, beta, constant, precision)
         return drift
     element = element_factory(vector,
                               scalar=None,
@@ -63,6 +77,8 @@ def drift_factory(exact:bool=True,
                               settings=settings,
                               order=order,
                               iterations=iterations,
+                              step=step,
+                              precision=precision,
                               autonomous=True,
                               final=final)
     def drift(qsps, length):
@@ -77,17 +93,51 @@ def vector(qs:Array, s:Array) -> tuple[Array, Array, Array]:
     return tuple(jax.numpy.zeros_like(qs))
 
 
-def mapping(qsps:Array, length:Array, beta:float=1.0, constant:float=0.0) -> Array:
+def mapping(qsps:Array, length:Array, beta:float=1.0, constant:float=0.0, precision:str='double') -> Array:
     """
     Exact drift transformation
 
     """
-    q_x, q_y, q_s, p_x, p_y, p_s = qsps
-    dp = jax.numpy.sqrt((1/beta + p_s)**2 - p_x**2 - p_y**2 - constant)
+    if precision != 'double':
+        return precise(lambda qsps, length: mapping(qsps, length, beta, constant), precision)(qsps, length)
+    return kernel(qsps, length, beta, constant)
+
+
+@partial(jax.custom_jvp, nondiff_argnums=(2, 3))
+def kernel(qsps:Array, length:Array, beta:float=1.0, constant:float=0.0) -> Array:
+    """
+    Exact drift transformation (analytic derivatives)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    dp, ds = longitudinal(p_x, p_y, p_s, beta, constant)
     Q_x = q_x + p_x*length/dp
     Q_y = q_y + p_y*length/dp
-    Q_s = q_s + length/beta - length*(1/beta + p_s)/dp
+    Q_s = q_s + length*ds
     P_x = p_x
     P_y = p_y
     P_s = p_s
-    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s])
+    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, P_s], axis=-1)
+
+
+@kernel.defjvp
+@analytic
+def kernel_jvp(beta:float, constant:float, primals:tuple[Array, Array], tangents:tuple[Array, Array]) -> tuple[Array, Array]:
+    """
+    Exact drift transformation tangent map
+
+    """
+    qsps, length = primals
+    dqsps, dlength = tangents
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    dq_x, dq_y, dq_s, dp_x, dp_y, dp_s = jax.numpy.unstack(dqsps, axis=-1)
+    (dp, ds), (ddp, dds) = differential(p_x, p_y, p_s, dp_x, dp_y, dp_s, beta, constant)
+    Q_x = q_x + p_x*length/dp
+    Q_y = q_y + p_y*length/dp
+    Q_s = q_s + length*ds
+    dQ_x = dq_x + (dp_x*length + p_x*dlength)/dp - p_x*length*ddp/dp**2
+    dQ_y = dq_y + (dp_y*length + p_y*dlength)/dp - p_y*length*ddp/dp**2
+    dQ_s = dq_s + dlength*ds + length*dds
+    result = jax.numpy.stack([Q_x, Q_y, Q_s, p_x, p_y, p_s], axis=-1)
+    tangent = jax.numpy.stack([dQ_x, dQ_y, dQ_s, dp_x, dp_y, dp_s], axis=-1)
+    return result, tangent
@@ -17,10 +17,15 @@ from elementary import nest_list
 from elementary import tao
 from elementary import sequence
 
+from elementary.cache import memoize
 from elementary.hamiltonian import hamiltonian_factory
 from elementary.hamiltonian import autonomize
+from elementary.precision import PRECISION
+from elementary.precision import precise
+from elementary.precision import compensated
 
 
+@memoize
 def element_factory(vector:Optional[Callable[..., tuple[Array, Array, Array]]]=None,
                     scalar:Optional[Callable[..., Array]]=None,
                     curvature:Optional[Callable[..., Array]]=None,
@@ -33,7 +38,12 @@ def element_factory(vector:Optional[Callable[..., tuple[Array, Array, Array]]]=N
                     order:int=0,
                     iterations:int=1,
                     autonomous:bool=True,
-                    final:bool=True) -> Callable[..., Array]:
+                    final:bool=True,
+                    step:Optional[float]=None,
+                    split:bool=False,
+                    kick:Optional[Callable[..., tuple[Array, Array]]]=None,
+                    precision:str='double',
+                    gradient:bool=False) -> Callable[..., Array]:
     """
     Generate generic element transfer map
 
@@ -65,12 +75,44 @@ def element_factory(vector:Optional[Callable[..., tuple[Array, Array, Array]]]=N
         autonomous flag
     final: bool, default=True
         flag to return only the final state
+    step: Optional[float]
+        maximum integration step length (overrides iterations)
+    split: bool, default=False
+        drift-kick splitting flag (overrides driver)
+    kick: Optional[Callable[..., tuple[Array, Array]]]
+        transverse kick (gradient of a_s with respect to q_x and q_y)
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
+    gradient: bool, default=False
+        flag to use analytic hamiltonian derivatives in integration steps (see hamiltonian_factory)
 
     Returns
     -------
     Callable[..., Array]
 
+    Note
+    ----
+    Batched initial states with (..., 6) shape are mapped over leading particle axes
+    If step is given, the number of integration steps is computed from element length at run time
+    Thus, the same (compiled) element can be used for elements of different lengths
+    Length adaptive elements are forward differentiable and require final=True
+    Splitting is applicable for straight elements with a_x = a_y = 0 and a_s(q_x, q_y)
+    In this case, exact drift and exact kick are used as a second order symmetric step
+    In single precision mode, state and parameters are cast to float32
+    In mixed precision mode, integration steps are evaluated in float32 with compensated accumulation
+    The result has the input state type, i.e. float64 states keep compensated low order parts
+
     """
+    if split and (hamiltonian or scalar or curvature or torsion or not autonomous):
+        raise ValueError('Splitting requires autonomous straight element defined by vector potential')
+    if step and not final:
+        raise ValueError('Length adaptive integration (step) requires final=True')
+    if precision not in PRECISION:
+        raise ValueError(f'Expected precision in {PRECISION}, got {precision}')
+    def count(length:Array) -> Array:
+        if step:
+            return jax.numpy.maximum(1, jax.numpy.ceil(jax.numpy.abs(length)/step)).astype(jax.numpy.int32)
+        return iterations
     if hamiltonian is None:
         hamiltonian = hamiltonian_factory(
             vector=vector,
@@ -78,21 +120,33 @@ def element_factory(vector:Optional[Callable[..., tuple[Array, Array, Array]]]=N
             curvature=curvature,
             torsion=torsion,
             beta=beta,
-            gamma=gamma
+            gamma=gamma,
+            gradient=gradient
         )
     if vector is None:
         def vector(qs:Array, s:Array, *args:Array) -> tuple[Array, Array, Array]:
             return tuple(jax.numpy.zeros_like(qs))
     if autonomous:
-        table = [(driver if driver else tao)(hamiltonian, **settings if settings else {})]
+        if split:
+            table = [splitting(vector, kick, beta=beta, gamma=gamma)]
+        else:
+            table = [(driver if driver else tao)(hamiltonian, **settings if settings else {})]
         slice = fold(sequence(0, order, table, merge=False))
+        if final and precision == 'mixed':
+            def element(qsps:Array, length:Array, start:Array, *args:Array) -> Array:
+                return compensated(slice)(qsps, count(length), length, start, *args)
+            return batch(element)
+        if step:
+            def element(qsps:Array, length:Array, start:Array, *args:Array) -> Array:
+                return adaptive(step, slice)(qsps, length, start, *args)
+            return batch(precise(element, precision))
         if final:
             def element(qsps:Array, length:Array, start:Array, *args:Array) -> Array:
                 return nest(iterations, slice)(qsps, length/iterations, start, *args)
-            return element
+            return batch(precise(element, precision))
         def element(qsps:Array, length:Array, start:Array, *args:Array) -> Array:
             return nest_list(iterations, slice)(qsps, length/iterations, start, *args)
-        return element
+        return batch(precise(element, precision))
     extended = autonomize(hamiltonian)
     table = [(driver if driver else tao)(extended, **settings if settings else {})]
     slice = fold(sequence(0, order, table, merge=False))
@@ -104,10 +158,15 @@ def element_factory(vector:Optional[Callable[..., tuple[Array, Array, Array]]]=N
             qs = jax.numpy.concat([qs, q_t.reshape(-1)])
             ps = jax.numpy.concat([ps, p_t.reshape(-1)])
             qsps = jax.numpy.hstack([qs, ps])
-            qsps = nest(iterations, slice)(qsps, length/iterations, start, *args)
+            if precision == 'mixed':
+                qsps = compensated(slice, invariant=False)(qsps, count(length), length, start, *args)
+            elif step:
+                qsps = adaptive(step, slice)(qsps, length, start, *args)
+            else:
+                qsps = nest(iterations, slice)(qsps, length/iterations, start, *args)
             q_x, q_y, q_s, _, p_x, p_y, p_s, _ = qsps
             return jax.numpy.stack([q_x, q_y, q_s, p_x, p_y, p_s])
-        return element
+        return batch(element if precision == 'mixed' else precise(element, precision))
     def element(qsps:Array, length:Array, start:Array, *args:Array) -> Array:
         qs, ps = jax.numpy.reshape(qsps, (2, -1))
         q_t = start
@@ -118,4 +177,107 @@ def element_factory(vector:Optional[Callable[..., tuple[Array, Array, Array]]]=N
         qsps = nest_list(iterations, slice)(qsps, length/iterations, start, *args)
         q_x, q_y, q_s, _, p_x, p_y, p_s, _ = qsps.T
         return jax.numpy.stack([q_x, q_y, q_s, p_x, p_y, p_s]).T
-    return element
+    return batch(precise(element, precision, invariant=False))
+
+
+def splitting(vector:Callable[..., tuple[Array, Array, Array]],
+              kick:Optional[Callable[..., tuple[Array, Array]]]=None, *,
+              beta:Optional[float]=None,
+              gamma:Optional[float]=None) -> Callable[..., Array]:
+    """
+    Generate drift-kick-drift integration step
+
+    Parameters
+    ----------
+    vector: Callable[..., tuple[Array, Array, Array]]
+        normalized vector potential (a_x = a_y = 0, a_s(q_x, q_y))
+    kick: Optional[Callable[..., tuple[Array, Array]]]
+        transverse kick (computed from vector potential if not given)
+    beta: Optional[float]
+        relativistic beta
+    gamma: Optional[float]
+        relativistic gamma
+
+    Returns
+    -------
+    Callable[..., Array]
+
+    Note
+    ----
+    Kick has (qs, s, *args) signature and returns (d a_s/d q_x, d a_s/d q_y)
+    The resulting step has (qsps, length, start, *args) signature and can be composed with sequence
+
+    """
+    from elementary.drift import mapping
+    beta = beta if beta else 1.0
+    constant = 1/(beta**2*gamma**2) if gamma else 0.0
+    if kick is None:
+        def kick(qs:Array, s:Array, *args:Array) -> tuple[Array, Array]:
+            q_x, q_y, q_s = qs
+            def potential(q_x:Array, q_y:Array) -> Array:
+                *_, a_s = vector(jax.numpy.stack([q_x, q_y, q_s]), s, *args)
+                return a_s
+            return jax.grad(potential, argnums=(0, 1))(q_x, q_y)
+    def integrator(qsps:Array, length:Array, start:Array, *args:Array) -> Array:
+        qsps = mapping(qsps, length/2, beta, constant)
+        q_x, q_y, q_s, p_x, p_y, p_s = qsps
+        f_x, f_y = kick(jax.numpy.stack([q_x, q_y, q_s]), start, *args)
+        qsps = jax.numpy.stack([q_x, q_y, q_s, p_x + length*f_x, p_y + length*f_y, p_s])
+        return mapping(qsps, length/2, beta, constant)
+    return integrator
+
+
+def adaptive(step:float, slice:Callable[..., Array]) -> Callable[..., Array]:
+    """
+    Generate length adaptive integration
+
+    Parameters
+    ----------
+    step: float
+        maximum integration step length
+    slice: Callable[..., Array]
+        integration step with (qsps, length, start, *args) signature
+
+    Returns
+    -------
+    Callable[..., Array]
+
+    Note
+    ----
+    Number of steps is max(1, ceil(|length|/step)) and is computed at run time (dynamic trip count)
+    Reverse mode differentiation is not supported for dynamic trip count loops, use forward mode
+
+    """
+    def integrator(qsps:Array, length:Array, start:Array, *args:Array) -> Array:
+        count = jax.numpy.maximum(1, jax.numpy.ceil(jax.numpy.abs(length)/step)).astype(jax.numpy.int32)
+        return jax.lax.fori_loop(0, count, lambda _, qsps: slice(qsps, length/count, start, *args), qsps)
+    return integrator
+
+
+def batch(element:Callable[..., Array]) -> Callable[..., Array]:
+    """
+    Map element over leading particle axes of batched initial states
+
+    Parameters
+    ----------
+    element: Callable[..., Array]
+        single particle element with (qsps, *args) signature
+
+    Returns
+    -------
+    Callable[..., Array]
+
+    Note
+    ----
+    Single particle (6,) states are passed as is, (..., 6) states are vectorized over leading axes
+    Element parameters are shared by all particles
+    Used for integrated elements only, their hamiltonian (see hamiltonian_factory) is a scalar single particle function
+    differentiated by integrators, thus it is not batched and integration steps are mapped with vmap
+    Exact maps (drift, dipole, cavity kick, alignment) act on the (..., 6) layout directly
+
+    """
+    def wrapper(qsps:Array, *args:Array) -> Array:
+        if jax.numpy.ndim(qsps) == 1:
+            return element(qsps, *args)
+        return jax.vmap(wrapper, in_axes=(0, *(None for _ in args)))(qsps, *args)
+    return wrapper
@@ -0,0 +1,255 @@
+"""
+Ensemble
+--------
+
+Monte Carlo alignment errors ensemble
+
+"""
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+import jax
+from jax import Array
+
+from elementary.alignment import alignment_factory
+from elementary.line import group
+from elementary.line import switch
+from elementary.optics import dispersion
+from elementary.optics import propagate
+from elementary.optics import twiss
+
+ERRORS:tuple[str, ...] = ('dx', 'dy', 'dz', 'wx', 'wy', 'wz')
+DISTRIBUTION:tuple[str, ...] = ('normal', 'uniform')
+
+
+def sample(key:Array,
+           seeds:int,
+           count:int,
+           spec:dict[str, tuple[Any, ...]]) -> Array:
+    """
+    Sample alignment errors
+
+    Parameters
+    ----------
+    key: Array
+        random key
+    seeds: int
+        number of seeds
+    count: int
+        number of elements
+    spec: dict[str, tuple[Any, ...]]
+        error name (dx, dy, dz, wx, wy, wz) to (distribution, scale) or (distribution, scale, cut)
+        distribution is 'normal' (optionally truncated at cut sigmas) or 'uniform' (in [-scale, +scale])
+        scale is a float or an array with (count, ) shape
+
+    Returns
+    -------
+    Array
+        errors with (seeds, count, 6) shape (missing errors are zero)
+
+    """
+    unknown = set(spec) - set(ERRORS)
+    if unknown:
+        raise ValueError(f'Expected errors in {ERRORS}, got {sorted(unknown)}')
+    errors = []
+    for name, key in zip(ERRORS, jax.random.split(key, len(ERRORS))):
+        if name not in spec:
+            errors.append(jax.numpy.zeros((seeds, count)))
+            continue
+        distribution, scale, *cut = spec[name]
+        if distribution not in DISTRIBUTION:
+            raise ValueError(f'Expected distribution in {DISTRIBUTION}, got {distribution}')
+        if distribution == 'normal' and cut:
+            value = jax.random.truncated_normal(key, -cut[0], +cut[0], (seeds, count))
+        elif distribution == 'normal':
+            value = jax.random.normal(key, (seeds, count))
+        else:
+            value = jax.random.uniform(key, (seeds, count), minval=-1.0, maxval=+1.0)
+        errors.append(jax.numpy.asarray(scale)*value)
+    return jax.numpy.stack(errors, axis=-1)
+
+
+def misaligned_factory(elements:list[tuple[Any, ...]], *,
+                       lengths:list[float],
+                       angles:Optional[list[float]]=None,
+                       beta:Optional[float]=None,
+                       gamma:Optional[float]=None,
+                       precision:str='double',
+                       final:bool=False) -> tuple[Callable[..., Array], tuple[Array, ...]]:
+    """
+    Generate line transfer map with alignment errors
+
+    Parameters
+    ----------
+    elements: list[tuple[Any, ...]]
+        ordered (element, *parameters) specifications
+    lengths: list[float]
+        layout length of each element (zero for thin elements)
+    angles: Optional[list[float]]
+        layout angle of each element (zero for straight layout)
+    beta: Optional[float]
+        beta
+    gamma: Optional[float]
+        gamma
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
+    final: bool, default=False
+        flag to return only the final state
+
+    Returns
+    -------
+    tuple[Callable[..., Array], tuple[Array, ...]]
+        line with (qsps, parameters, errors) signature returning states at element exits with (n, 6) shape
+        (or the final state) and initial (grouped) parameters, errors have (n, 6) shape
+
+    Note
+    ----
+    Element parameters are opaque (e.g. thin cavity kick has (voltage, lag) parameters), layout lengths are explicit
+
+    """
+    for name, values in (('lengths', lengths), ('angles', angles)):
+        if values is not None and len(values) != len(elements):
+            raise ValueError(f'Expected {len(elements)} {name}, got {len(values)}')
+    kinds, kind, index, parameters = group(elements)
+    step = switch(kinds)
+    length = jax.numpy.asarray(lengths)
+    angle = jax.numpy.asarray(angles if angles is not None else [0.0]*len(elements))
+    entrance, straight = alignment_factory(beta, gamma, flag=False, precision=precision)
+    _, curved = alignment_factory(beta, gamma, flag=True, precision=precision)
+    def line(qsps:Array, parameters:tuple[Array, ...], errors:Array) -> Array:
+        def body(qsps:Array, xs:tuple[Array, ...]) -> tuple[Array, Optional[Array]]:
+            kind, index, errors, length, angle = xs
+            qsps = entrance(qsps, *errors)
+            qsps = step(qsps, kind, index, parameters)
+            if angles is None:
+                qsps = straight(qsps, *errors, length)
+            else:
+                qsps = jax.lax.cond(angle == 0.0,
+                                    lambda qsps: straight(qsps, *errors, length),
+                                    lambda qsps: curved(qsps, *errors, length, angle),
+                                    qsps)
+            return qsps, None if final else qsps
+        qsps, trajectory = jax.lax.scan(body, qsps, (kind, index, errors, length, angle))
+        return qsps if final else trajectory
+    return line, parameters
+
+
+def closed(ring:Callable[..., Array],
+           guess:Array,
+           iterations:int=8) -> Array:
+    """
+    Transverse closed orbit (Newton iterations)
+
+    Parameters
+    ----------
+    ring: Callable[..., Array]
+        one-turn map with (qsps, ) signature
+    guess: Array
+        initial guess (q_s and p_s are fixed)
+    iterations: int, default=8
+        number of iterations
+
+    Returns
+    -------
+    Array
+
+    """
+    index = jax.numpy.array([0, 1, 3, 4])
+    def body(_:Array, qsps:Array) -> Array:
+        value = ring(qsps)
+        matrix = jax.jacfwd(ring)(qsps)[index[:, None], index[None, :]] - jax.numpy.eye(4)
+        delta = jax.numpy.linalg.solve(matrix, (value - qsps)[index])
+        return qsps.at[index].add(-delta)
+    return jax.lax.fori_loop(0, iterations, body, guess)
+
+
+def ensemble_factory(elements:list[tuple[Any, ...]],
+                     spec:dict[str, tuple[Any, ...]],
+                     qsps:Array, *,
+                     lengths:list[float],
+                     seeds:int=128,
+                     turns:int=1024,
+                     limit:float=1.0,
+                     iterations:int=8,
+                     angles:Optional[list[float]]=None,
+                     beta:Optional[float]=None,
+                     gamma:Optional[float]=None,
+                     precision:str='double') -> tuple[Callable[..., dict[str, Array]], tuple[Array, ...]]:
+    """
+    Generate Monte Carlo alignment errors ensemble statistics
+
+    Parameters
+    ----------
+    elements: list[tuple[Any, ...]]
+        ordered (element, *parameters) specifications
+    spec: dict[str, tuple[Any, ...]]
+        errors distribution specification (see sample)
+    qsps: Array
+        initial deviations from closed orbit with (m, 6) shape used for survival
+    lengths: list[float]
+        layout length of each element (zero for thin elements)
+    seeds: int, default=128
+        number of seeds
+    turns: int, default=1024
+        number of turns for survival
+    limit: float, default=1.0
+        transverse amplitude limit for survival
+    iterations: int, default=8
+        number of closed orbit iterations
+    angles: Optional[list[float]]
+        layout angle of each element (zero for straight layout)
+    beta: Optional[float]
+        beta
+    gamma: Optional[float]
+        gamma
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
+
+    Returns
+    -------
+    tuple[Callable[..., dict[str, Array]], tuple[Array, ...]]
+        jitted statistics with (key, parameters) signature and initial (grouped) parameters
+
+    Note
+    ----
+    Errors are sampled on device, seeds and particles are vectorized in one compiled program
+    Statistics are reduced on device, each has leading (seeds, ) dimension:
+    orbit: closed orbit rms over element exits (x and y)
+    beating: beta beating rms over element exits (x and y) with respect to error free line
+    tunes: fractional tunes (x and y)
+    survival: fraction of particles within limit after given number of turns
+
+    """
+    line, parameters = misaligned_factory(elements, lengths=lengths, angles=angles, beta=beta, gamma=gamma, precision=precision)
+    ring, _ = misaligned_factory(elements, lengths=lengths, angles=angles, beta=beta, gamma=gamma, precision=precision, final=True)
+    count = len(elements)
+    def optics(parameters:tuple[Array, ...], errors:Array) -> tuple[Array, Array, Array, Array]:
+        def turn(qsps:Array) -> Array:
+            return ring(qsps, parameters, errors)
+        orbit = closed(turn, jax.numpy.zeros(6), iterations)
+        matrices = jax.jacfwd(lambda qsps: line(qsps, parameters, errors))(orbit)
+        tunes, alphas, betas = twiss(matrices[-1])
+        _, betas, *_ = propagate(matrices, alphas, betas, dispersion(matrices[-1]))
+        return orbit, line(orbit, parameters, errors), tunes, betas
+    def survival(parameters:tuple[Array, ...], errors:Array, orbit:Array) -> Array:
+        def particle(qsps:Array) -> Array:
+            def body(_:Array, carry:tuple[Array, Array]) -> tuple[Array, Array]:
+                qsps, alive = carry
+                state = ring(qsps, parameters, errors)
+                alive = alive & jax.numpy.all(jax.numpy.isfinite(state)) & (jax.numpy.max(jax.numpy.abs(state[:2])) <= limit)
+                return jax.numpy.where(alive, state, qsps), alive
+            _, alive = jax.lax.fori_loop(0, turns, body, (qsps + orbit, jax.numpy.bool_(True)))
+            return alive
+        return jax.numpy.mean(jax.vmap(particle)(qsps))
+    @jax.jit
+    def statistics(key:Array, parameters:tuple[Array, ...]) -> dict[str, Array]:
+        *_, design = optics(parameters, jax.numpy.zeros((count, 6)))
+        def seed(errors:Array) -> dict[str, Array]:
+            orbit, trajectory, tunes, betas = optics(parameters, errors)
+            return dict(orbit=jax.numpy.sqrt(jax.numpy.mean(trajectory[:, :2]**2, axis=0)),
+                        beating=jax.numpy.sqrt(jax.numpy.mean((betas/design - 1.0)**2, axis=0)),
+                        tunes=tunes,
+                        survival=survival(parameters, errors, orbit))
+        return jax.vmap(seed)(sample(key, seeds, count, spec))
+    return statistics, parameters
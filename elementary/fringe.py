@@ -0,0 +1,177 @@
+"""
+Fringe
+------
+
+Hard edge fringe field transformations factory
+
+"""
+from typing import Optional
+from typing import Callable
+
+import jax
+from jax import Array
+
+from elementary.cache import memoize
+from elementary.precision import precise
+
+
+@memoize
+def dipole_fringe_factory(precision:str='double') -> tuple[Callable[..., Array], Callable[..., Array]]:
+    """
+    Generate dipole entrance and exit edge transformations
+
+    Parameters
+    ----------
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
+
+    Returns
+    -------
+    tuple[Callable[..., Array], Callable[..., Array]]
+
+    Note
+    ----
+    Both transformations have (qsps, length, angle, edge, gap=0.0, fint=0.0) signature
+    Here gap is the half gap (MADX hgap) and fint is the fringe field integral (MADX fint and fintx)
+    In the linear hard edge model, both edges have the same form (with corresponding edge angles)
+
+    """
+    def edge_entrance(qsps:Array, length:Array, angle:Array, edge:Array, gap:Array=0.0, fint:Array=0.0) -> Array:
+        return kick(qsps, length, angle, edge, gap, fint)
+    def edge_exit(qsps:Array, length:Array, angle:Array, edge:Array, gap:Array=0.0, fint:Array=0.0) -> Array:
+        return kick(qsps, length, angle, edge, gap, fint)
+    return precise(edge_entrance, precision), precise(edge_exit, precision)
+
+
+@memoize
+def quadrupole_fringe_factory(beta:Optional[float]=None,
+                              gamma:Optional[float]=None,
+                              precision:str='double') -> tuple[Callable[..., Array], Callable[..., Array]]:
+    """
+    Generate quadrupole entrance and exit hard edge fringe transformations
+
+    Parameters
+    ----------
+    beta: Optional[float]
+        beta
+    gamma: Optional[float]
+        gamma
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
+
+    Returns
+    -------
+    tuple[Callable[..., Array], Callable[..., Array]]
+
+    Note
+    ----
+    Both transformations have (qsps, kn, ks) signature
+    Can be used with any straight element with quadrupole component (e.g. quadrupole or combined function magnet)
+
+    """
+    beta = beta if beta else 1.0
+    constant = 1/(beta**2*gamma**2) if gamma else 0.0
+    def fringe_entrance(qsps:Array, kn:Array, ks:Array) -> Array:
+        return quadrupole(qsps, kn, ks, +1.0, beta, constant)
+    def fringe_exit(qsps:Array, kn:Array, ks:Array) -> Array:
+        return quadrupole(qsps, kn, ks, -1.0, beta, constant)
+    return precise(fringe_entrance, precision), precise(fringe_exit, precision)
+
+
+def kick(qsps:Array,
+         length:Array,
+         angle:Array,
+         edge:Array,
+         gap:Array=0.0,
+         fint:Array=0.0) -> Array:
+    """
+    Dipole edge kick (MADX convention)
+
+    Parameters
+    ----------
+    qsps: Array
+        initial state
+    length: Array
+        dipole length
+    angle: Array
+        dipole angle
+    edge: Array
+        edge (pole face) angle
+    gap: Array, default=0.0
+        half gap
+    fint: Array, default=0.0
+        fringe field integral
+
+    Returns
+    -------
+    Array
+
+    Note
+    ----
+    Thin linear transformation (position dependent momenta kicks), i.e. exactly symplectic
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    h = angle/length
+    cos = jax.numpy.cos(edge)
+    sin = jax.numpy.sin(edge)
+    psi = 2.0*h*gap*fint*(1.0 + sin**2)/cos
+    P_x = p_x + h*sin/cos*q_x
+    P_y = p_y - h*jax.numpy.tan(edge - psi)*q_y
+    return jax.numpy.stack([q_x, q_y, q_s, P_x, P_y, p_s], axis=-1)
+
+
+def quadrupole(qsps:Array,
+               kn:Array,
+               ks:Array,
+               sign:float,
+               beta:float=1.0,
+               constant:float=0.0) -> Array:
+    """
+    Quadrupole hard edge fringe transformation
+
+    Parameters
+    ----------
+    qsps: Array
+        initial state
+    kn: Array
+        normal quadrupole strength
+    ks: Array
+        skew quadrupole strength
+    sign: float
+        +1.0 for entrance and -1.0 for exit
+    beta: float, default=1.0
+        beta
+    constant: float, default=0.0
+        1/(beta*gamma)**2
+
+    Returns
+    -------
+    Array
+
+    Note
+    ----
+    Leading order (Lee-Whiting) fringe is generated by type-2 generating function
+    F = x P_x + y P_y + q_s P_s + f*(u*P_x + v*P_y) with f = sign/(12*(1 + delta)), where
+    u = kn*(x**3 + 3*x*y**2) - 2*ks*y**3 and v = -kn*(y**3 + 3*x**2*y) - 2*ks*x**3
+    Positions are explicit, momenta are obtained from a linear (2, 2) system, i.e. the map is exactly symplectic
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    offset = 1/beta**2 - constant - 1.0
+    delta = jax.numpy.sqrt(1.0 + offset + p_s*(2/beta + p_s))
+    f = sign/(12.0*delta)
+    df = -f*(1/beta + p_s)/delta**2
+    a = 3.0*f*kn*(q_x**2 + q_y**2)
+    b = 6.0*f*kn*q_x*q_y
+    c = 6.0*f*ks*q_x**2
+    d = 6.0*f*ks*q_y**2
+    det = (1.0 + a)*(1.0 - a) + (b + c)*(b - d)
+    P_x = ((1.0 - a)*p_x + (b + c)*p_y)/det
+    P_y = ((1.0 + a)*p_y - (b - d)*p_x)/det
+    u = kn*(q_x**3 + 3.0*q_x*q_y**2) - 2.0*ks*q_y**3
+    v = -kn*(q_y**3 + 3.0*q_x**2*q_y) - 2.0*ks*q_x**3
+    Q_x = q_x + f*u
+    Q_y = q_y + f*v
+    Q_s = q_s + df*(u*P_x + v*P_y)
+    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, p_s], axis=-1)
@@ -5,25 +5,134 @@ Hamiltonian
 Generic single particle accelerator Hamiltonian factory
 
 """
+from typing import Any
 from typing import Callable
 from typing import Optional
 
+import numpy
+
 import jax
 from jax import Array
+from jax.extend.core import Literal
+
+from elementary.precision import longitudinal
+
+UNARY:tuple[str, ...] = ('broadcast_in_dim', 'convert_element_type', 'copy', 'copy_p', 'neg', 'reshape', 'slice', 'squeeze',
+                         'transpose', 'split', 'dynamic_slice', 'gather', 'expand_dims', 'reduce_sum', 'integer_pow', 'div')
+ALL:tuple[str, ...] = ('add', 'add_any', 'sub', 'concatenate', 'max', 'min')
+ANY:tuple[str, ...] = ('mul', 'dot_general')
+
+
+def zeros(function:Callable[..., Any], *args:Any) -> tuple[bool, ...]:
+    """
+    Detect statically zero outputs
+
+    Parameters
+    ----------
+    function: Callable[..., Any]
+        function
+    *args: Any
+        arguments (arrays or shapes)
+
+    Returns
+    -------
+    tuple[bool, ...]
+        flag for each (flattened) output
+
+    Note
+    ----
+    Zeros are propagated forward through traced operations (e.g. zeros_like, slicing, products with zero)
+    Detection is conservative, i.e. unknown operations are assumed to produce non zero values
+
+    """
+    closed = jax.make_jaxpr(function)(*args)
+    def zero(atom:Any, table:set) -> bool:
+        if isinstance(atom, Literal):
+            return not numpy.any(numpy.asarray(atom.val))
+        return atom in table
+    def propagate(jaxpr:Any, inputs:list[bool], table:Optional[set]=None) -> list[bool]:
+        table = (table or set()) | {var for var, flag in zip(jaxpr.invars, inputs) if flag}
+        for eqn in jaxpr.eqns:
+            name = eqn.primitive.name
+            flags = [zero(var, table) for var in eqn.invars]
+            if name in ('pjit', 'jit', 'closed_call'):
+                inner = eqn.params.get('jaxpr') or eqn.params.get('call_jaxpr')
+                result = propagate(getattr(inner, 'jaxpr', inner), flags)
+            elif name == 'select_n':
+                result = [all(flags[1:])]*len(eqn.outvars)
+            elif name == 'integer_pow':
+                result = [flags[0] and eqn.params['y'] > 0]*len(eqn.outvars)
+            elif name in UNARY:
+                result = [flags[0]]*len(eqn.outvars)
+            elif name in ALL:
+                result = [all(flags)]*len(eqn.outvars)
+            elif name in ANY:
+                result = [any(flags)]*len(eqn.outvars)
+            else:
+                result = [False]*len(eqn.outvars)
+            table |= {var for var, flag in zip(eqn.outvars, result) if flag}
+        return [zero(var, table) for var in jaxpr.outvars]
+    table = {var for var, const in zip(closed.jaxpr.constvars, closed.consts) if not numpy.any(numpy.asarray(const))}
+    return tuple(propagate(closed.jaxpr, [False]*len(closed.jaxpr.invars), table))
 
 
-def hamiltonian_factory(vector:Callable[..., tuple[Array, Array, Array]],
+def potential_factory(vector:Optional[Callable[..., tuple[Array, Array, Array]]]=None,
+                      scalar:Optional[Callable[..., Array]]=None,
+                      prune:bool=True) -> Callable[..., tuple[Optional[Array], ...]]:
+    """
+    Generate (pruned) potentials
+
+    Parameters
+    ----------
+    vector: Optional[Callable[..., tuple[Array, Array, Array]]]
+        normalized vector potential
+    scalar: Optional[Callable[..., Array]]
+        normalized scalar potential
+    prune: bool, default=True
+        flag to replace statically zero components with None
+
+    Returns
+    -------
+    Callable[..., tuple[Optional[Array], ...]]
+        potentials (a_x, a_y, a_s, phi) with (qs, s, *args) signature
+
+    Note
+    ----
+    Zero components are detected once for each argument signature (at trace time)
+
+    """
+    def function(qs:Array, s:Array, *args:Array) -> tuple[Array, ...]:
+        a_x, a_y, a_s = vector(qs, s, *args) if vector else tuple(jax.numpy.zeros_like(qs))
+        phi = scalar(qs, s, *args) if scalar else jax.numpy.zeros_like(s)
+        return a_x, a_y, a_s, phi
+    cache = {}
+    def potential(qs:Array, s:Array, *args:Array) -> tuple[Optional[Array], ...]:
+        args = (qs, s, *args)
+        result = function(*args)
+        if not prune:
+            return result
+        shapes = tuple(jax.ShapeDtypeStruct(jax.numpy.shape(arg), jax.numpy.result_type(arg)) for arg in args)
+        key = tuple((shape.shape, str(shape.dtype)) for shape in shapes)
+        if key not in cache:
+            cache[key] = zeros(function, *shapes)
+        return tuple(None if flag else value for value, flag in zip(result, cache[key]))
+    return potential
+
+
+def hamiltonian_factory(vector:Optional[Callable[..., tuple[Array, Array, Array]]]=None,
                         scalar:Optional[Callable[..., Array]]=None, *,
                         curvature:Optional[Callable[..., Array]]=None,
                         torsion:Optional[Callable[..., Array]]=None,
                         beta:Optional[float]=None,
-                        gamma:Optional[float]=None) -> Callable[..., Array]:
+                        gamma:Optional[float]=None,
+                        prune:bool=True,
+                        gradient:bool=False) -> Callable[..., Array]:
     """
     Generic single particle Hamiltonian factory
 
     Parameters
     ----------
-    vector: Callable[..., tuple[Array, Array, Array]]
+    vector: Optional[Callable[..., tuple[Array, Array, Array]]]
         normalized vector potential
     scalar: Optional[Callable[..., Array]]
         normalized scalar potential
@@ -35,6 +144,10 @@ def hamiltonian_factory(vector:Callable[..., tuple[Array, Array, Array]],
         beta
     gamma: Optional[float]
         gamma
+    prune: bool, default=True
+        flag to prune statically zero potential components
+    gradient: bool, default=False
+        flag to use analytic derivatives (see gradient_factory) for differentiation
 
     Returns
     -------
@@ -45,30 +158,188 @@ def hamiltonian_factory(vector:Callable[..., tuple[Array, Array, Array]],
     Vector and scalar potentials are assumed to have (qs, *args) signatures
     Curvature and torsion are functions of independent parameter
     The resulting hamiltonian has (qs, ps, s, *args) signature
+    Hamiltonian is a scalar single particle function (qs and ps have (3, ) shape), batched states are mapped (see element.batch)
+    Square root is expanded as 1 + d/beta + e with d = p_s - scalar and small remainder e
+    Thus, p_s/beta - (1 + h q_x)*root is evaluated without cancellation (reduced precision friendly)
+    With gradient flag, derivatives (e.g. jax.grad in integrators) are computed from closed form partial derivatives
+    with respect to momenta and potentials, only potentials are differentiated with autodiff
 
     """
     beta = beta if beta else 1.0
     constant = 1/(beta**2*gamma**2) if gamma else 0.0
+    offset = 1/beta**2 - constant - 1.0
+    scale = 1.0 - 1/beta**2
+    potential = potential_factory(vector, scalar, prune)
     def hamiltonian(qs: Array, ps: Array, s: Array, *args: Array) -> Array:
         q_x, q_y, *_ = qs
         p_x, p_y, p_s = ps
-        a_x, a_y, a_s = vector(qs, s, *args)
-        P_s = p_s + 1/beta
-        if scalar:
-            P_s = P_s - scalar(qs, s, *args)
-        P_x = p_x - a_x
-        P_y = p_y - a_y
-        root = jax.numpy.sqrt(P_s**2 - P_x**2 - P_y**2 - constant)
-        factor = 1.0
+        a_x, a_y, a_s, phi = potential(qs, s, *args)
+        d = p_s if phi is None else p_s - phi
+        P_x = p_x if a_x is None else p_x - a_x
+        P_y = p_y if a_y is None else p_y - a_y
+        z = 1 + d/beta
+        root = jax.numpy.sqrt(z**2 + offset + scale*d**2 - P_x**2 - P_y**2)
+        e = (offset + scale*d**2 - P_x**2 - P_y**2)/(root + z)
+        e = e if a_s is None else e + a_s
+        result = -1.0 if phi is None else phi/beta - 1.0
         if curvature:
-            factor = 1 + curvature(s, *args)*q_x
-        result = p_s/beta - factor*(root + a_s)
+            g = curvature(s, *args)*q_x
+            result = result - g*z - (1 + g)*e
+        else:
+            result = result - e
         if torsion:
             result = result - torsion(s, *args)*(q_x*p_y - q_y*p_x)
         return result
+    if not gradient:
+        return hamiltonian
+    partials = partials_factory(potential, curvature=curvature, torsion=torsion, beta=beta, constant=constant)
+    function = hamiltonian
+    hamiltonian = jax.custom_jvp(function)
+    @hamiltonian.defjvp
+    def hamiltonian_jvp(primals:tuple[Array, ...], tangents:tuple[Array, ...]) -> tuple[Array, Array]:
+        qs, ps, s, *args = primals
+        dqs, dps, ds, *dargs = tangents
+        q_x, q_y, *_ = qs
+        p_x, p_y, *_ = ps
+        dq_x, dq_y, *_ = dqs
+        dp_x, dp_y, dp_s = dps
+        value, (c_x, c_y, c_s, c_phi, c_g, tau), _ = partials(qs, ps, s, *args)
+        fields = [index for index, cotangent in enumerate((c_x, c_y, c_s, c_phi)) if cotangent is not None]
+        cotangents = [(c_x, c_y, c_s, c_phi)[index] for index in fields]
+        def field(qs:Array, s:Array, *args:Array) -> tuple[Array, ...]:
+            values = potential(qs, s, *args)
+            return tuple(values[index] for index in fields)
+        _, deltas = jax.jvp(field, (qs, s, *args), (dqs, ds, *dargs))
+        tangent = value['dp_x']*dp_x + value['dp_y']*dp_y + value['dp_s']*dp_s
+        tangent = tangent + sum(cotangent*delta for cotangent, delta in zip(cotangents, deltas))
+        if curvature:
+            kappa, dkappa = jax.jvp(curvature, (s, *args), (ds, *dargs))
+            tangent = tangent + c_g*(dkappa*q_x + kappa*dq_x)
+        if torsion:
+            _, dtau = jax.jvp(torsion, (s, *args), (ds, *dargs))
+            tangent = tangent - dtau*(q_x*p_y - q_y*p_x) - tau*(dq_x*p_y - dq_y*p_x)
+        return function(qs, ps, s, *args), tangent
     return hamiltonian
 
 
+def partials_factory(potential:Callable[..., tuple[Optional[Array], ...]], *,
+                     curvature:Optional[Callable[..., Array]]=None,
+                     torsion:Optional[Callable[..., Array]]=None,
+                     beta:float=1.0,
+                     constant:float=0.0) -> Callable[..., tuple[dict[str, Array], tuple[Optional[Array], ...], Array]]:
+    """
+    Generate closed form hamiltonian partial derivatives
+
+    Parameters
+    ----------
+    potential: Callable[..., tuple[Optional[Array], ...]]
+        (pruned) potentials (see potential_factory)
+    curvature: Optional[Callable[..., Array]]
+        curvature
+    torsion: Optional[Callable[..., Array]]
+        torsion
+    beta: float, default=1.0
+        beta
+    constant: float, default=0.0
+        1/(beta*gamma)**2
+
+    Returns
+    -------
+    Callable[..., tuple[dict[str, Array], tuple[Optional[Array], ...], Array]]
+        function with (qs, ps, s, *args) signature returning
+        momenta derivatives (dp_x, dp_y, dp_s), potentials cotangents (a_x, a_y, a_s, phi, curvature term, torsion)
+        and (d/d q_x, d/d q_y) explicit coordinate derivatives (curvature and torsion)
+
+    Note
+    ----
+    Cotangents of pruned components are None
+    Longitudinal derivative is evaluated without cancellation (see precision.longitudinal)
+
+    """
+    def partials(qs:Array, ps:Array, s:Array, *args:Array) -> tuple[dict[str, Array], tuple[Optional[Array], ...], Array]:
+        q_x, q_y, *_ = qs
+        p_x, p_y, p_s = ps
+        a_x, a_y, a_s, phi = potential(qs, s, *args)
+        d = p_s if phi is None else p_s - phi
+        P_x = p_x if a_x is None else p_x - a_x
+        P_y = p_y if a_y is None else p_y - a_y
+        root, factor = longitudinal(P_x, P_y, d, beta, constant)
+        kappa = curvature(s, *args) if curvature else 0.0
+        tau = torsion(s, *args) if torsion else 0.0
+        w = 1.0 + kappa*q_x
+        dP_x = w*P_x/root
+        dP_y = w*P_y/root
+        dd = factor - kappa*q_x*(1/beta + d)/root if curvature else factor
+        c_g = -(root + (0.0 if a_s is None else a_s))
+        value = dict(dp_x=dP_x + tau*q_y, dp_y=dP_y - tau*q_x, dp_s=dd)
+        cotangents = (None if a_x is None else -dP_x,
+                      None if a_y is None else -dP_y,
+                      None if a_s is None else -w,
+                      None if phi is None else 1/beta - dd,
+                      c_g,
+                      tau)
+        explicit = jax.numpy.stack([c_g*kappa - tau*p_y, tau*p_x])
+        return value, cotangents, explicit
+    return partials
+
+
+def gradient_factory(vector:Optional[Callable[..., tuple[Array, Array, Array]]]=None,
+                     scalar:Optional[Callable[..., Array]]=None, *,
+                     curvature:Optional[Callable[..., Array]]=None,
+                     torsion:Optional[Callable[..., Array]]=None,
+                     beta:Optional[float]=None,
+                     gamma:Optional[float]=None,
+                     prune:bool=True) -> Callable[..., tuple[Array, Array]]:
+    """
+    Generic single particle Hamiltonian gradient factory
+
+    Parameters
+    ----------
+    vector: Optional[Callable[..., tuple[Array, Array, Array]]]
+        normalized vector potential
+    scalar: Optional[Callable[..., Array]]
+        normalized scalar potential
+    curvature: Optional[Callable[..., Array]]
+        curvature
+    torsion: Optional[Callable[..., Array]]
+        torsion
+    beta: Optional[float]
+        beta
+    gamma: Optional[float]
+        gamma
+    prune: bool, default=True
+        flag to prune statically zero potential components
+
+    Returns
+    -------
+    Callable[..., tuple[Array, Array]]
+        gradient with (qs, ps, s, *args) signature returning (dH/dqs, dH/dps)
+
+    Note
+    ----
+    Momenta derivatives are closed form, coordinate derivatives are given by a single vector-jacobian product
+    of (non zero) potentials with closed form cotangents
+
+    """
+    beta = beta if beta else 1.0
+    constant = 1/(beta**2*gamma**2) if gamma else 0.0
+    potential = potential_factory(vector, scalar, prune)
+    partials = partials_factory(potential, curvature=curvature, torsion=torsion, beta=beta, constant=constant)
+    def gradient(qs:Array, ps:Array, s:Array, *args:Array) -> tuple[Array, Array]:
+        value, (*cotangents, _, _), explicit = partials(qs, ps, s, *args)
+        fields = [index for index, cotangent in enumerate(cotangents) if cotangent is not None]
+        dqs = jax.numpy.zeros_like(qs).at[:2].add(explicit)
+        if fields:
+            def field(qs:Array) -> tuple[Array, ...]:
+                values = potential(qs, s, *args)
+                return tuple(values[index] for index in fields)
+            _, vjp = jax.vjp(field, qs)
+            (delta, ) = vjp(tuple(cotangents[index]*jax.numpy.ones_like(qs[0]) for index in fields))
+            dqs = dqs + delta
+        return dqs, jax.numpy.stack([value['dp_x'], value['dp_y'], value['dp_s']])
+    return gradient
+
+
 def autonomize(hamiltonian:Callable[..., Array]) -> Callable[..., Array]:
     """
     Autonomize hamiltonian
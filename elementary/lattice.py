@@ -0,0 +1,785 @@
+"""
+Lattice
+-------
+
+MAD-X sequence, JSON and TOML lattice ingestion into grouped element tables
+
+"""
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+import math
+import re
+
+from hashlib import sha256
+from json import dumps
+from json import loads
+from pathlib import Path
+from tomllib import loads as toml
+
+import numpy
+
+import jax
+from jax import Array
+
+from elementary import __version__
+from elementary.alignment import alignment_factory
+from elementary.cavity import cavity_factory
+from elementary.dipole import dipole_factory
+from elementary.drift import drift_factory
+from elementary.fringe import dipole_fringe_factory
+from elementary.line import switch
+from elementary.multipole import kick
+from elementary.octupole import octupole_factory
+from elementary.precision import precise
+from elementary.quadrupole import quadrupole_factory
+from elementary.sextupole import sextupole_factory
+
+PATH:Path = Path.home() / '.cache' / 'elementary' / 'lattice'
+
+KINDS:dict[str, tuple[str, ...]] = {
+    'drift': ('l', ),
+    'quadrupole': ('l', 'k1', 'k1s'),
+    'sextupole': ('l', 'k2', 'k2s'),
+    'octupole': ('l', 'k3', 'k3s'),
+    'multipole': ('l', 'knl0', 'ksl0', 'knl1', 'ksl1', 'knl2', 'ksl2', 'knl3', 'ksl3'),
+    'sbend': ('l', 'angle', 'e1', 'e2', 'hgap', 'fint', 'fintx'),
+    'cbend': ('l', 'angle', 'e1', 'e2', 'hgap', 'fint', 'fintx', 'k1', 'k1s', 'k2', 'k2s'),
+    'kicker': ('l', 'hkick', 'vkick'),
+    'rfcavity': ('l', 'volt', 'freq', 'lag')
+}
+
+CLASSES:tuple[str, ...] = ('drift', 'quadrupole', 'sextupole', 'octupole', 'multipole', 'sbend', 'rbend',
+                           'hkicker', 'vkicker', 'kicker', 'tkicker', 'rfcavity')
+PASSIVE:tuple[str, ...] = ('marker', 'monitor', 'hmonitor', 'vmonitor', 'instrument', 'placeholder',
+                           'collimator', 'ecollimator', 'rcollimator')
+ERRORS:tuple[str, ...] = ('dx', 'dy', 'ds', 'dphi', 'dtheta', 'dpsi')
+
+CONSTANTS:dict[str, float] = {
+    'pi': math.pi,
+    'twopi': 2*math.pi,
+    'degrad': 180/math.pi,
+    'raddeg': math.pi/180,
+    'e': math.e,
+    'clight': 299792458.0,
+    'emass': 0.51099895000E-3,
+    'pmass': 0.93827208816,
+    'nmass': 0.93956542052,
+    'mumass': 0.1056583755
+}
+
+FUNCTIONS:dict[str, Callable[..., float]] = {
+    'sqrt': math.sqrt,
+    'exp': math.exp,
+    'log': math.log,
+    'log10': math.log10,
+    'sin': math.sin,
+    'cos': math.cos,
+    'tan': math.tan,
+    'asin': math.asin,
+    'acos': math.acos,
+    'atan': math.atan,
+    'atan2': math.atan2,
+    'sinh': math.sinh,
+    'cosh': math.cosh,
+    'tanh': math.tanh,
+    'abs': abs,
+    'floor': math.floor,
+    'ceil': math.ceil,
+    'round': round
+}
+
+TOKEN = re.compile(r'\s*(?:(\d+\.?\d*(?:e[+-]?\d+)?|\.\d+(?:e[+-]?\d+)?)|([a-z_][\w.$]*)|(->|[-+*/^(),]))')
+NAME = r'[a-z_][\w.$]*'
+
+
+def evaluate(text:str,
+             lookup:Callable[[str], float],
+             functions:dict[str, Callable[..., float]]) -> float:
+    """
+    Evaluate MAD-X arithmetic expression
+
+    Parameters
+    ----------
+    text: str
+        expression (lower case)
+    lookup: Callable[[str], float]
+        variable (name) or element attribute (label->attribute) value
+    functions: dict[str, Callable[..., float]]
+        available functions
+
+    Returns
+    -------
+    float
+
+    """
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f'Invalid expression {text}')
+        tokens.append(match.groups())
+        position = match.end()
+    tokens.append((None, None, None))
+    index = 0
+    def peek() -> tuple[Optional[str], ...]:
+        return tokens[index]
+    def take() -> tuple[Optional[str], ...]:
+        nonlocal index
+        index += 1
+        return tokens[index - 1]
+    def expect(symbol:str) -> None:
+        if take()[2] != symbol:
+            raise ValueError(f'Expected {symbol} in expression {text}')
+    def expression() -> float:
+        value = term()
+        while peek()[2] in ('+', '-'):
+            value = value + term() if take()[2] == '+' else value - term()
+        return value
+    def term() -> float:
+        value = unary()
+        while peek()[2] in ('*', '/'):
+            value = value*unary() if take()[2] == '*' else value/unary()
+        return value
+    def unary() -> float:
+        if peek()[2] in ('+', '-'):
+            return unary() if take()[2] == '+' else -unary()
+        return power()
+    def power() -> float:
+        value = atom()
+        if peek()[2] == '^':
+            take()
+            return value**unary()
+        return value
+    def atom() -> float:
+        number, name, symbol = take()
+        if number is not None:
+            return float(number)
+        if symbol == '(':
+            value = expression()
+            expect(')')
+            return value
+        if name is None:
+            raise ValueError(f'Invalid expression {text}')
+        if peek()[2] == '(':
+            take()
+            args = []
+            while peek()[2] != ')':
+                args.append(expression())
+                if peek()[2] == ',':
+                    take()
+            expect(')')
+            if name not in functions:
+                raise ValueError(f'Unknown function {name} in expression {text}')
+            return float(functions[name](*args))
+        if peek()[2] == '->':
+            take()
+            _, attribute, _ = take()
+            return lookup(f'{name}->{attribute}')
+        return lookup(name)
+    value = expression()
+    if peek() != (None, None, None):
+        raise ValueError(f'Invalid expression {text}')
+    return value
+
+
+def split(text:str) -> list[str]:
+    """
+    Split text on top level commas
+
+    """
+    parts = []
+    depth = 0
+    quote = False
+    start = 0
+    for i, char in enumerate(text):
+        if char == '"':
+            quote = not quote
+        if not quote and char in '({':
+            depth += 1
+        if not quote and char in ')}':
+            depth -= 1
+        if not quote and not depth and char == ',':
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return [part for part in parts if part]
+
+
+def attributes(text:Optional[str]) -> dict[str, Any]:
+    """
+    Parse command attributes
+
+    Parameters
+    ----------
+    text: Optional[str]
+        comma separated attributes (key=value, key:=value, key or -key)
+
+    Returns
+    -------
+    dict[str, Any]
+        key to (expression, deferred), list of (expression, deferred), string or bool
+
+    """
+    table = {}
+    for part in split(text or ''):
+        match = re.fullmatch(rf'({NAME})\s*(:?=)\s*(.+)', part, flags=re.DOTALL)
+        if not match:
+            table[part.lstrip('-').strip()] = not part.startswith('-')
+            continue
+        key, operator, value = match.groups()
+        value = value.strip()
+        deferred = operator == ':='
+        if value.startswith('"'):
+            table[key] = value.strip('"')
+        elif value.startswith('{'):
+            table[key] = [(item, deferred) for item in split(value.strip('{}'))]
+        else:
+            table[key] = (value, deferred)
+    return table
+
+
+def source(path:str|Path) -> str:
+    """
+    Read MAD-X file with inlined call statements
+
+    """
+    path = Path(path)
+    text = path.read_text()
+    def include(match:re.Match) -> str:
+        return source(path.parent / match.group(1))
+    return re.sub(r'call\s*,\s*file\s*=\s*"?([^";]+?)"?\s*;', include, text, flags=re.IGNORECASE)
+
+
+def parse(text:str,
+          sequence:Optional[str]=None,
+          seed:int=123456789) -> list[dict[str, Any]]:
+    """
+    Parse MAD-X sequence
+
+    Parameters
+    ----------
+    text: str
+        MAD-X input
+    sequence: Optional[str]
+        sequence or line name (default is the last used or defined one)
+    seed: int, default=123456789
+        initial random seed (ranf, gauss and tgauss functions, see also eoption)
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        ordered element records with name, class, attributes and alignment errors (dx, dy, ds, dphi, dtheta, dpsi)
+        gaps between elements are filled with drifts
+
+    Note
+    ----
+    Supported statements: variable assignments (= and :=), element definitions (with inheritance),
+    label->attribute assignments, sequence (refer, at and from), line (repetition, reflection and sublists),
+    use, select (flag=error) with class, pattern, range or full, ealign and eoption (seed and add)
+    Other statements (beam, option, twiss, ...) are ignored
+    Undefined variables are evaluated to zero (MAD-X convention)
+    Deferred ealign expressions are evaluated for each selected element
+
+    """
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+    text = re.sub(r'(//|!).*', '', text).lower()
+    generator = numpy.random.default_rng(seed)
+    def tgauss(cut:float) -> float:
+        while abs(value := generator.standard_normal()) > cut:
+            pass
+        return value
+    functions = FUNCTIONS | dict(ranf=lambda: generator.random(), gauss=lambda: generator.standard_normal(), tgauss=tgauss)
+    variables = {}
+    definitions = {}
+    sequences = {}
+    lines = {}
+    current = None
+    used = None
+    selection = []
+    commands = []
+    add = False
+    def lookup(name:str) -> float:
+        if '->' in name:
+            label, key = name.split('->')
+            return value(attribute(label, key, 0.0))
+        if name in variables:
+            return value(variables[name])
+        return CONSTANTS.get(name, 0.0)
+    def value(item:Any) -> Any:
+        if isinstance(item, tuple):
+            expression, _ = item
+            return evaluate(expression, lookup, functions)
+        if isinstance(item, list):
+            return [value(element) for element in item]
+        return item
+    def immediate(item:Any) -> Any:
+        if isinstance(item, tuple) and not item[-1]:
+            return value(item)
+        if isinstance(item, list):
+            return [immediate(element) for element in item]
+        return item
+    def attribute(label:str, key:str, default:Any=None) -> Any:
+        while label in definitions:
+            parent, table = definitions[label]
+            if key in table:
+                return table[key]
+            label = parent
+        return default
+    def base(label:str) -> tuple[str, list[str]]:
+        chain = [label]
+        while label in definitions:
+            label, _ = definitions[label]
+            chain.append(label)
+        return label, chain
+    def define(label:str, parent:str, table:dict[str, Any]) -> None:
+        definitions[label] = (parent, {key: immediate(item) for key, item in table.items()})
+    for statement in text.split(';'):
+        statement = ' '.join(statement.split())
+        if not statement:
+            continue
+        if match := re.fullmatch(rf'(?:(?:const|real|int|shared)\s+)*({NAME})\s*->\s*({NAME})\s*(:?=)\s*(.+)', statement):
+            label, key, operator, expression = match.groups()
+            parent, table = definitions.get(label, (label, {}))
+            definitions[label] = (parent, table | {key: immediate((expression, operator == ':='))})
+            continue
+        if match := re.fullmatch(rf'(?:(?:const|real|int|shared)\s+)*({NAME})\s*(:?=)\s*(.+)', statement):
+            name, operator, expression = match.groups()
+            variables[name] = immediate((expression, operator == ':='))
+            continue
+        if match := re.fullmatch(rf'({NAME})\s*:\s*line\s*=\s*\((.*)\)', statement):
+            name, body = match.groups()
+            lines[name] = split(body)
+            continue
+        if current is not None:
+            if statement == 'endsequence':
+                current = None
+                continue
+            match = re.fullmatch(rf'({NAME})\s*(?::\s*({NAME}))?\s*(?:,(.*))?', statement)
+            if not match:
+                raise ValueError(f'Invalid sequence entry {statement}')
+            label, parent, rest = match.groups()
+            table = attributes(rest)
+            at, start = table.pop('at', ('0', False)), table.pop('from', None)
+            if parent:
+                define(label, parent, table)
+            sequences[current]['entries'].append((label, at, start))
+            continue
+        match = re.fullmatch(rf'({NAME})\s*(?::\s*({NAME}))?\s*(?:,(.*))?', statement)
+        if not match:
+            continue
+        label, parent, rest = match.groups()
+        if parent == 'sequence':
+            table = attributes(rest)
+            sequences[label] = dict(l=immediate(table.get('l', ('0', False))),
+                                    refer=table.get('refer', ('centre', False))[0],
+                                    entries=[])
+            current = label
+            continue
+        if parent:
+            define(label, parent, attributes(rest))
+            continue
+        table = attributes(rest)
+        if label == 'use':
+            used = (table.get('sequence') or table.get('period'))[0]
+        if label == 'eoption':
+            if 'seed' in table:
+                generator = numpy.random.default_rng(int(value(table['seed'])))
+                commands.append(int(value(table['seed'])))
+            if 'add' in table:
+                add = table['add'] if isinstance(table['add'], bool) else table['add'][0] == 'true'
+        if label == 'select' and table.get('flag', ('', False))[0] == 'error':
+            if table.get('clear'):
+                selection = []
+            else:
+                selection = selection + [{key: item if isinstance(item, (bool, str)) else item[0] for key, item in table.items()}]
+        if label == 'ealign':
+            commands.append((selection, {key: immediate(item) for key, item in table.items() if key in ERRORS}, add))
+    name = sequence or used or ([*sequences, *lines] or [None])[-1]
+    if name is None or (name not in sequences and name not in lines):
+        raise ValueError(f'Expected sequence or line in {sorted([*sequences, *lines])}, got {name}')
+    def record(label:str) -> dict[str, Any]:
+        kind, chain = base(label)
+        if kind in sequences or kind in lines:
+            raise ValueError(f'Nested sequences are not supported ({label})')
+        keys = set()
+        for item in chain:
+            keys |= set(definitions.get(item, (None, {}))[1])
+        table = {key: value(attribute(label, key)) for key in keys}
+        return dict(name=label, chain=chain, **{'class': kind}, **table)
+    if name in sequences:
+        offset = dict(entry=0.0, centre=0.5, center=0.5, exit=1.0)[sequences[name]['refer']]
+        placed = {}
+        items = []
+        for count, (label, at, start) in enumerate(sequences[name]['entries']):
+            item = record(label)
+            position = value(at) + (placed[start[0]] if start else 0.0)
+            placed.setdefault(label, position)
+            items.append((position - offset*float(item.get('l', 0.0)), count, item))
+        items.sort(key=lambda item: item[:2])
+        records = []
+        total = 0.0
+        for position, _, item in items:
+            if position - total < -1.0E-9:
+                raise ValueError(f'Element {item["name"]} overlaps with previous element by {total - position}')
+            if position - total > 1.0E-12:
+                records.append(dict(name=f'drift_{len(records)}', chain=[], **{'class': 'drift', 'l': position - total}))
+            records.append(item)
+            total = max(total, position + float(item.get('l', 0.0)))
+        length = value(sequences[name]['l'])
+        if length - total > 1.0E-12:
+            records.append(dict(name=f'drift_{len(records)}', chain=[], **{'class': 'drift', 'l': length - total}))
+    else:
+        def expand(entry:str) -> list[str]:
+            match = re.fullmatch(rf'(?:(\d+)\s*\*\s*)?(-?)\s*(?:({NAME})|\((.*)\))', entry, flags=re.DOTALL)
+            if not match:
+                raise ValueError(f'Unsupported line entry {entry}')
+            count, sign, name, body = match.groups()
+            if body is not None:
+                result = [item for part in split(body) for item in expand(part)]
+            else:
+                result = [item for part in lines[name] for item in expand(part)] if name in lines else [name]
+            result = result[::-1] if sign else result
+            return result*int(count or 1)
+        records = [record(label) for label in expand(name)]
+    names = [item['name'] for item in records]
+    def selected(item:dict[str, Any], index:int, rules:list[dict[str, Any]]) -> bool:
+        if not item['chain']:
+            return False
+        for rule in rules:
+            if rule.get('full'):
+                return True
+            if 'class' in rule and rule['class'] not in item['chain']:
+                continue
+            if 'pattern' in rule and not re.search(rule['pattern'], item['name']):
+                continue
+            if 'range' in rule:
+                first, _, last = rule['range'].partition('/')
+                first = 0 if first == '#s' else names.index(first)
+                last = len(names) - 1 if last == '#e' else names.index(last) if last else first
+                if not first <= index <= last:
+                    continue
+            return True
+        return False
+    for item in records:
+        item.update({key: 0.0 for key in ERRORS})
+    generator = numpy.random.default_rng(seed)
+    for command in commands:
+        if isinstance(command, int):
+            generator = numpy.random.default_rng(command)
+            continue
+        rules, table, add = command
+        for index, item in enumerate(records):
+            if selected(item, index, rules):
+                update = {key: value(table.get(key, 0.0)) for key in ERRORS}
+                item.update({key: item[key] + update[key] if add else update[key] for key in ERRORS})
+    for item in records:
+        del item['chain']
+    return records
+
+
+def read(path:str|Path,
+         sequence:Optional[str]=None,
+         seed:int=123456789) -> list[dict[str, Any]]:
+    """
+    Read lattice file
+
+    Parameters
+    ----------
+    path: str|Path
+        MAD-X (any suffix), JSON (.json) or TOML (.toml) lattice file
+    sequence: Optional[str]
+        MAD-X sequence or line name
+    seed: int, default=123456789
+        MAD-X initial random seed
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        ordered element records (see parse)
+
+    Note
+    ----
+    JSON and TOML files contain ordered records (JSON list or elements list/array of tables)
+    Each record has name, class (MAD-X class), numeric attributes and optional errors
+
+    """
+    path = Path(path)
+    if path.suffix in ('.json', '.toml'):
+        data = loads(path.read_text()) if path.suffix == '.json' else toml(path.read_text())
+        data = data['elements'] if isinstance(data, dict) else data
+        return [{key.lower(): value.lower() if key == 'class' else value for key, value in item.items()} | {key: float(item.get(key, 0.0)) for key in ERRORS} for item in data]
+    return parse(source(path), sequence, seed)
+
+
+def convert(item:dict[str, Any]) -> Optional[tuple[str, tuple[float, ...], float, float, tuple[float, ...]]]:
+    """
+    Convert element record to kind, parameters, length, angle and errors (None for skipped elements)
+
+    """
+    kind = item['class']
+    def get(key:str, default:float=0.0) -> float:
+        return float(item.get(key, default))
+    length = get('l')
+    errors = tuple(get(key) for key in ERRORS[:-1]) + (get('dpsi') + get('tilt'), )
+    if kind == 'drift' or kind in PASSIVE:
+        return ('drift', (length, ), length, 0.0, errors) if length else None
+    if kind in ('quadrupole', 'sextupole', 'octupole'):
+        if not length:
+            raise ValueError(f'Expected non zero length for {kind} {item["name"]}')
+        n = dict(quadrupole=1, sextupole=2, octupole=3)[kind]
+        return kind, (length, get(f'k{n}'), get(f'k{n}s')), length, 0.0, errors
+    if kind == 'multipole':
+        knl = list(item.get('knl', [])) + [0.0]*4
+        ksl = list(item.get('ksl', [])) + [0.0]*4
+        if any(knl[4:]) or any(ksl[4:]):
+            raise ValueError(f'Expected multipole orders up to octupole for {item["name"]}')
+        return kind, (0.0, *(float(value) for pair in zip(knl[:4], ksl[:4]) for value in pair)), 0.0, 0.0, errors
+    if kind in ('sbend', 'rbend'):
+        angle = get('angle')
+        e1, e2 = get('e1'), get('e2')
+        if kind == 'rbend':
+            length = length*(angle/2)/math.sin(angle/2) if angle else length
+            e1, e2 = e1 + angle/2, e2 + angle/2
+        k = (get('k1'), get('k1s'), get('k2'), get('k2s'))
+        if not angle:
+            if any(k):
+                raise ValueError(f'Expected non zero angle for combined function dipole {item["name"]}')
+            return ('drift', (length, ), length, 0.0, errors) if length else None
+        edges = (e1, e2, get('hgap'), get('fint'), get('fintx', get('fint')))
+        if any(k):
+            return 'cbend', (length, angle, *edges, *k), length, angle, errors
+        return 'sbend', (length, angle, *edges), length, angle, errors
+    if kind in ('hkicker', 'vkicker', 'kicker', 'tkicker'):
+        hkick = get('kick') if kind == 'hkicker' else get('hkick')
+        vkick = get('kick') if kind == 'vkicker' else get('vkick')
+        return 'kicker', (length, hkick, vkick), length, 0.0, errors
+    if kind == 'rfcavity':
+        return kind, (length, get('volt'), get('freq'), get('lag')), length, 0.0, errors
+    raise ValueError(f'Expected class in {CLASSES + PASSIVE}, got {kind} ({item["name"]})')
+
+
+def table(records:list[dict[str, Any]]) -> dict[str, numpy.ndarray]:
+    """
+    Generate columnar lattice table
+
+    Parameters
+    ----------
+    records: list[dict[str, Any]]
+        ordered element records (see parse and read)
+
+    Returns
+    -------
+    dict[str, numpy.ndarray]
+        name, class, kind (index in KINDS), index (in kind group), position (element start), length, angle,
+        errors (dx, dy, ds, dphi, dtheta, dpsi) with (n, 6) shape and
+        parameters of each kind with (count, len(KINDS[kind])) shape (columns are given by KINDS)
+
+    Note
+    ----
+    Zero length passive elements (markers, monitors, ...) are skipped
+    Magnet tilt is added to dpsi (roll)
+
+    """
+    kinds = list(KINDS)
+    columns = {kind: [] for kind in kinds}
+    name, kind, index, length, angle, errors = [], [], [], [], [], []
+    classes = []
+    for item in records:
+        result = convert(item)
+        if result is None:
+            continue
+        group, parameters, size, bend, error = result
+        name.append(item['name'])
+        classes.append(item['class'])
+        kind.append(kinds.index(group))
+        index.append(len(columns[group]))
+        columns[group].append(parameters)
+        length.append(size)
+        angle.append(bend)
+        errors.append(error)
+    length = numpy.asarray(length, dtype=numpy.float64)
+    return {'name': numpy.asarray(name, dtype=str),
+            'class': numpy.asarray(classes, dtype=str),
+            'kind': numpy.asarray(kind, dtype=numpy.int32),
+            'index': numpy.asarray(index, dtype=numpy.int32),
+            'position': numpy.cumsum(length) - length,
+            'length': length,
+            'angle': numpy.asarray(angle, dtype=numpy.float64),
+            'errors': numpy.asarray(errors, dtype=numpy.float64).reshape(-1, len(ERRORS)),
+            **{group: numpy.asarray(columns[group], dtype=numpy.float64).reshape(-1, len(KINDS[group])) for group in kinds}}
+
+
+def load(path:str|Path, *,
+         sequence:Optional[str]=None,
+         seed:int=123456789,
+         cache:bool=True,
+         directory:Optional[str|Path]=None) -> dict[str, numpy.ndarray]:
+    """
+    Load (cached) columnar lattice table
+
+    Parameters
+    ----------
+    path: str|Path
+        lattice file (see read)
+    sequence: Optional[str]
+        MAD-X sequence or line name
+    seed: int, default=123456789
+        MAD-X initial random seed
+    cache: bool, default=True
+        flag to use binary cache
+    directory: Optional[str|Path]
+        cache directory (default ~/.cache/elementary/lattice)
+
+    Returns
+    -------
+    dict[str, numpy.ndarray]
+
+    Note
+    ----
+    Cache is addressed by file content (including called files), arguments and elementary version
+
+    """
+    path = Path(path)
+    text = path.read_text() if path.suffix in ('.json', '.toml') else source(path)
+    digest = sha256(text.encode('utf-8'))
+    digest.update(dumps(dict(suffix=path.suffix, sequence=sequence, seed=seed, version=__version__), sort_keys=True).encode('utf-8'))
+    key = digest.hexdigest()
+    file = (Path(directory) if directory else PATH) / key[:2] / f'{key}.npz'
+    if cache and file.exists():
+        with numpy.load(file) as data:
+            return {name: data[name] for name in data.files}
+    result = table(read(path, sequence, seed))
+    if cache:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        numpy.savez(file, **result)
+    return result
+
+
+def thin(qsps:Array, length:Array, *knl:Array) -> Array:
+    """
+    Thin multipole kick (integrated strengths up to octupole)
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    kd_n, kd_s, *knl = knl
+    f_x, f_y = kick(jax.numpy.stack([q_x, q_y, q_s]), 0.0, *knl)
+    return jax.numpy.stack([q_x, q_y, q_s, p_x + f_x - kd_n, p_y + f_y + kd_s, p_s], axis=-1)
+
+
+def lattice_factory(table:dict[str, numpy.ndarray], *,
+                    beta:Optional[float]=None,
+                    gamma:Optional[float]=None,
+                    rigidity:Optional[float]=None,
+                    align:Optional[bool]=None,
+                    precision:str='double',
+                    final:bool=True,
+                    **options:Any) -> tuple[Callable[..., Array], tuple[Array, ...]]:
+    """
+    Generate lattice transfer map
+
+    Parameters
+    ----------
+    table: dict[str, numpy.ndarray]
+        columnar lattice table (see table and load)
+    beta: Optional[float]
+        beta
+    gamma: Optional[float]
+        gamma
+    rigidity: Optional[float]
+        magnetic rigidity (required for cavities)
+    align: Optional[bool]
+        flag to apply alignment errors (default is True if table has non zero errors)
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
+    final: bool, default=True
+        flag to return only the final state
+    **options: Any
+        integrator options (driver, settings, order, iterations, step) for sextupoles, octupoles and combined function dipoles
+
+    Returns
+    -------
+    tuple[Callable[..., Array], tuple[Array, ...]]
+        lattice transfer map with (qsps, parameters) signature and initial parameters
+        parameters of each present kind (columns are given by KINDS)
+        for aligned lattice, the last parameter is errors array with (n, 6) shape
+
+    Note
+    ----
+    Drifts and dipoles are exact, quadrupoles use closed form (paraxial) transformation
+    Multipoles are thin kicks, kickers and cavities are thin kicks between half length drifts
+    Dipole edges are applied for (e1, e2, hgap, fint, fintx), MAD-X cavity lag is given in units of 2 pi
+
+    """
+    present = [kind for kind in KINDS if len(table[kind])]
+    if 'rfcavity' in present and rigidity is None:
+        raise ValueError('Expected rigidity for lattice with cavities')
+    align = bool(numpy.any(table['errors'])) if align is None else align
+    drift = drift_factory(exact=True, beta=beta, gamma=gamma, precision=precision)
+    edge_entrance, edge_exit = dipole_fringe_factory(precision)
+    def element(kind:str) -> Callable[..., Array]:
+        if kind == 'drift':
+            return drift
+        if kind == 'quadrupole':
+            return quadrupole_factory(exact=True, beta=beta, gamma=gamma, precision=precision)
+        if kind == 'sextupole':
+            return sextupole_factory(beta=beta, gamma=gamma, precision=precision, **options)
+        if kind == 'octupole':
+            return octupole_factory(beta=beta, gamma=gamma, precision=precision, **options)
+        if kind == 'multipole':
+            return precise(thin, precision)
+        if kind in ('sbend', 'cbend'):
+            if kind == 'sbend':
+                body = dipole_factory(exact=True, beta=beta, gamma=gamma, precision=precision)
+            else:
+                body = dipole_factory(exact=False, multipole=True, limit=2, beta=beta, gamma=gamma, precision=precision, **options)
+            def bend(qsps:Array, length:Array, angle:Array, e1:Array, e2:Array, hgap:Array, fint:Array, fintx:Array, *args:Array) -> Array:
+                qsps = edge_entrance(qsps, length, angle, e1, hgap, fint)
+                qsps = body(qsps, length, angle, *args)
+                return edge_exit(qsps, length, angle, e2, hgap, fintx)
+            return bend
+        if kind == 'kicker':
+            def kicker(qsps:Array, length:Array, hkick:Array, vkick:Array) -> Array:
+                qsps = drift(qsps, length/2)
+                qsps = qsps + jax.numpy.stack([0.0, 0.0, 0.0, hkick, vkick, 0.0]).astype(qsps.dtype)
+                return drift(qsps, length/2)
+            return kicker
+        cavity = cavity_factory(rigidity, kind='kick', beta=beta, gamma=gamma, precision=precision)
+        def rfcavity(qsps:Array, length:Array, voltage:Array, frequency:Array, lag:Array) -> Array:
+            qsps = drift(qsps, length/2)
+            qsps = cavity(qsps, voltage, 2*jax.numpy.pi*lag)
+            return drift(qsps, length/2)
+        return rfcavity
+    kinds = tuple(element(kind) for kind in present)
+    step = switch(kinds)
+    kind = jax.numpy.asarray([present.index(kind) for kind in numpy.asarray(list(KINDS))[table['kind']]], dtype=jax.numpy.int32)
+    index = jax.numpy.asarray(table['index'], dtype=jax.numpy.int32)
+    length = jax.numpy.asarray(table['length'])
+    angle = jax.numpy.asarray(table['angle'])
+    parameters = tuple(jax.numpy.asarray(table[kind]) for kind in present)
+    if align:
+        entrance, straight = alignment_factory(beta, gamma, flag=False, precision=precision)
+        _, curved = alignment_factory(beta, gamma, flag=True, precision=precision)
+        parameters = (*parameters, jax.numpy.asarray(table['errors']))
+    def body(qsps:Array, xs:tuple[Array, ...], parameters:tuple[Array, ...]) -> Array:
+        if not align:
+            kind, index = xs
+            return step(qsps, kind, index, parameters)
+        kind, index, errors, length, angle = xs
+        qsps = entrance(qsps, *errors)
+        qsps = step(qsps, kind, index, parameters[:-1])
+        return jax.lax.cond(angle == 0.0,
+                            lambda qsps: straight(qsps, *errors, length),
+                            lambda qsps: curved(qsps, *errors, length, angle),
+                            qsps)
+    def line(qsps:Array, parameters:tuple[Array, ...]) -> Array:
+        xs = (kind, index, parameters[-1], length, angle) if align else (kind, index)
+        def scan(qsps:Array, xs:tuple[Array, ...]) -> tuple[Array, Optional[Array]]:
+            qsps = body(qsps, xs, parameters)
+            return qsps, None if final else qsps
+        state, trajectory = jax.lax.scan(scan, qsps, xs)
+        return state if final else trajectory
+    return line, parameters
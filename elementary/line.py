@@ -0,0 +1,123 @@
+"""
+Line
+----
+
+Line (ordered sequence of elements) factory
+
+"""
+from typing import Any
+from typing import Callable
+
+import jax
+from jax import Array
+
+
+def group(elements:list[tuple[Any, ...]]) -> tuple[tuple[Callable[..., Array], ...], Array, Array, tuple[Array, ...]]:
+    """
+    Group line elements by kind
+
+    Parameters
+    ----------
+    elements: list[tuple[Any, ...]]
+        ordered (element, *parameters) specifications
+
+    Returns
+    -------
+    tuple[tuple[Callable[..., Array], ...], Array, Array, tuple[Array, ...]]
+        element kinds, kind index and group index of each element, stacked parameters of each kind
+
+    Note
+    ----
+    Elements are grouped by identity, i.e. the same element callable defines one kind
+    All elements of the same kind should have the same number of parameters
+
+    """
+    kinds = []
+    table = []
+    kind = []
+    index = []
+    for element, *parameters in elements:
+        if not any(element is other for other in kinds):
+            kinds.append(element)
+            table.append([])
+        count = next(i for i, other in enumerate(kinds) if element is other)
+        if table[count] and len(table[count][-1]) != len(parameters):
+            raise ValueError(f'Expected {len(table[count][-1])} parameters for element {element}, got {len(parameters)}')
+        kind.append(count)
+        index.append(len(table[count]))
+        table[count].append(parameters)
+    kind = jax.numpy.asarray(kind, dtype=jax.numpy.int32)
+    index = jax.numpy.asarray(index, dtype=jax.numpy.int32)
+    parameters = tuple(jax.numpy.asarray(group).reshape(len(group), -1) for group in table)
+    return tuple(kinds), kind, index, parameters
+
+
+def switch(kinds:tuple[Callable[..., Array], ...]) -> Callable[..., Array]:
+    """
+    Generate single element step over grouped element kinds
+
+    Parameters
+    ----------
+    kinds: tuple[Callable[..., Array], ...]
+        element kinds
+
+    Returns
+    -------
+    Callable[..., Array]
+
+    Note
+    ----
+    The resulting step has (qsps, kind, index, parameters) signature
+    Each element kind is traced (and compiled) once
+
+    """
+    def branch(count:int, element:Callable[..., Array]) -> Callable[..., Array]:
+        def function(qsps:Array, index:Array, parameters:tuple[Array, ...]) -> Array:
+            return element(qsps, *parameters[count][index])
+        return function
+    branches = [branch(count, element) for count, element in enumerate(kinds)]
+    def step(qsps:Array, kind:Array, index:Array, parameters:tuple[Array, ...]) -> Array:
+        return jax.lax.switch(kind, branches, qsps, index, parameters)
+    return step
+
+
+def line_factory(elements:list[tuple[Any, ...]],
+                 final:bool=True) -> tuple[Callable[..., Array], tuple[Array, ...]]:
+    """
+    Generate line transfer map
+
+    Parameters
+    ----------
+    elements: list[tuple[Any, ...]]
+        ordered (element, *parameters) specifications
+    final: bool, default=True
+        flag to return only the final state
+
+    Returns
+    -------
+    tuple[Callable[..., Array], tuple[Array, ...]]
+        line transfer map with (qsps, parameters) signature and initial (grouped) parameters
+
+    Note
+    ----
+    Elements are grouped by kind with parameters of each kind stacked into (count, length) arrays
+    Line is evaluated with a single scan over elements, each kind is traced once
+    The resulting map can be used with nest and nest_list for multi-turn tracking
+
+    """
+    kinds, kind, index, parameters = group(elements)
+    step = switch(kinds)
+    if final:
+        def line(qsps:Array, parameters:tuple[Array, ...]) -> Array:
+            def body(qsps:Array, xs:tuple[Array, Array]) -> tuple[Array, None]:
+                return step(qsps, *xs, parameters), None
+            qsps, _ = jax.lax.scan(body, qsps, (kind, index))
+            return qsps
+        return line, parameters
+    def line(qsps:Array, parameters:tuple[Array, ...]) -> Array:
+        def body(qsps:Array, xs:tuple[Array, Array]) -> tuple[Array, Array]:
+            qsps = step(qsps, *xs, parameters)
+            return qsps, qsps
+        _, qsps = jax.lax.scan(body, qsps, (kind, index))
+        return qsps
+    return line, parameters
@@ -11,16 +11,21 @@ from typing import Callable
 import jax
 from jax import Array
 
+from elementary.cache import memoize
 from elementary.element import element_factory
 
 
+@memoize
 def multipole_factory(beta:Optional[float]=None,
                       gamma:Optional[float]=None,
                       driver:Optional[Callable[..., Array]]=None,
                       settings:Optional[dict]=None,
                       order:int=0,
                       iterations:int=1,
-                      final:bool=True) -> Callable[..., Array]:
+                      final:bool=True,
+                      step:Optional[float]=None,
+                      split:bool=False,
+                      precision:str='double') -> Callable[..., Array]:
     """
     Multipole element transfer map
 
@@ -40,6 +45,12 @@ def multipole_factory(beta:Optional[float]=None,
         number of integration
     final: bool, default=True
         flag to return only the final state
+    step: Optional[float]
+        maximum integration step length (overrides iterations)
+    split: bool, default=False
+        drift-kick splitting (exact drift and kick)
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
@@ -54,6 +65,10 @@ def multipole_factory(beta:Optional[float]=None,
                               settings=settings,
                               order=order,
                               iterations=iterations,
+                              step=step,
+                              precision=precision,
+                              split=split,
+                              kick=kick,
                               autonomous=True,
                               final=final)
     def multipole(qsps, length, kq_n, kq_s, ks_n, ks_s, ko_n, ko_s):
@@ -78,3 +93,25 @@ def vector(qs:Array,
     a_s = a_s - ks_n/2*(q_x**3/3 - q_x*q_y**2) - ks_s/2*(-q_x**2*q_y + q_y**3/3)
     a_s = a_s - ko_n/6*(q_x**4/4 - 3*q_x**2*q_y**2/2 + q_y**4/4) - ko_s/6*(-q_x**3*q_y + q_x*q_y**3)
     return a_x, a_y, a_s
+
+
+def kick(qs:Array,
+         s:Array,
+         kq_n:Array,
+         kq_s:Array,
+         ks_n:Array,
+         ks_s:Array,
+         ko_n:Array,
+         ko_s:Array) -> tuple[Array, Array]:
+    """
+    Transverse kick (vector potential gradient)
+
+    """
+    q_x, q_y, _ = qs
+    f_x = -kq_n*q_x + kq_s*q_y
+    f_y = +kq_n*q_y + kq_s*q_x
+    f_x = f_x - ks_n/2*(q_x**2 - q_y**2) + ks_s*q_x*q_y
+    f_y = f_y + ks_n*q_x*q_y + ks_s/2*(q_x**2 - q_y**2)
+    f_x = f_x - ko_n/6*(q_x**3 - 3*q_x*q_y**2) - ko_s/6*(-3*q_x**2*q_y + q_y**3)
+    f_y = f_y - ko_n/6*(-3*q_x**2*q_y + q_y**3) - ko_s/6*(-q_x**3 + 3*q_x*q_y**2)
+    return f_x, f_y
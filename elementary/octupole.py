@@ -11,16 +11,21 @@ from typing import Callable
 import jax
 from jax import Array
 
+from elementary.cache import memoize
 from elementary.element import element_factory
 
 
+@memoize
 def octupole_factory(beta:Optional[float]=None,
                      gamma:Optional[float]=None,
                      driver:Optional[Callable[..., Array]]=None,
                      settings:Optional[dict]=None,
                      order:int=0,
                      iterations:int=1,
-                     final:bool=True) -> Callable[..., Array]:
+                     final:bool=True,
+                     step:Optional[float]=None,
+                     split:bool=False,
+                     precision:str='double') -> Callable[..., Array]:
     """
     Octupole element transfer map
 
@@ -40,6 +45,12 @@ def octupole_factory(beta:Optional[float]=None,
         number of integration
     final: bool, default=True
         flag to return only the final state
+    step: Optional[float]
+        maximum integration step length (overrides iterations)
+    split: bool, default=False
+        drift-kick splitting (exact drift and kick)
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
@@ -54,6 +65,10 @@ def octupole_factory(beta:Optional[float]=None,
                               settings=settings,
                               order=order,
                               iterations=iterations,
+                              step=step,
+                              precision=precision,
+                              split=split,
+                              kick=kick,
                               autonomous=True,
                               final=final)
     def octupole(qsps, length, kn, ks):
@@ -69,3 +84,14 @@ def vector(qs:Array, s:Array, kn:Array, ks:Array) -> tuple[Array, Array, Array]:
     a_x, a_y, a_s = jax.numpy.zeros_like(qs)
     a_s = -kn/6*(q_x**4/4 - 3*q_x**2*q_y**2/2 + q_y**4/4) - ks/6*(-q_x**3*q_y + q_x*q_y**3)
     return a_x, a_y, a_s
+
+
+def kick(qs:Array, s:Array, kn:Array, ks:Array) -> tuple[Array, Array]:
+    """
+    Transverse kick (vector potential gradient)
+
+    """
+    q_x, q_y, _ = qs
+    f_x = -kn/6*(q_x**3 - 3*q_x*q_y**2) - ks/6*(-3*q_x**2*q_y + q_y**3)
+    f_y = -kn/6*(-3*q_x**2*q_y + q_y**3) - ks/6*(-q_x**3 + 3*q_x*q_y**2)
+    return f_x, f_y
@@ -0,0 +1,214 @@
+"""
+Optics
+------
+
+Transfer matrices, twiss parameters, tunes and dispersion
+
+"""
+from typing import Any
+from typing import Callable
+
+import jax
+from jax import Array
+
+from elementary.line import group
+from elementary.line import switch
+
+
+def matrix_factory(elements:list[tuple[Any, ...]]) -> tuple[Callable[..., tuple[Array, Array]], tuple[Array, ...]]:
+    """
+    Generate line element transfer matrices
+
+    Parameters
+    ----------
+    elements: list[tuple[Any, ...]]
+        ordered (element, *parameters) specifications
+
+    Returns
+    -------
+    tuple[Callable[..., tuple[Array, Array]], tuple[Array, ...]]
+        transfer matrices with (qsps, parameters) signature and initial (grouped) parameters
+
+    Note
+    ----
+    The resulting function returns states at element exits with (n, 6) shape and matrices with (n, 6, 6) shape
+    Matrices are computed along the orbit in a single forward mode sweep over elements
+
+    """
+    kinds, kind, index, parameters = group(elements)
+    step = switch(kinds)
+    def matrices(qsps:Array, parameters:tuple[Array, ...]) -> tuple[Array, Array]:
+        def body(qsps:Array, xs:tuple[Array, Array]) -> tuple[Array, tuple[Array, Array]]:
+            def function(qsps:Array) -> tuple[Array, Array]:
+                qsps = step(qsps, *xs, parameters)
+                return qsps, qsps
+            matrix, qsps = jax.jacfwd(function, has_aux=True)(qsps)
+            return qsps, (qsps, matrix)
+        _, (qsps, matrix) = jax.lax.scan(body, qsps, (kind, index))
+        return qsps, matrix
+    return matrices, parameters
+
+
+def transport(matrices:Array) -> Array:
+    """
+    Accumulate transfer matrices (prefix products)
+
+    Parameters
+    ----------
+    matrices: Array
+        element transfer matrices with (n, 6, 6) shape
+
+    Returns
+    -------
+    Array
+        transfer matrices from line start to each element exit with (n, 6, 6) shape
+
+    Note
+    ----
+    Prefix products are computed with associative scan (logarithmic depth)
+    The last matrix is the one-turn matrix
+
+    """
+    return jax.lax.associative_scan(lambda a, b: b @ a, matrices)
+
+
+def block(matrix:Array, plane:int) -> Array:
+    """
+    Extract plane (2, 2) block (q_plane, p_plane)
+
+    Parameters
+    ----------
+    matrix: Array
+        transfer matrix(es) with (..., 6, 6) shape
+    plane: int
+        plane index (0 for x, 1 for y)
+
+    Returns
+    -------
+    Array
+
+    """
+    index = jax.numpy.array([plane, plane + 3])
+    return matrix[..., index[:, None], index[None, :]]
+
+
+def twiss(matrix:Array) -> tuple[Array, Array, Array]:
+    """
+    Compute (uncoupled) tunes and twiss parameters from one-turn matrix
+
+    Parameters
+    ----------
+    matrix: Array
+        one-turn matrix
+
+    Returns
+    -------
+    tuple[Array, Array, Array]
+        tunes, alphas and betas for x and y planes
+
+    Note
+    ----
+    Coupling between planes is ignored
+    Tunes are fractional, i.e. in [0, 1) interval
+
+    """
+    tunes, alphas, betas = [], [], []
+    for plane in (0, 1):
+        (m11, m12), (m21, m22) = block(matrix, plane)
+        cos = 0.5*(m11 + m22)
+        sin = jax.numpy.sign(m12)*jax.numpy.sqrt(1.0 - cos**2)
+        tunes.append(jax.numpy.mod(jax.numpy.arctan2(sin, cos)/(2.0*jax.numpy.pi), 1.0))
+        alphas.append(0.5*(m11 - m22)/sin)
+        betas.append(m12/sin)
+    return jax.numpy.stack(tunes), jax.numpy.stack(alphas), jax.numpy.stack(betas)
+
+
+def dispersion(matrix:Array) -> Array:
+    """
+    Compute periodic dispersion from one-turn matrix
+
+    Parameters
+    ----------
+    matrix: Array
+        one-turn matrix
+
+    Returns
+    -------
+    Array
+        dispersion (qx, qy, px, py) with respect to p_s
+
+    """
+    index = jax.numpy.array([0, 1, 3, 4])
+    reduced = matrix[index[:, None], index[None, :]]
+    return jax.numpy.linalg.solve(jax.numpy.eye(4, dtype=matrix.dtype) - reduced, matrix[index, 5])
+
+
+def propagate(matrices:Array,
+              alphas:Array,
+              betas:Array,
+              dispersion:Array) -> tuple[Array, Array, Array, Array]:
+    """
+    Propagate twiss parameters and dispersion
+
+    Parameters
+    ----------
+    matrices: Array
+        transfer matrices from line start with (n, 6, 6) shape
+    alphas: Array
+        initial alphas for x and y planes
+    betas: Array
+        initial betas for x and y planes
+    dispersion: Array
+        initial dispersion (qx, qy, px, py)
+
+    Returns
+    -------
+    tuple[Array, Array, Array, Array]
+        alphas, betas and phase advances with (n, 2) shape and dispersion with (n, 4) shape
+
+    """
+    phases, alphas_out, betas_out = [], [], []
+    for plane in (0, 1):
+        alpha, beta = alphas[plane], betas[plane]
+        (r11, r12), (r21, r22) = jax.numpy.moveaxis(block(matrices, plane), (-2, -1), (0, 1))
+        a = r11*beta - r12*alpha
+        b = r21*beta - r22*alpha
+        betas_out.append((a**2 + r12**2)/beta)
+        alphas_out.append(-(a*b + r12*r22)/beta)
+        phases.append(jax.numpy.unwrap(jax.numpy.arctan2(r12, a)))
+    index = jax.numpy.array([0, 1, 3, 4])
+    reduced = matrices[:, index[:, None], index[None, :]]
+    dispersion = reduced @ dispersion + matrices[:, index, 5]
+    return jax.numpy.stack(alphas_out, -1), jax.numpy.stack(betas_out, -1), jax.numpy.stack(phases, -1), dispersion
+
+
+def optics_factory(elements:list[tuple[Any, ...]]) -> tuple[Callable[..., tuple[Array, ...]], tuple[Array, ...]]:
+    """
+    Generate line optics
+
+    Parameters
+    ----------
+    elements: list[tuple[Any, ...]]
+        ordered (element, *parameters) specifications
+
+    Returns
+    -------
+    tuple[Callable[..., tuple[Array, ...]], tuple[Array, ...]]
+        optics with (qsps, parameters) signature and initial (grouped) parameters
+
+    Note
+    ----
+    The resulting function returns tunes, alphas, betas, phase advances and dispersion at element exits
+    Input state should be the closed orbit at line start
+    Optics can be vectorized (vmap) over states and parameters
+
+    """
+    matrices, parameters = matrix_factory(elements)
+    def optics(qsps:Array, parameters:tuple[Array, ...]) -> tuple[Array, ...]:
+        _, matrix = matrices(qsps, parameters)
+        matrix = transport(matrix)
+        *_, turn = matrix
+        tunes, alphas, betas = twiss(turn)
+        alphas, betas, phases, eta = propagate(matrix, alphas, betas, dispersion(turn))
+        return tunes, alphas, betas, phases, eta
+    return optics, parameters
@@ -0,0 +1,225 @@
+"""
+Precision
+---------
+
+Floating point precision policy and compensated accumulation
+
+"""
+from typing import Callable
+
+import jax
+from jax import Array
+
+PRECISION:tuple[str, ...] = ('double', 'single', 'mixed')
+
+
+def dtype(precision:str) -> type:
+    """
+    Particle arithmetic floating point type
+
+    Parameters
+    ----------
+    precision: str
+        precision mode ('double', 'single' or 'mixed')
+
+    Returns
+    -------
+    type
+
+    """
+    if precision not in PRECISION:
+        raise ValueError(f'Expected precision in {PRECISION}, got {precision}')
+    return jax.numpy.float64 if precision == 'double' else jax.numpy.float32
+
+
+def cast(args:tuple[Array, ...], precision:str) -> tuple[Array, ...]:
+    """
+    Cast floating point parameters
+
+    """
+    kind = dtype(precision)
+    def convert(arg:Array) -> Array:
+        if isinstance(arg, (int, float)) or not jax.numpy.issubdtype(jax.numpy.result_type(arg), jax.numpy.floating):
+            return arg
+        return jax.numpy.asarray(arg, dtype=kind)
+    return tuple(convert(arg) for arg in args)
+
+
+def kahan(total:Array, compensation:Array, value:Array) -> tuple[Array, Array]:
+    """
+    Compensated (Kahan) summation step
+
+    Parameters
+    ----------
+    total: Array
+        running sum
+    compensation: Array
+        running compensation (negative lost low order part)
+    value: Array
+        increment
+
+    Returns
+    -------
+    tuple[Array, Array]
+
+    """
+    value = value - compensation
+    result = total + value
+    compensation = (result - total) - value
+    return result, compensation
+
+
+def longitudinal(p_x:Array, p_y:Array, p_s:Array, beta:float=1.0, constant:float=0.0) -> tuple[Array, Array]:
+    """
+    Longitudinal momentum and path length factor
+
+    Parameters
+    ----------
+    p_x: Array
+        p_x
+    p_y: Array
+        p_y
+    p_s: Array
+        p_s
+    beta: float, default=1.0
+        beta
+    constant: float, default=0.0
+        1/(beta*gamma)**2
+
+    Returns
+    -------
+    tuple[Array, Array]
+        sqrt((1/beta + p_s)**2 - p_x**2 - p_y**2 - constant) and 1/beta - (1/beta + p_s)/sqrt(...)
+
+    Note
+    ----
+    Both are computed without cancellation for small deviations
+    Reference constants are evaluated in double precision
+
+    """
+    b = 1/beta**2 - constant
+    p = p_x**2 + p_y**2
+    q = p_s*(2/beta + p_s)
+    dp = jax.numpy.sqrt(b + q - p)
+    return dp, path(p_x, p_y, p_s, dp, beta, constant)
+
+
+def path(p_x:Array, p_y:Array, p_s:Array, dp:Array, beta:float=1.0, constant:float=0.0) -> Array:
+    """
+    Path length factor for given longitudinal momentum (see longitudinal)
+
+    """
+    a = 1.0 - beta**2
+    r = a/beta**2 - constant
+    p = p_x**2 + p_y**2
+    q = p_s*(2/beta + p_s)
+    return (a*q + r - p)/(beta*dp*(dp + beta*(1/beta + p_s)))
+
+
+def differential(p_x:Array, p_y:Array, p_s:Array,
+                 dp_x:Array, dp_y:Array, dp_s:Array,
+                 beta:float=1.0, constant:float=0.0) -> tuple[tuple[Array, Array], tuple[Array, Array]]:
+    """
+    Longitudinal momentum and path length factor with their differentials
+
+    Parameters
+    ----------
+    p_x, p_y, p_s: Array
+        momenta
+    dp_x, dp_y, dp_s: Array
+        momenta tangents
+    beta: float, default=1.0
+        beta
+    constant: float, default=0.0
+        1/(beta*gamma)**2
+
+    Returns
+    -------
+    tuple[tuple[Array, Array], tuple[Array, Array]]
+        longitudinal values (see longitudinal) and their tangents
+
+    """
+    dp, ds = longitudinal(p_x, p_y, p_s, beta, constant)
+    P_s = 1/beta + p_s
+    ddp = (P_s*dp_s - p_x*dp_x - p_y*dp_y)/dp
+    dds = (P_s*ddp/dp - dp_s)/dp
+    return (dp, ds), (ddp, dds)
+
+
+def precise(mapping:Callable[..., Array],
+            precision:str='double',
+            invariant:bool=True) -> Callable[..., Array]:
+    """
+    Apply precision policy to transformation
+
+    Parameters
+    ----------
+    mapping: Callable[..., Array]
+        transformation with (qsps, *args) signature
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
+    invariant: bool, default=True
+        flag for transformations invariant under q_s translation
+
+    Returns
+    -------
+    Callable[..., Array]
+
+    Note
+    ----
+    double: no casting
+    single: state and parameters are cast to float32
+    mixed: increments are computed in float32 and added to the state in its own (storage) type
+    For invariant transformations, increments are computed with q_s set to zero (no absorption)
+
+    """
+    if precision == 'double':
+        return mapping
+    kind = dtype(precision)
+    if precision == 'single':
+        def wrapper(qsps:Array, *args:Array) -> Array:
+            return mapping(qsps.astype(kind), *cast(args, precision))
+        return wrapper
+    def wrapper(qsps:Array, *args:Array) -> Array:
+        x = qsps.astype(kind)
+        if invariant:
+            x = x.at[..., 2].set(0.0)
+        return qsps + (mapping(x, *cast(args, precision)) - x).astype(qsps.dtype)
+    return wrapper
+
+
+def compensated(slice:Callable[..., Array],
+                invariant:bool=True) -> Callable[..., Array]:
+    """
+    Generate compensated float32 integration
+
+    Parameters
+    ----------
+    slice: Callable[..., Array]
+        integration step with (qsps, length, start, *args) signature
+    invariant: bool, default=True
+        flag for steps invariant under q_s translation
+
+    Returns
+    -------
+    Callable[..., Array]
+
+    Note
+    ----
+    The resulting function has (qsps, count, length, start, *args) signature
+    Steps are evaluated in float32, increments are accumulated with Kahan summation
+    Low order part of the input state is used as initial compensation and is folded into the result
+
+    """
+    kind = jax.numpy.float32
+    def integrator(qsps:Array, count:Array, length:Array, start:Array, *args:Array) -> Array:
+        total = qsps.astype(kind)
+        compensation = (total.astype(qsps.dtype) - qsps).astype(kind)
+        length, start, *args = cast((length, start, *args), 'single')
+        def body(_:Array, state:tuple[Array, Array]) -> tuple[Array, Array]:
+            total, compensation = state
+            x = total.at[2].set(0.0) if invariant else total
+            return kahan(total, compensation, slice(x, length/count, start, *args) - x)
+        total, compensation = jax.lax.fori_loop(0, count, body, (total, compensation))
+        return total.astype(qsps.dtype) - compensation.astype(qsps.dtype)
+    return integrator
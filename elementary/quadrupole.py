@@ -11,16 +11,24 @@ from typing import Callable
 import jax
 from jax import Array
 
+from elementary.cache import memoize
 from elementary.element import element_factory
+from elementary.precision import longitudinal
+from elementary.precision import precise
 
 
+@memoize
 def quadrupole_factory(beta:Optional[float]=None,
                        gamma:Optional[float]=None,
                        driver:Optional[Callable[..., Array]]=None,
                        settings:Optional[dict]=None,
                        order:int=0,
                        iterations:int=1,
-                       final:bool=True) -> Callable[..., Array]:
+                       final:bool=True,
+                       step:Optional[float]=None,
+                       exact:bool=False,
+                       split:bool=False,
+                       precision:str='double') -> Callable[..., Array]:
     """
     Quadrupole element transfer map
 
@@ -40,12 +48,31 @@ def quadrupole_factory(beta:Optional[float]=None,
         number of integration
     final: bool, default=True
         flag to return only the final state
+    step: Optional[float]
+        maximum integration step length (overrides iterations)
+    exact: bool, default=False
+        closed form (paraxial) transformation
+    split: bool, default=False
+        drift-kick splitting (exact drift and kick)
+    precision: str, default='double'
+        precision mode ('double', 'single' or 'mixed')
 
     Returns
     -------
     Callable[..., Array]
 
+    Note
+    ----
+    Closed form transformation is the exact solution for the expanded (paraxial) hamiltonian
+    Chromatic dependence (total momentum) is exact, integrator parameters are ignored
+
     """
+    if exact:
+        beta = beta if beta else 1.0
+        constant = 1/(beta**2*gamma**2) if gamma else 0.0
+        def quadrupole(qsps:Array, length:Array, kn:Array, ks:Array) -> Array:
+            return mapping(qsps, length, kn, ks, beta, constant)
+        return precise(quadrupole, precision)
     element = element_factory(vector,
                               scalar=None,
                               beta=beta,
@@ -54,6 +81,10 @@ def quadrupole_factory(beta:Optional[float]=None,
                               settings=settings,
                               order=order,
                               iterations=iterations,
+                              step=step,
+                              precision=precision,
+                              split=split,
+                              kick=kick,
                               autonomous=True,
                               final=final)
     def quadrupole(qsps, length, kn, ks):
@@ -69,3 +100,74 @@ def vector(qs:Array, s:Array, kn:Array, ks:Array) -> tuple[Array, Array, Array]:
     a_x, a_y, a_s = jax.numpy.zeros_like(qs)
     a_s = -1/2*kn*(q_x**2 - q_y**2) + ks*q_x*q_y
     return a_x, a_y, a_s
+
+
+def functions(u:Array) -> tuple[Array, Array, Array, Array]:
+    """
+    Even and odd parts of cos(sqrt(w)) and sin(sqrt(w))/sqrt(w) with w = sqrt(u)
+
+    Note
+    ----
+    Odd parts are divided by w, all parts are smooth functions of u
+
+    """
+    flag = u < 1.0E-2
+    w = jax.numpy.sqrt(jax.numpy.where(flag, 1.0, u))
+    root = jax.numpy.sqrt(w)
+    c_e = (jax.numpy.cos(root) + jax.numpy.cosh(root))/2
+    c_o = (jax.numpy.cos(root) - jax.numpy.cosh(root))/(2*w)
+    s_e = (jax.numpy.sin(root) + jax.numpy.sinh(root))/(2*root)
+    s_o = (jax.numpy.sin(root) - jax.numpy.sinh(root))/(2*root*w)
+    c_e = jax.numpy.where(flag, 1 + u/24 + u**2/40320, c_e)
+    c_o = jax.numpy.where(flag, -1/2 - u/720 - u**2/3628800, c_o)
+    s_e = jax.numpy.where(flag, 1 + u/120 + u**2/362880, s_e)
+    s_o = jax.numpy.where(flag, -1/6 - u/5040 - u**2/39916800, s_o)
+    return c_e, c_o, s_e, s_o
+
+
+def mapping(qsps:Array, length:Array, kn:Array, ks:Array, beta:float=1.0, constant:float=0.0) -> Array:
+    """
+    Closed form (paraxial) quadrupole body transformation
+
+    Note
+    ----
+    Transverse force matrix A = [[kn, -ks], [-ks, -kn]] satisfies A**2 = (kn**2 + ks**2)*I
+    Thus, transfer matrix functions of A reduce to e*I + o*A with even e and o
+
+    """
+    q_x, q_y, q_s, p_x, p_y, p_s = jax.numpy.unstack(qsps, axis=-1)
+    def apply(e:Array, o:Array, v_x:Array, v_y:Array) -> tuple[Array, Array]:
+        return e*v_x + o*(kn*v_x - ks*v_y), e*v_y - o*(ks*v_x + kn*v_y)
+    P_s = 1/beta + p_s
+    P, ds = longitudinal(0.0, 0.0, p_s, beta, constant)
+    a = kn**2 + ks**2
+    t = length**2/P
+    c_e, c_o, s_e, s_o = functions(a*t**2)
+    c_o, s_e, s_o = t*c_o, length*s_e, length*t*s_o
+    cs_e, cs_o = c_e*s_e + a*c_o*s_o, c_e*s_o + c_o*s_e
+    ss_e, ss_o = s_e**2 + a*s_o**2, 2*s_e*s_o
+    Q_x, Q_y = apply(c_e, c_o, q_x, q_y)
+    D_x, D_y = apply(s_e, s_o, p_x, p_y)
+    Q_x, Q_y = Q_x + D_x/P, Q_y + D_y/P
+    P_x, P_y = apply(c_e, c_o, p_x, p_y)
+    D_x, D_y = apply(a*s_o, s_e, q_x, q_y)
+    P_x, P_y = P_x - D_x, P_y - D_y
+    R_x, R_y = apply(length + cs_e, cs_o, p_x, p_y)
+    integral = (p_x*R_x + p_y*R_y)/2
+    R_x, R_y = apply(-a*cs_o, length - cs_e, q_x, q_y)
+    integral = integral + P*(q_x*R_x + q_y*R_y)/2
+    R_x, R_y = apply(a*ss_o, ss_e, p_x, p_y)
+    integral = integral - (q_x*R_x + q_y*R_y)
+    Q_s = q_s + length*ds - P_s/(2*P**3)*integral
+    return jax.numpy.stack([Q_x, Q_y, Q_s, P_x, P_y, p_s], axis=-1)
+
+
+def kick(qs:Array, s:Array, kn:Array, ks:Array) -> tuple[Array, Array]:
+    """
+    Transverse kick (vector potential gradient)
+
+    """
+    q_x, q_y, _ = qs
+    f_x = -kn*q_x + ks*q_y
+    f_y = +kn*q_y + ks*q_x
+    return f_x, f_y
@@ -0,0 +1,261 @@
+"""
+Reference
+---------
+
+Content addressed MAD-X PTC reference cache
+
+Usage
+-----
+$ python -m elementary.reference info
+$ python -m elementary.reference regenerate --executable madx
+$ python -m elementary.reference evict --size 100000000
+
+"""
+from typing import Any
+from typing import Optional
+
+from argparse import ArgumentParser
+from hashlib import sha256
+from json import dumps
+from json import loads
+from os import utime
+from pathlib import Path
+
+import numpy
+
+import jax
+from jax import Array
+
+from elementary.util import ptc_run
+
+PATH:Path = Path.home() / '.cache' / 'elementary' / 'reference'
+SIZE:int = 2**30
+
+
+def configuration(kind:str,
+                  parameters:dict[str, str|int|float], *,
+                  gamma:float=10.0**9,
+                  exact:bool=True,
+                  tx:float=0.0,
+                  ty:float=0.0,
+                  tz:float=0.0,
+                  rx:float=0.0,
+                  ry:float=0.0,
+                  rz:float=0.0) -> str:
+    """
+    Canonical configuration representation
+
+    Parameters
+    ----------
+    kind: sts
+        element kind (drift, quadrupole, ...)
+    parameters: dict[str, str|int|float]
+        element parameters
+    gamma: float, default=10**9
+        gamma
+    exact: bool, defaul=True
+        exact hamiltonian and alignment flag
+    tx, ty, tz, rx, ry, rz: float, default=0.0
+        alignment errors
+
+    Returns
+    -------
+    str
+
+    """
+    return dumps(dict(kind=kind,
+                      parameters={key: value for key, value in sorted(parameters.items())},
+                      gamma=float(gamma),
+                      exact=bool(exact),
+                      errors=[float(value) for value in (tx, ty, tz, rx, ry, rz)]),
+                 sort_keys=True)
+
+
+def address(qsps:numpy.ndarray, code:str) -> str:
+    """
+    Content address (hash of configuration and initial conditions)
+
+    Parameters
+    ----------
+    qsps: numpy.ndarray
+        initial conditions with (n, 6) shape
+    code: str
+        canonical configuration
+
+    Returns
+    -------
+    str
+
+    """
+    digest = sha256(code.encode('utf-8'))
+    digest.update(numpy.ascontiguousarray(qsps, dtype=numpy.float64).tobytes())
+    return digest.hexdigest()
+
+
+def shard(key:str, path:Optional[Path]=None) -> Path:
+    """
+    Shard file for given address
+
+    """
+    path = Path(path) if path else PATH
+    return path / key[:2] / f'{key}.npz'
+
+
+def reference(qsps:Array,
+              kind:str,
+              parameters:dict[str, str|int|float], *,
+              path:Optional[str|Path]=None,
+              generate:bool=True,
+              executable:str='madx',
+              size:Optional[int]=SIZE,
+              **kwargs:Any) -> Array:
+    """
+    Cached MAD-X PTC reference tracking
+
+    Parameters
+    ----------
+    qsps: Array
+        initial condition(s) (sector ordering) with (6, ) or (n, 6) shape
+    kind: sts
+        element kind (drift, quadrupole, ...)
+    parameters: dict[str, str|int|float]
+        element parameters
+    path: Optional[str|Path]
+        cache directory (default ~/.cache/elementary/reference)
+    generate: bool, default=True
+        flag to run MAD-X on cache miss (KeyError is raised otherwise)
+    executable: str, default='madx'
+        MAD-X executable
+    size: Optional[int], default=SIZE
+        maximum total cache size in bytes (least recently used shards are evicted on write, None to disable)
+    **kwargs: Any
+        gamma, exact and alignment errors (tx, ty, tz, rx, ry, rz)
+
+    Returns
+    -------
+    Array
+        final state(s) with the same shape as initial condition(s)
+
+    """
+    shape = jax.numpy.shape(qsps)
+    qsps = numpy.asarray(qsps, dtype=numpy.float64).reshape(-1, 6)
+    code = configuration(kind, parameters, **kwargs)
+    file = shard(address(qsps, code), path)
+    if file.exists():
+        utime(file)
+        with numpy.load(file) as data:
+            return jax.numpy.asarray(data['result']).reshape(shape)
+    if not generate:
+        raise KeyError(f'Reference for {code} is not cached')
+    result = numpy.asarray(ptc_run(qsps, kind, parameters, executable=executable, **kwargs))
+    if numpy.isnan(result).all():
+        raise RuntimeError(f'Reference for {code} is not cached (all particles are lost)')
+    file.parent.mkdir(parents=True, exist_ok=True)
+    numpy.savez_compressed(file, qsps=qsps, result=result, code=numpy.array(code))
+    if size is not None:
+        evict(size, path)
+    return jax.numpy.asarray(result).reshape(shape)
+
+
+def shards(path:Optional[str|Path]=None) -> list[Path]:
+    """
+    List cached shards (least recently used first)
+
+    """
+    path = Path(path) if path else PATH
+    return sorted(path.glob('*/*.npz'), key=lambda file: file.stat().st_mtime)
+
+
+def regenerate(path:Optional[str|Path]=None,
+               executable:str='madx') -> int:
+    """
+    Regenerate all cached references (e.g. after MAD-X upgrade)
+
+    Parameters
+    ----------
+    path: Optional[str|Path]
+        cache directory
+    executable: str, default='madx'
+        MAD-X executable
+
+    Returns
+    -------
+    int
+        number of regenerated shards
+
+    """
+    files = shards(path)
+    for file in files:
+        with numpy.load(file) as data:
+            qsps, text = data['qsps'], str(data['code'])
+        code = loads(text)
+        tx, ty, tz, rx, ry, rz = code['errors']
+        result = numpy.asarray(ptc_run(qsps,
+                                       code['kind'],
+                                       code['parameters'],
+                                       executable=executable,
+                                       gamma=code['gamma'],
+                                       exact=code['exact'],
+                                       tx=tx, ty=ty, tz=tz, rx=rx, ry=ry, rz=rz))
+        numpy.savez_compressed(file, qsps=qsps, result=result, code=numpy.array(text))
+    return len(files)
+
+
+def evict(size:int,
+          path:Optional[str|Path]=None) -> int:
+    """
+    Evict least recently used shards until total size is below given size
+
+    Parameters
+    ----------
+    size: int
+        maximum total size in bytes
+    path: Optional[str|Path]
+        cache directory
+
+    Returns
+    -------
+    int
+        number of evicted shards
+
+    """
+    files = shards(path)
+    total = sum(file.stat().st_size for file in files)
+    count = 0
+    for file in files:
+        if total <= size:
+            break
+        try:
+            total -= file.stat().st_size
+            file.unlink()
+        except FileNotFoundError:
+            continue
+        count += 1
+    return count
+
+
+def main() -> None:
+    """
+    Command line entry point
+
+    """
+    parser = ArgumentParser(prog='python -m elementary.reference', description='MAD-X PTC reference cache')
+    parser.add_argument('--path', type=Path, default=PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('info')
+    command = commands.add_parser('regenerate')
+    command.add_argument('--executable', default='madx')
+    command = commands.add_parser('evict')
+    command.add_argument('--size', type=int, required=True)
+    arguments = parser.parse_args()
+    if arguments.command == 'info':
+        files = shards(arguments.path)
+        print(f'{arguments.path}: {len(files)} shards, {sum(file.stat().st_size for file in files)} bytes')
+    if arguments.command == 'regenerate':
+        print(f'regenerated {regenerate(arguments.path, arguments.executable)} shards')
+    if arguments.command == 'evict':
+        print(f'evicted {evict(arguments.size, arguments.path)} shards')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,434 @@
+"""
+TPSA
+----
+
+Truncated power series (Taylor) maps extraction, composition and evaluation
+
+"""
+from typing import Any
+from typing import Callable
+from typing import Iterator
+
+from contextlib import contextmanager
+from functools import lru_cache
+from threading import RLock
+from itertools import combinations_with_replacement
+
+import numpy
+
+import jax
+from jax import Array
+from jax.experimental.jet import JetTrace
+from jax.experimental.jet import jet
+from jax.experimental.jet import jet_rules
+from jax.extend.core import jaxpr_as_fun
+from jax.extend.core import set_current_trace
+from jax.extend.core.primitives import asin_p
+from jax.extend.core.primitives import cond_p
+from jax.extend.core.primitives import scan_p
+from jax.extend.core.primitives import while_p
+
+
+@lru_cache
+def monomials(dimension:int, order:int) -> numpy.ndarray:
+    """
+    Monomial exponents upto given total order (sorted by degree)
+
+    Parameters
+    ----------
+    dimension: int
+        number of variables
+    order: int
+        truncation order
+
+    Returns
+    -------
+    numpy.ndarray
+
+    """
+    table = []
+    for degree in range(order + 1):
+        for variables in combinations_with_replacement(range(dimension), degree):
+            table.append(numpy.bincount(numpy.array(variables, dtype=int), minlength=dimension))
+    return numpy.array(table, dtype=int).reshape(-1, dimension)
+
+
+@lru_cache
+def interpolation(dimension:int, order:int) -> tuple[numpy.ndarray, tuple[numpy.ndarray, ...]]:
+    """
+    Interpolation directions and solvers for homogeneous parts of each degree
+
+    Parameters
+    ----------
+    dimension: int
+        number of variables
+    order: int
+        truncation order
+
+    Returns
+    -------
+    tuple[numpy.ndarray, tuple[numpy.ndarray, ...]]
+
+    Note
+    ----
+    Directions are multi-indices of given order, i.e. lattice points of a simplex
+    Homogeneous part of degree k is recovered from its Taylor coefficients along all directions
+
+    """
+    exponents = monomials(dimension, order)
+    degrees = exponents.sum(-1)
+    directions = exponents[degrees == order].astype(numpy.float64)
+    solvers = []
+    for degree in range(order + 1):
+        block = exponents[degrees == degree]
+        matrix = numpy.prod(directions[:, None, :]**block[None, :, :], axis=-1)
+        solvers.append(numpy.linalg.pinv(matrix))
+    return directions, tuple(solvers)
+
+
+@lru_cache
+def multiplication(dimension:int, order:int) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """
+    Truncated product table (i, j, k) for monomials i*j = k
+
+    Parameters
+    ----------
+    dimension: int
+        number of variables
+    order: int
+        truncation order
+
+    Returns
+    -------
+    tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+
+    """
+    exponents = monomials(dimension, order)
+    index = {tuple(exponent): count for count, exponent in enumerate(exponents)}
+    table = []
+    for i, a in enumerate(exponents):
+        for j, b in enumerate(exponents):
+            key = tuple(a + b)
+            if key in index:
+                table.append((i, j, index[key]))
+    i, j, k = numpy.array(table, dtype=int).T
+    return i, j, k
+
+
+def propagate(function:Callable[..., Any],
+              primals:tuple[Array, ...],
+              series:tuple[list[Array], ...]) -> tuple[list[Array], list[list[Array]]]:
+    """
+    Propagate Taylor coefficients through function (only inexact arguments carry series)
+
+    """
+    flags = [jax.numpy.issubdtype(jax.numpy.result_type(primal), jax.numpy.inexact) for primal in primals]
+    def wrapper(*values:Array) -> Any:
+        values = iter(values)
+        return function(*(next(values) if flag else primal for primal, flag in zip(primals, flags)))
+    if not any(flags):
+        out = function(*primals)
+        order, *_ = map(len, series)
+        return list(out), [[jax.numpy.zeros_like(value) for _ in range(order)] for value in out]
+    out_p, out_s = jet(wrapper,
+                       tuple(primal for primal, flag in zip(primals, flags) if flag),
+                       tuple(terms for terms, flag in zip(series, flags) if flag),
+                       factorial_scaled=False)
+    return list(out_p), [list(terms) for terms in out_s]
+
+
+def asin_rule(primals_in:list[Array], series_in:list[list[Array]], **_:Any) -> tuple[Array, list[Array]]:
+    """
+    Taylor propagation rule for asin
+
+    """
+    x, = primals_in
+    series, = series_in
+    c, cs = jet(lambda x: 1/jax.numpy.sqrt(1 - x**2), (x, ), (series, ), factorial_scaled=False)
+    c = [c, *cs]
+    u = [x, *series]
+    v = [jax.numpy.asin(x)] + [None]*len(series)
+    for k in range(1, len(v)):
+        v[k] = sum(j*c[k - j]*u[j] for j in range(1, k + 1))/k
+    primal_out, *series_out = v
+    return primal_out, series_out
+
+
+def scan_rule(primals_in:list[Array], series_in:list[list[Array]], *,
+              jaxpr:Any,
+              num_consts:int,
+              num_carry:int,
+              length:int,
+              reverse:bool,
+              unroll:int|bool,
+              **_:Any) -> tuple[list[Array], list[list[Array]]]:
+    """
+    Taylor propagation rule for scan (fixed trip count loops)
+
+    """
+    function = jaxpr_as_fun(jaxpr)
+    c_p, c_s = list(primals_in[:num_consts]), list(series_in[:num_consts])
+    i_p, i_s = list(primals_in[num_consts:num_consts + num_carry]), list(series_in[num_consts:num_consts + num_carry])
+    x_p, x_s = list(primals_in[num_consts + num_carry:]), list(series_in[num_consts + num_carry:])
+    def body(carry:tuple[list[Array], list[list[Array]]],
+             xs:tuple[list[Array], list[list[Array]]]) -> tuple[Any, Any]:
+        p, s = carry
+        xp, xsr = xs
+        out_p, out_s = propagate(function, (*c_p, *p, *xp), (*c_s, *s, *xsr))
+        return (out_p[:num_carry], out_s[:num_carry]), (out_p[num_carry:], out_s[num_carry:])
+    (p, s), (y_p, y_s) = jax.lax.scan(body, (i_p, i_s), (x_p, x_s), length=length, reverse=reverse, unroll=unroll)
+    return [*p, *y_p], [*s, *y_s]
+
+
+def while_rule(primals_in:list[Array], series_in:list[list[Array]], *,
+               cond_jaxpr:Any,
+               body_jaxpr:Any,
+               cond_nconsts:int,
+               body_nconsts:int) -> tuple[list[Array], list[list[Array]]]:
+    """
+    Taylor propagation rule for while (dynamic trip count loops)
+
+    """
+    condition = jaxpr_as_fun(cond_jaxpr)
+    function = jaxpr_as_fun(body_jaxpr)
+    c_p = list(primals_in[:cond_nconsts])
+    b_p, b_s = list(primals_in[cond_nconsts:cond_nconsts + body_nconsts]), list(series_in[cond_nconsts:cond_nconsts + body_nconsts])
+    i_p, i_s = list(primals_in[cond_nconsts + body_nconsts:]), list(series_in[cond_nconsts + body_nconsts:])
+    def cond(carry:tuple[list[Array], list[list[Array]]]) -> Array:
+        p, _ = carry
+        flag, *_ = condition(*c_p, *p)
+        return flag
+    def body(carry:tuple[list[Array], list[list[Array]]]) -> tuple[list[Array], list[list[Array]]]:
+        p, s = carry
+        return propagate(function, (*b_p, *p), (*b_s, *s))
+    return jax.lax.while_loop(cond, body, (i_p, i_s))
+
+
+def cond_rule(primals_in:list[Array], series_in:list[list[Array]], *,
+              branches:tuple[Any, ...],
+              **_:Any) -> tuple[list[Array], list[list[Array]]]:
+    """
+    Taylor propagation rule for cond (switch)
+
+    """
+    index, *p = primals_in
+    _, *s = series_in
+    def branch(jaxpr:Any) -> Callable[..., tuple[list[Array], list[list[Array]]]]:
+        function = jaxpr_as_fun(jaxpr)
+        def wrapper(p:list[Array], s:list[list[Array]]) -> tuple[list[Array], list[list[Array]]]:
+            return propagate(function, tuple(p), tuple(s))
+        return wrapper
+    return jax.lax.switch(index, [branch(jaxpr) for jaxpr in branches], p, s)
+
+
+def custom_rule(trace:JetTrace, primitive:Any, function:Any, *rules:Any, **_:Any) -> Any:
+    """
+    Propagate Taylor coefficients through custom derivative function (primal function is traced)
+
+    """
+    *_, tracers = rules
+    with set_current_trace(trace):
+        return function.call_wrapped(*tracers)
+
+
+RULES:dict[Any, Callable[..., Any]] = {asin_p: asin_rule, scan_p: scan_rule, while_p: while_rule, cond_p: cond_rule}
+CUSTOM:tuple[str, ...] = ('process_custom_jvp_call', 'process_custom_vjp_call')
+LOCK:RLock = RLock()
+
+
+@contextmanager
+def rules() -> Iterator[None]:
+    """
+    Extend Taylor mode differentiation (jet) with asin, loops, switch and custom derivative rules
+
+    Note
+    ----
+    Rules are registered on entry and original jet rules and JetTrace handlers are restored on exit
+    Registration is guarded by module level lock (LOCK), i.e. concurrent extensions are serialized
+    Other jet users should acquire LOCK to avoid observing the extended rules
+
+    """
+    with LOCK:
+        table = {primitive: jet_rules.get(primitive) for primitive in RULES}
+        handlers = {name: JetTrace.__dict__.get(name) for name in CUSTOM}
+        jet_rules.update(RULES)
+        for name in CUSTOM:
+            setattr(JetTrace, name, custom_rule)
+        try:
+            yield
+        finally:
+            for primitive, rule in table.items():
+                if rule is None:
+                    jet_rules.pop(primitive, None)
+                else:
+                    jet_rules[primitive] = rule
+            for name, handler in handlers.items():
+                if handler is None:
+                    delattr(JetTrace, name)
+                else:
+                    setattr(JetTrace, name, handler)
+
+
+def taylor(function:Callable[..., Array], order:int) -> Callable[..., Array]:
+    """
+    Generate univariate Taylor series along a direction
+
+    Parameters
+    ----------
+    function: Callable[..., Array]
+        function with (x, *args) signature
+    order: int
+        truncation order
+
+    Returns
+    -------
+    Callable[..., Array]
+
+    Note
+    ----
+    The resulting function has (x, v, *args) signature
+    It returns Taylor coefficients of t -> function(x + t*v, *args) at zero with (order + 1, ...) shape
+    Coefficients are propagated with Taylor mode differentiation (jet), loops and switches are supported (see rules)
+
+    """
+    def series(x:Array, v:Array, *args:Array) -> Array:
+        t = jax.numpy.zeros((), dtype=x.dtype)
+        if order == 0:
+            return jax.numpy.stack([function(x, *args)])
+        terms = [jax.numpy.ones_like(t)] + [jax.numpy.zeros_like(t) for _ in range(order - 1)]
+        with rules():
+            value, terms = jet(lambda t: function(x + t*v, *args), (t, ), (terms, ), factorial_scaled=False)
+        return jax.numpy.stack([value, *terms])
+    return series
+
+
+def extract(function:Callable[..., Array],
+            qsps:Array,
+            *args:Array,
+            order:int=2) -> Array:
+    """
+    Extract truncated Taylor map
+
+    Parameters
+    ----------
+    function: Callable[..., Array]
+        element or line with (qsps, *args) signature
+    qsps: Array
+        expansion point
+    *args: Array
+        function parameters
+    order: int, default=2
+        truncation order
+
+    Returns
+    -------
+    Array
+        map coefficients with (output, monomials) shape
+
+    Note
+    ----
+    Coefficients correspond to monomials(dimension, order) of deviations from the expansion point
+    Homogeneous parts are interpolated from univariate Taylor series along fixed directions
+    Thus, the cost is linear in the number of directions and quadratic in order
+
+    """
+    dimension, *_ = qsps.shape
+    directions, solvers = interpolation(dimension, order)
+    directions = jax.numpy.asarray(directions, dtype=qsps.dtype)
+    series = jax.vmap(taylor(function, order), in_axes=(None, 0, *(None for _ in args)))(qsps, directions, *args)
+    return jax.numpy.concat([jax.numpy.asarray(solver, dtype=qsps.dtype) @ series[:, degree] for degree, solver in enumerate(solvers)]).T
+
+
+def evaluate(coefficients:Array,
+             qsps:Array,
+             point:Array,
+             order:int=2) -> Array:
+    """
+    Evaluate truncated Taylor map
+
+    Parameters
+    ----------
+    coefficients: Array
+        map coefficients
+    qsps: Array
+        initial state(s) with (..., dimension) shape
+    point: Array
+        expansion point
+    order: int, default=2
+        truncation order
+
+    Returns
+    -------
+    Array
+
+    """
+    dimension, *_ = point.shape
+    exponents = monomials(dimension, order)
+    delta = qsps - point
+    powers = jax.numpy.stack([delta**degree for degree in range(order + 1)], axis=-2)
+    terms = jax.numpy.prod(powers[..., exponents, numpy.arange(dimension)], axis=-1)
+    return terms @ coefficients.T
+
+
+def multiply(a:Array, b:Array, dimension:int, order:int) -> Array:
+    """
+    Truncated product of polynomials
+
+    Parameters
+    ----------
+    a: Array
+        first polynomial coefficients
+    b: Array
+        second polynomial coefficients
+    dimension: int
+        number of variables
+    order: int
+        truncation order
+
+    Returns
+    -------
+    Array
+
+    """
+    i, j, k = multiplication(dimension, order)
+    return jax.numpy.zeros_like(a).at[k].add(a[i]*b[j])
+
+
+def compose(outer:Array,
+            inner:Array,
+            point:Array,
+            order:int=2) -> Array:
+    """
+    Compose truncated Taylor maps (outer after inner)
+
+    Parameters
+    ----------
+    outer: Array
+        outer map coefficients (expanded around point)
+    inner: Array
+        inner map coefficients
+    point: Array
+        outer map expansion point
+    order: int, default=2
+        truncation order
+
+    Returns
+    -------
+    Array
+
+    Note
+    ----
+    Composition is exact (upto truncation order) if point is the inner map constant term
+
+    """
+    dimension, *_ = point.shape
+    exponents = monomials(dimension, order)
+    inner = inner.at[:, 0].add(-point)
+    terms = [jax.numpy.zeros_like(inner[0]).at[0].set(1.0)]
+    for exponent in exponents[1:]:
+        variable = int(numpy.flatnonzero(exponent)[0])
+        parent = exponent.copy()
+        parent[variable] -= 1
+        count = int(numpy.flatnonzero((exponents == parent).all(-1))[0])
+        terms.append(multiply(terms[count], inner[variable], dimension, order))
+    return outer @ jax.numpy.stack(terms)
@@ -0,0 +1,186 @@
+"""
+Track
+-----
+
+Chunked (streaming), resumable and sharded multi-turn tracking
+
+"""
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+from os import replace
+from pathlib import Path
+
+import numpy
+from numpy.lib.format import open_memmap
+
+import jax
+from jax import Array
+from jax.sharding import Mesh
+from jax.sharding import NamedSharding
+from jax.sharding import PartitionSpec
+
+try:
+    from jax import shard_map
+except ImportError:
+    from jax.experimental.shard_map import shard_map
+
+
+def chunk(ring:Callable[..., Array],
+          turns:int,
+          every:int=1) -> Callable[..., tuple[Array, Array]]:
+    """
+    Generate block of turns with decimated records
+
+    Parameters
+    ----------
+    ring: Callable[..., Array]
+        one-turn map with (qsps, *args) signature
+    turns: int
+        number of turns in block
+    every: int, default=1
+        record every k-th turn
+
+    Returns
+    -------
+    Callable[..., tuple[Array, Array]]
+        jitted function with (qsps, *args) signature returning final state and records with (turns//every, ...) shape
+
+    """
+    if turns % every:
+        raise ValueError(f'Expected number of turns {turns} to be a multiple of {every}')
+    @jax.jit
+    def block(qsps:Array, *args:Array) -> tuple[Array, Array]:
+        def body(qsps:Array, _:Any) -> tuple[Array, Array]:
+            qsps = jax.lax.fori_loop(0, every, lambda _, qsps: ring(qsps, *args), qsps)
+            return qsps, qsps
+        return jax.lax.scan(body, qsps, length=turns//every)
+    return block
+
+
+def track(ring:Callable[..., Array],
+          qsps:Array,
+          turns:int,
+          *args:Array,
+          path:str|Path,
+          block:int=1024,
+          every:int=1,
+          resume:bool=True) -> Array:
+    """
+    Track with records streamed to memory mapped file
+
+    Parameters
+    ----------
+    ring: Callable[..., Array]
+        one-turn map with (qsps, *args) signature
+    qsps: Array
+        initial state(s) with (..., 6) shape
+    turns: int
+        total number of turns
+    *args: Array
+        one-turn map parameters
+    path: str|Path
+        output .npy file with (turns//every, ..., 6) shape
+    block: int, default=1024
+        number of turns per block (multiple of every)
+    every: int, default=1
+        record every k-th turn
+    resume: bool, default=True
+        flag to resume from checkpoint (if exists)
+
+    Returns
+    -------
+    Array
+        final state(s)
+
+    Note
+    ----
+    Blocks are computed under jit, the next block is dispatched before the previous one is written
+    Thus, device computation overlaps with host writes and device memory is bounded by block size
+    After each written block, the state and number of completed turns are saved to path.checkpoint.npz
+    Interrupted runs are resumed from the last checkpoint, the checkpoint is removed on completion
+
+    """
+    if turns % every or block % every:
+        raise ValueError(f'Expected number of turns {turns} and block {block} to be multiples of {every}')
+    path = Path(path)
+    checkpoint = path.with_suffix('.checkpoint.npz')
+    dtype = numpy.dtype(jax.numpy.result_type(qsps))
+    shape = (turns//every, *jax.numpy.shape(qsps))
+    done = 0
+    if resume and checkpoint.exists() and path.exists():
+        with numpy.load(checkpoint) as data:
+            qsps, done = jax.numpy.asarray(data['qsps']), int(data['turns'])
+        records = open_memmap(path, mode='r+')
+        if records.shape != shape or records.dtype != dtype:
+            raise ValueError(f'Expected existing records with {shape} shape and {dtype} type, got {records.shape} and {records.dtype}')
+    else:
+        records = open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+    functions = {}
+    def dispatch(qsps:Array, done:int) -> tuple[int, Array, Array]:
+        count = min(block, turns - done)
+        if count not in functions:
+            functions[count] = chunk(ring, count, every)
+        return count, *functions[count](qsps, *args)
+    def write(done:int, count:int, qsps:Array, values:Array) -> None:
+        records[done//every:(done + count)//every] = numpy.asarray(values)
+        records.flush()
+        temporary = checkpoint.with_suffix('.tmp.npz')
+        numpy.savez(temporary, qsps=numpy.asarray(qsps), turns=done + count)
+        replace(temporary, checkpoint)
+    pending: Optional[tuple[int, int, Array, Array]] = None
+    while done < turns:
+        count, qsps, values = dispatch(qsps, done)
+        if pending:
+            write(*pending)
+        pending = (done, count, qsps, values)
+        done += count
+    if pending:
+        write(*pending)
+    checkpoint.unlink(missing_ok=True)
+    return qsps
+
+
+def distribute(function:Callable[..., Any],
+               devices:Optional[list[Any]]=None) -> Callable[..., Any]:
+    """
+    Shard particles across devices
+
+    Parameters
+    ----------
+    function: Callable[..., Any]
+        single particle function (element, line, ring, tracking, ...) with (qsps, *args) signature
+    devices: Optional[list[Any]]
+        devices (default all local devices)
+
+    Returns
+    -------
+    Callable[..., Any]
+        jitted function with (qsps, *args) signature, where qsps has (n, 6) shape
+
+    Note
+    ----
+    Particles are padded to a multiple of the number of devices (with copies of the first particle)
+    Padded particles are split along a one dimensional mesh, parameters are replicated
+    Within each device, particles are vectorized, results are gathered and padding is removed
+    On CPU, the number of devices can be set with XLA_FLAGS="--xla_force_host_platform_device_count=x"
+
+    """
+    devices = devices if devices else jax.local_devices()
+    mesh = Mesh(numpy.array(devices), ('particles', ))
+    count = len(devices)
+    def local(qsps:Array, *args:Any) -> Any:
+        return jax.vmap(function, in_axes=(0, *[None]*len(args)))(qsps, *args)
+    @jax.jit
+    def wrapper(qsps:Array, *args:Any) -> Any:
+        size, *_ = qsps.shape
+        total = -(-size//count)*count
+        qsps = jax.numpy.concatenate([qsps, jax.numpy.repeat(qsps[:1], total - size, axis=0)])
+        qsps = jax.lax.with_sharding_constraint(qsps, NamedSharding(mesh, PartitionSpec('particles')))
+        mapped = shard_map(local,
+                           mesh=mesh,
+                           in_specs=(PartitionSpec('particles'), *[PartitionSpec()]*len(args)),
+                           out_specs=PartitionSpec('particles'))
+        return jax.tree.map(lambda value: value[:size], mapped(qsps, *args))
+    return wrapper
@@ -5,11 +5,21 @@ Util
 Utils module
 
 """
-from os import system
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
 from pathlib import Path
+from subprocess import DEVNULL
+from subprocess import run
+from tempfile import TemporaryDirectory
 
 from math import factorial
 
+import numpy
+
 import jax
 from jax import Array
 
@@ -49,24 +59,24 @@ def rigidity(beta:float, gamma:float, mass:float, ratio:int=1) -> float:
     return 1E6/CL*momentum(beta, gamma)*mass*ratio
 
 
-def ptc(qsps:Array,
-        kind:str,
-        parameters:dict[str, str|int|float], *,
-        gamma:float=10.0**9,
-        exact:bool=True,
-        tx:float=0.0,
-        ty:float=0.0,
-        tz:float=0.0,
-        rx:float=0.0,
-        ry:float=0.0,
-        rz:float=0.0) -> Array:
+def ptc_script(qsps:Array,
+               kind:str,
+               parameters:dict[str, str|int|float], *,
+               gamma:float=10.0**9,
+               exact:bool=True,
+               tx:float=0.0,
+               ty:float=0.0,
+               tz:float=0.0,
+               rx:float=0.0,
+               ry:float=0.0,
+               rz:float=0.0) -> str:
     """
-
+    Generate MAD-X PTC tracking script
 
     Parameters
     ----------
     qsps: Array
-        initial condition (sector ordering)
+        initial conditions (sector ordering) with (n, 6) shape
     kind: sts
         element kind (drift, quadrupole, ...)
     parameters: dict[str, str|int|float]
@@ -90,13 +100,12 @@ def ptc(qsps:Array,
 
     Returns
     -------
-    Array
+    str
 
     """
-    q_x, q_y, q_s, p_x, p_y, p_s = list(qsps)
-    file = Path('ptc')
-    data = Path('track.obs0001.p0001')
-    code = f"""
+    start = ''.join(f'ptc_start,x={q_x!r},px={p_x!r},y={q_y!r},py={p_y!r},t={q_s!r},pt={p_s!r} ;\n    '
+                    for q_x, q_y, q_s, p_x, p_y, p_s in numpy.asarray(qsps, dtype=numpy.float64).reshape(-1, 6).tolist())
+    return f"""
     mag:{kind},{''.join([f'{key}={str(value)}, ' for key, value in parameters.items()])};
     map:line=(mag) ;
     beam,gamma={gamma},particle=electron ;
@@ -109,23 +118,187 @@ def ptc(qsps:Array,
     ptc_create_layout,model=1,method=6,nst=1000,exact={str(exact).lower()} ;
     ptc_setswitch,fringe=false,time=true,totalpath=false,exact_mis={str(exact).lower()} ;
     ptc_align ;
-    ptc_start,x={q_x},px={p_x},y={q_y},py={p_y},t={q_s},pt={p_s} ;
-    ptc_track,icase=6,turns=1,file=track,maxaper={{1.,1.,1.,1.,1.,1.}} ;
+    {start}ptc_track,icase=6,turns=1,file=track,maxaper={{1.,1.,1.,1.,1.,1.}} ;
     ptc_track_end ;
     ptc_end ;
 
     """
-    with file.open('w', encoding='utf-8') as stream:
-        stream.write(code)
-    system(f'madx < {str(file)} > /dev/null')
-    with data.open('r', encoding='utf-8') as stream:
-        line = ''
-        for line in stream:
-            continue
-        _, _, q_x, p_x, q_y, p_y, q_s, p_s, *_ = line.split()
-    file.unlink()
-    data.unlink()
-    return jax.numpy.asarray([float(x) for x in (q_x, q_y, q_s, p_x, p_y, p_s)])
+
+
+def ptc_run(qsps:Array,
+            kind:str,
+            parameters:dict[str, str|int|float], *,
+            executable:str='madx',
+            **kwargs:Any) -> Array:
+    """
+    Track batch of initial conditions with single MAD-X PTC invocation (not cached)
+
+    Parameters
+    ----------
+    qsps: Array
+        initial conditions (sector ordering) with (n, 6) shape
+    kind: sts
+        element kind (drift, quadrupole, ...)
+    parameters: dict[str, str|int|float]
+        element parameters
+    executable: str, default='madx'
+        MAD-X executable
+    **kwargs: Any
+        passed to ptc_script (gamma, exact and alignment errors)
+
+    Returns
+    -------
+    Array
+        final states with (n, 6) shape (lost particles are nan)
+
+    Note
+    ----
+    MAD-X is invoked in an isolated temporary directory, i.e. concurrent calls do not interfere
+    CalledProcessError is raised if MAD-X exits with non-zero status
+    RuntimeError is raised if tracking output is missing (e.g. crashed run), lost particles are nan
+
+    """
+    qsps = numpy.asarray(qsps, dtype=numpy.float64).reshape(-1, 6)
+    code = ptc_script(qsps, kind, parameters, **kwargs)
+    result = numpy.full_like(qsps, numpy.nan)
+    with TemporaryDirectory(prefix='elementary-') as directory:
+        path = Path(directory)
+        with (path / 'ptc').open('w', encoding='utf-8') as stream:
+            stream.write(code)
+        with (path / 'ptc').open('r', encoding='utf-8') as stream:
+            run([executable], stdin=stream, stdout=DEVNULL, stderr=DEVNULL, cwd=path, check=True)
+        for count in range(len(qsps)):
+            data = path / f'track.obs0001.p{count + 1:04d}'
+            if not data.exists():
+                raise RuntimeError(f'Expected MAD-X tracking output for particle {count + 1}, got none ({executable})')
+            with data.open('r', encoding='utf-8') as stream:
+                line = ''
+                for line in stream:
+                    continue
+            _, turn, q_x, p_x, q_y, p_y, q_s, p_s, *_ = line.split()
+            if int(turn) == 1:
+                result[count] = [float(x) for x in (q_x, q_y, q_s, p_x, p_y, p_s)]
+    return jax.numpy.asarray(result)
+
+
+def ptc_batch(qsps:Array,
+              kind:str,
+              parameters:dict[str, str|int|float], *,
+              executable:str='madx',
+              cache:bool=True,
+              path:Optional[str|Path]=None,
+              **kwargs:Any) -> Array:
+    """
+    Track batch of initial conditions with single MAD-X PTC invocation
+
+    Parameters
+    ----------
+    qsps: Array
+        initial conditions (sector ordering) with (n, 6) shape
+    kind: sts
+        element kind (drift, quadrupole, ...)
+    parameters: dict[str, str|int|float]
+        element parameters
+    executable: str, default='madx'
+        MAD-X executable
+    cache: bool, default=True
+        flag to use reference cache (see reference.reference), MAD-X is invoked only on cache miss
+    path: Optional[str|Path]
+        cache directory
+    **kwargs: Any
+        passed to ptc_script (gamma, exact and alignment errors)
+
+    Returns
+    -------
+    Array
+        final states with (n, 6) shape (lost particles are nan)
+
+    """
+    if not cache:
+        return ptc_run(qsps, kind, parameters, executable=executable, **kwargs)
+    from elementary.reference import reference
+    qsps = numpy.asarray(qsps, dtype=numpy.float64).reshape(-1, 6)
+    return reference(qsps, kind, parameters, path=path, executable=executable, **kwargs)
+
+
+def ptc_pool(tasks:list[dict[str, Any]],
+             workers:Optional[int]=None) -> list[Array]:
+    """
+    Track independent configurations in parallel
+
+    Parameters
+    ----------
+    tasks: list[dict[str, Any]]
+        ptc_batch keyword arguments (qsps, kind, parameters, ...) for each configuration
+    workers: Optional[int]
+        maximum number of concurrent MAD-X processes (default number of cpus)
+
+    Returns
+    -------
+    list[Array]
+
+    Note
+    ----
+    Each configuration is tracked with a separate MAD-X process in its own temporary directory
+    Threads are used to dispatch and wait on the processes (no fork of the host process)
+
+    """
+    with ThreadPoolExecutor(max_workers=workers if workers else cpu_count()) as executor:
+        return list(executor.map(lambda task: ptc_batch(**task), tasks))
+
+
+def ptc(qsps:Array,
+        kind:str,
+        parameters:dict[str, str|int|float], *,
+        gamma:float=10.0**9,
+        exact:bool=True,
+        tx:float=0.0,
+        ty:float=0.0,
+        tz:float=0.0,
+        rx:float=0.0,
+        ry:float=0.0,
+        rz:float=0.0,
+        cache:bool=True,
+        path:Optional[str|Path]=None) -> Array:
+    """
+
+
+    Parameters
+    ----------
+    qsps: Array
+        initial condition (sector ordering)
+    kind: sts
+        element kind (drift, quadrupole, ...)
+    parameters: dict[str, str|int|float]
+        element parameters
+    gamma: float, default=10**9
+        gamma
+    exact: bool, defaul=True
+        exact hamiltonian and alignment flag
+    tx: float, default=0.0
+        tx
+    ty: float, default=0.0
+        ty
+    tz: float, default=0.0
+        tz
+    rx: float, default=0.0
+        rx
+    ry: float, default=0.0
+        ry
+    rz: float, default=0.0
+        rz
+    cache: bool, default=True
+        flag to use reference cache (see reference.reference)
+    path: Optional[str|Path]
+        cache directory
+
+    Returns
+    -------
+    Array
+
+    """
+    qsps, *_ = ptc_batch(qsps, kind, parameters, cache=cache, path=path, gamma=gamma, exact=exact, tx=tx, ty=ty, tz=tz, rx=rx, ry=ry, rz=rz)
+    return qsps
 
 
 def bessel(x:Array, n:int=0) -> Array:
@@ -143,3 +316,40 @@ def bessel(x:Array, n:int=0) -> Array:
         1/factorial(n + 4)*x**8/6144 -
         1/factorial(n + 5)*x**10/122880
     )
+
+
+def analytic(rule:Callable[..., tuple[Array, Array]]) -> Callable[..., tuple[Array, Array]]:
+    """
+    Evaluate closed form tangent rule as explicit Jacobian
+
+    Parameters
+    ----------
+    rule: Callable[..., tuple[Array, Array]]
+        custom jvp rule with (*nondiff, primals, tangents) signature, where primals are (qsps, *parameters)
+        result and tangent are linear in tangents and computed from components unstacked along the last axis
+
+    Returns
+    -------
+    Callable[..., tuple[Array, Array]]
+
+    Note
+    ----
+    Jacobian with respect to state and parameters is obtained by applying the rule to the unit basis
+    Output tangent is the product of the Jacobian and input tangents
+    Thus, reverse mode transposes a single matrix product instead of the rule expressions
+
+    """
+    def wrapper(*args:Any) -> tuple[Array, Array]:
+        *nondiff, primals, tangents = args
+        qsps, *parameters = primals
+        dqsps, *dparameters = tangents
+        shape = jax.numpy.broadcast_shapes(qsps.shape[:-1], *(jax.numpy.shape(parameter) for parameter in parameters))
+        size = 6 + len(parameters)
+        basis = jax.numpy.broadcast_to(jax.numpy.eye(size, dtype=qsps.dtype), (*shape, size, size))
+        primals = (qsps[..., None, :], *(jax.numpy.asarray(parameter)[..., None] for parameter in parameters))
+        tangents = (basis[..., :6], *jax.numpy.unstack(basis[..., 6:], axis=-1))
+        result, matrix = rule(*nondiff, primals, tangents)
+        vector = jax.numpy.concatenate([jax.numpy.broadcast_to(dqsps, (*shape, 6)),
+                                        *(jax.numpy.broadcast_to(dparameter, shape)[..., None] for dparameter in dparameters)], axis=-1)
+        return result[..., 0, :], jax.numpy.einsum('...ki,...k->...i', matrix, vector)
+    return wrapper
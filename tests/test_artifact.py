@@ -0,0 +1,42 @@
+"""
+Artifact
+--------
+
+Exported function arguments validation
+
+"""
+import pytest
+
+import jax
+
+from elementary.drift import drift_factory
+from elementary.artifact import save
+from elementary.artifact import load
+
+jax.config.update('jax_enable_x64', True)
+
+QSPS:jax.Array = jax.numpy.array([[-0.01, 0.005, 0.001, 0.001, 0.002, -0.0005],
+                                  [0.002, -0.001, 0.0, -0.0005, 0.0002, 0.0005]])
+
+
+def test_load(tmp_path):
+    drift = drift_factory()
+    save(drift, tmp_path / 'drift.npz', QSPS[0], 1.0)
+    function = load(tmp_path / 'drift.npz')
+    assert jax.numpy.allclose(function(QSPS), jax.vmap(lambda qsps: drift(qsps, 1.0))(QSPS), rtol=1.0E-12, atol=1.0E-15)
+    assert jax.numpy.allclose(function(QSPS[:1], 2.0), drift(QSPS[0], 2.0), rtol=1.0E-12, atol=1.0E-15)
+
+
+@pytest.mark.parametrize('args, match', [
+    ((QSPS[:, :5], ), 'qsps with \\(b, 6\\) shape'),
+    ((QSPS[0], ), 'qsps with \\(b, 6\\) shape'),
+    ((QSPS.astype(jax.numpy.float32), ), 'qsps with float64 dtype'),
+    ((QSPS, jax.numpy.ones(2)), 'argument 0 with \\(\\) shape'),
+    ((QSPS, jax.numpy.float32(1.0)), 'argument 0 with float64 dtype'),
+    ((QSPS, 1.0, 2.0), 'Expected 1 parameter leaves'),
+], ids=['size', 'rank', 'dtype', 'shape', 'type', 'count'])
+def test_mismatch(tmp_path, args, match):
+    save(drift_factory(), tmp_path / 'drift.npz', QSPS[0], 1.0)
+    function = load(tmp_path / 'drift.npz')
+    with pytest.raises(ValueError, match=match):
+        function(*args)
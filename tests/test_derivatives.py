@@ -0,0 +1,75 @@
+"""
+Derivatives
+-----------
+
+Analytic custom JVP rules against autodiff of reference (primal) implementations
+
+"""
+import pytest
+
+import jax
+
+from elementary.util import beta
+from elementary import drift
+from elementary import dipole
+from elementary import alignment
+from elementary.alignment import alignment_factory
+
+jax.config.update('jax_enable_x64', True)
+
+GAMMA:float = 10.0**3
+BETA:float = beta(GAMMA)
+CONSTANT:float = 1/(BETA**2*GAMMA**2)
+QSPS:jax.Array = jax.numpy.array([-0.01, 0.005, 0.001, 0.001, 0.002, -0.0005])
+ERRORS:tuple[float, ...] = (0.05, -0.02, 0.05, 0.005, -0.005, 0.1)
+
+
+def check(function, reference, *args):
+    argnums = tuple(range(len(args)))
+    assert jax.numpy.allclose(function(*args), reference(*args), rtol=1.0E-12, atol=1.0E-15)
+    for transform in (jax.jacfwd, jax.jacrev):
+        result = transform(function, argnums=argnums)(*args)
+        expected = transform(reference, argnums=argnums)(*args)
+        for value, other in zip(result, expected):
+            assert jax.numpy.allclose(value, other, rtol=1.0E-10, atol=1.0E-14)
+
+
+def test_drift():
+    check(lambda qsps, length: drift.kernel(qsps, length, BETA, CONSTANT),
+          lambda qsps, length: drift.kernel.fun(qsps, length, BETA, CONSTANT),
+          QSPS, 1.5)
+
+
+def test_dipole():
+    check(lambda qsps, length, angle: dipole.kernel(qsps, length, angle, BETA, CONSTANT),
+          lambda qsps, length, angle: dipole.kernel.fun(qsps, length, angle, BETA, CONSTANT),
+          QSPS, 2.0, 0.05)
+
+
+@pytest.mark.parametrize('name', ['tx', 'ty', 'tz', 'rx', 'ry', 'rz'])
+def test_transformation(name):
+    kernel = getattr(alignment, f'{name}_kernel')
+    arguments = (BETA, CONSTANT) if name in ('tz', 'rx', 'ry') else ()
+    check(lambda qsps, error: kernel(qsps, error, *arguments),
+          lambda qsps, error: kernel.fun(qsps, error, *arguments),
+          QSPS, 0.01)
+
+
+def test_batched():
+    qsps = jax.numpy.stack([QSPS, 2.0*QSPS, -QSPS])
+    check(lambda qsps, length: drift.kernel(qsps, length, BETA, CONSTANT),
+          lambda qsps, length: drift.kernel.fun(qsps, length, BETA, CONSTANT),
+          qsps, 1.5)
+
+
+@pytest.mark.parametrize('errors', [ERRORS, (0.0, )*6], ids=['errors', 'zero'])
+@pytest.mark.parametrize('flag', [False, True], ids=['straight', 'curved'])
+def test_alignment(flag, errors):
+    xyz_entrance, xyz_exit = alignment_factory(BETA, GAMMA, flag=flag)
+    check(xyz_entrance,
+          lambda qsps, *errors: alignment.fused_entrance(qsps, *errors, BETA, CONSTANT),
+          QSPS, *errors)
+    layout = (2.0, 0.05 if flag else 0.0)
+    check(xyz_exit,
+          lambda qsps, *args: alignment.fused_exit(qsps, *args, flag, BETA, CONSTANT),
+          QSPS, *errors, *layout)
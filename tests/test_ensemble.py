@@ -0,0 +1,39 @@
+"""
+Ensemble
+--------
+
+Misaligned line layout lengths
+
+"""
+import pytest
+
+import jax
+
+from elementary.drift import drift_factory
+from elementary.alignment import alignment_factory
+from elementary.ensemble import misaligned_factory
+
+jax.config.update('jax_enable_x64', True)
+
+QSPS:jax.Array = jax.numpy.array([-0.01, 0.005, 0.001, 0.001, 0.002, -0.0005])
+
+
+def kick(qsps, voltage, lag):
+    return qsps.at[5].add(voltage*jax.numpy.sin(lag))
+
+
+def test_thin_element():
+    drift = drift_factory()
+    elements = [(drift, 1.0), (kick, 0.5, 0.01), (drift, 1.0)]
+    line, parameters = misaligned_factory(elements, lengths=[1.0, 0.0, 1.0], final=True)
+    xyz_entrance, xyz_exit = alignment_factory()
+    error = jax.numpy.array([0.001, -0.002, 0.001, 0.002, -0.001, 0.05])
+    errors = jax.numpy.zeros((3, 6)).at[1].set(error)
+    expected = drift(xyz_exit(kick(xyz_entrance(drift(QSPS, 1.0), *error), 0.5, 0.01), *error, 0.0), 1.0)
+    assert jax.numpy.allclose(line(QSPS, parameters, errors), expected, rtol=1.0E-12, atol=1.0E-15)
+
+
+def test_lengths():
+    drift = drift_factory()
+    with pytest.raises(ValueError, match='Expected 2 lengths'):
+        misaligned_factory([(drift, 1.0), (kick, 0.5, 0.01)], lengths=[1.0])
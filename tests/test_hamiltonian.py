@@ -0,0 +1,72 @@
+"""
+Hamiltonian
+-----------
+
+Closed form hamiltonian derivatives against autodiff
+
+"""
+import pytest
+
+import jax
+
+from elementary.hamiltonian import hamiltonian_factory
+from elementary.hamiltonian import gradient_factory
+from elementary.quadrupole import vector as vector_quadrupole
+from elementary.dipole import vector_dipole
+from elementary.dipole import curvature as curvature_dipole
+
+jax.config.update('jax_enable_x64', True)
+
+BETA:float = 0.9
+GAMMA:float = 1/(1 - BETA**2)**0.5
+QS:jax.Array = jax.numpy.array([1.0E-3, -2.0E-3, 1.0E-4])
+PS:jax.Array = jax.numpy.array([1.0E-4, 2.0E-4, 1.0E-3])
+S:jax.Array = jax.numpy.array(0.3)
+
+
+def vector_cavity(qs, s, voltage, frequency, lag):
+    a_x, a_y, _ = jax.numpy.zeros_like(qs)
+    return a_x, a_y, 1.0E-3*voltage*jax.numpy.cos(frequency*s + lag)*(1 + qs[0]**2)
+
+
+def scalar(qs, s, *args):
+    return 1.0E-3*qs[0]*qs[1]*jax.numpy.sin(s)
+
+
+def vector_full(qs, s, k):
+    q_x, q_y, _ = qs
+    return 0.1*k*q_y, -0.1*k*q_x, k*(q_x**2 - q_y**2)/2
+
+
+CASES = {
+    'drift': (dict(), ()),
+    'quadrupole': (dict(vector=vector_quadrupole), (0.7, 0.2)),
+    'dipole': (dict(vector=vector_dipole, curvature=curvature_dipole), (2.0, )),
+    'cavity': (dict(vector=vector_cavity, scalar=scalar), (2.0, 3.0, 0.5)),
+    'full': (dict(vector=vector_full, scalar=scalar, curvature=lambda s, k: 0.2*k, torsion=lambda s, k: 0.3 + 0.1*s), (0.9, )),
+}
+
+
+def close(result, expected):
+    return all(jax.numpy.allclose(value, other, rtol=1.0E-10, atol=1.0E-14)
+               for value, other in zip(jax.tree.leaves(result), jax.tree.leaves(expected)))
+
+
+@pytest.mark.parametrize('name', list(CASES))
+def test_gradient(name):
+    settings, args = CASES[name]
+    reference = hamiltonian_factory(**settings, beta=BETA, gamma=GAMMA, prune=False)
+    gradient = gradient_factory(**settings, beta=BETA, gamma=GAMMA)
+    assert close(gradient(QS, PS, S, *args), jax.grad(reference, argnums=(0, 1))(QS, PS, S, *args))
+
+
+@pytest.mark.parametrize('name', list(CASES))
+def test_hamiltonian(name):
+    settings, args = CASES[name]
+    reference = hamiltonian_factory(**settings, beta=BETA, gamma=GAMMA, prune=False)
+    hamiltonian = hamiltonian_factory(**settings, beta=BETA, gamma=GAMMA, gradient=True)
+    argnums = tuple(range(3 + len(args)))
+    assert close(hamiltonian(QS, PS, S, *args), reference(QS, PS, S, *args))
+    assert close(jax.grad(hamiltonian, argnums=argnums)(QS, PS, S, *args), jax.grad(reference, argnums=argnums)(QS, PS, S, *args))
+    assert close(jax.jacfwd(hamiltonian, argnums=argnums)(QS, PS, S, *args), jax.jacfwd(reference, argnums=argnums)(QS, PS, S, *args))
+    assert close(jax.hessian(hamiltonian, argnums=(0, 1))(QS, PS, S, *args), jax.hessian(reference, argnums=(0, 1))(QS, PS, S, *args))
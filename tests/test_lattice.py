@@ -0,0 +1,65 @@
+"""
+Lattice
+-------
+
+MAD-X sequence and line parsing
+
+"""
+import pytest
+
+from elementary.lattice import parse
+
+
+def test_sequence_refer_at_from():
+    text = """
+    l = 1.0;
+    qf: quadrupole, l:=l/2, k1=0.5;
+    qd: qf, k1=-0.5;
+    m: marker;
+    s: sequence, l=4.0, refer=entry;
+    qf, at=0.0;
+    m, at=1.0;
+    qd, at=0.5, from=m;
+    endsequence;
+    """
+    records = parse(text)
+    assert [item['class'] for item in records] == ['quadrupole', 'drift', 'marker', 'drift', 'quadrupole', 'drift']
+    assert [item.get('l', 0.0) for item in records] == pytest.approx([0.5, 0.5, 0.0, 0.5, 0.5, 2.0])
+    assert [records[0]['k1'], records[4]['k1']] == pytest.approx([0.5, -0.5])
+
+
+def test_line_repetition_reflection():
+    text = """
+    d: drift, l=1.0;
+    qf: quadrupole, l=0.5, k1=1.0;
+    qd: quadrupole, l=0.5, k1=-1.0;
+    cell: line=(qf, d, -(qf, qd), 2*(d, qd));
+    ring: line=(2*cell, -cell);
+    use, period=ring;
+    """
+    cell = ['qf', 'd', 'qd', 'qf', 'd', 'qd', 'd', 'qd']
+    assert [item['name'] for item in parse(text)] == 2*cell + cell[::-1]
+    assert [item['name'] for item in parse(text, sequence='cell')] == cell
+
+
+def test_line_invalid_entry():
+    with pytest.raises(ValueError, match='2\\*-'):
+        parse('d: drift, l=1.0; cell: line=(d, 2*-);')
+
+
+def test_select_ealign():
+    text = """
+    d: drift, l=1.0;
+    qf: quadrupole, l=0.5, k1=1.0;
+    qd: quadrupole, l=0.5, k1=-1.0;
+    cell: line=(qf, d, qd, d);
+    select, flag=error, class=quadrupole;
+    ealign, dx=0.001;
+    select, flag=error, clear;
+    select, flag=error, pattern="^qd";
+    eoption, add=true;
+    ealign, dx=0.002, dpsi=0.1;
+    """
+    records = parse(text)
+    assert [item['dx'] for item in records] == pytest.approx([0.001, 0.0, 0.003, 0.0])
+    assert [item['dpsi'] for item in records] == pytest.approx([0.0, 0.0, 0.1, 0.0])
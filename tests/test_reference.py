@@ -0,0 +1,69 @@
+"""
+Reference
+---------
+
+Element transfer maps against cached MAD-X PTC references (MAD-X is not required)
+
+"""
+from pathlib import Path
+
+import pytest
+
+import jax
+
+from elementary.util import beta
+from elementary.util import ptc_batch
+from elementary.reference import reference
+from elementary.drift import drift_factory
+from elementary.quadrupole import quadrupole_factory
+from elementary.sextupole import sextupole_factory
+from elementary.dipole import dipole_factory
+from elementary.alignment import alignment_factory
+
+jax.config.update('jax_enable_x64', True)
+
+PATH:Path = Path(__file__).parent / 'reference'
+GAMMA:float = 10.0**3
+BETA:float = beta(GAMMA)
+QSPS:jax.Array = jax.numpy.array([[-0.01, 0.005, 0.001, 0.001, 0.001, -0.0001],
+                                  [0.002, -0.001, 0.0, -0.0005, 0.0002, 0.0005]])
+ERRORS:dict[str, float] = dict(tx=0.05, ty=-0.02, tz=0.05, rx=0.005, ry=-0.005, rz=0.1)
+
+
+def misaligned(qsps, length, kn, ks):
+    body = quadrupole_factory(beta=BETA, gamma=GAMMA, order=2, iterations=200)
+    xyz_entrance, xyz_exit = alignment_factory(beta=BETA, gamma=GAMMA)
+    errors = ERRORS.values()
+    return xyz_exit(body(xyz_entrance(qsps, *errors), length, kn, ks), *errors, length)
+
+
+CASES = {
+    'drift': (drift_factory(beta=BETA, gamma=GAMMA), (1.0, ), 'drift', {'l': 1.0}, {}),
+    'quadrupole': (quadrupole_factory(beta=BETA, gamma=GAMMA, order=2, iterations=100), (1.0, -2.0, 1.5),
+                   'quadrupole', {'l': 1.0, 'k1': -2.0, 'k1s': 1.5}, {}),
+    'sextupole': (sextupole_factory(beta=BETA, gamma=GAMMA, order=2, iterations=100), (0.5, 10.0, -5.0),
+                  'sextupole', {'l': 0.5, 'k2': 10.0, 'k2s': -5.0}, {}),
+    'sbend': (dipole_factory(beta=BETA, gamma=GAMMA), (2.0, 0.05),
+              'sbend', {'l': 2.0, 'angle': 0.05, 'kill_ent_fringe': 'true', 'kill_exi_fringe': 'true'}, {}),
+    'quadrupole-misaligned': (misaligned, (1.0, -2.0, 1.5),
+                              'quadrupole', {'l': 1.0, 'k1': -2.0, 'k1s': 1.5}, ERRORS),
+}
+
+
+@pytest.mark.parametrize('name', list(CASES))
+def test_element(name):
+    element, parameters, kind, settings, errors = CASES[name]
+    expected = reference(QSPS, kind, settings, path=PATH, generate=False, gamma=GAMMA, **errors)
+    result = jax.vmap(lambda qsps: element(qsps, *parameters))(QSPS)
+    assert jax.numpy.allclose(result, expected, rtol=1.0E-9, atol=1.0E-12)
+
+
+def test_cached_batch():
+    _, _, kind, settings, errors = CASES['drift']
+    assert jax.numpy.all(ptc_batch(QSPS, kind, settings, path=PATH, executable='', gamma=GAMMA, **errors) ==
+                         reference(QSPS, kind, settings, path=PATH, generate=False, gamma=GAMMA, **errors))
+
+
+def test_miss():
+    with pytest.raises(KeyError):
+        reference(QSPS, 'drift', {'l': 2.0}, path=PATH, generate=False, gamma=GAMMA)